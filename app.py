@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -7,9 +7,20 @@ import os
 import json
 import google.generativeai as genai
 from dotenv import load_dotenv
+from sqlalchemy import event, tuple_
+from sqlalchemy.orm import Session
+from food_database import (NUTRIENT_FIELDS, lookup_food, estimate_grams, nutrition_for_grams,
+                           estimate_food_calories, parse_food_description)
 import logging
 import time
 import hashlib
+import threading
+import copy
+import uuid
+import base64
+from collections import OrderedDict
+from contextlib import contextmanager
+from types import SimpleNamespace
 
 # 加载环境变量
 load_dotenv()
@@ -20,8 +31,12 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 简单的内存缓存用于AI分析结果
-ai_analysis_cache = {}
+# AI分析结果的进程内LRU缓存（key -> (过期时间戳, 结果)），数据库表AIAnalysisCache作为持久层
+ai_analysis_cache = OrderedDict()
+ai_analysis_cache_lock = threading.Lock()
+ai_cache_stats = {'hits': 0, 'db_hits': 0, 'misses': 0, 'evictions': 0, 'writes': 0}
+AI_CACHE_MAX_SIZE = int(os.getenv('AI_CACHE_MAX_SIZE', '512'))
+AI_CACHE_TTL_SECONDS = int(os.getenv('AI_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
 
 # 每日鼓励名人名言库
 DAILY_QUOTES = [
@@ -98,55 +113,112 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-def init_database_schema():
-    """初始化数据库schema，添加缺失的字段"""
-    with app.app_context():
-        try:
-            # 尝试添加exercise_description字段
-            from sqlalchemy import text
-            db.session.execute(text("ALTER TABLE exercise_log ADD COLUMN exercise_description TEXT"))
-            db.session.commit()
-            logger.info("✅ exercise_description字段添加成功")
-        except Exception as e:
-            error_msg = str(e).lower()
-            if 'already exists' in error_msg or 'duplicate column' in error_msg or 'duplicat' in error_msg:
-                logger.info("✅ exercise_description字段已存在")
-            else:
-                logger.warning(f"添加exercise_description字段失败: {e}")
-            db.session.rollback()
-
-# 延迟初始化数据库schema（在第一次请求时执行）
-_schema_initialized = False
+# 每个进程只检查一次schema版本（一条 SELECT MAX(version) 查询）
+_schema_checked = False
 
 def ensure_schema_initialized():
-    """确保数据库schema已初始化"""
-    global _schema_initialized
-    if not _schema_initialized:
+    """确保数据库schema已迁移到最新版本"""
+    global _schema_checked
+    if not _schema_checked:
         try:
-            init_database_schema()
-            _schema_initialized = True
+            ensure_schema_current()
+            _schema_checked = True
         except Exception as e:
-            logger.warning(f"数据库schema初始化失败: {e}")
+            logger.warning(f"数据库schema检查失败: {e}")
 
 @app.before_request
 def before_request():
     """在每个请求前确保数据库schema已初始化"""
+    g.request_started_at = time.monotonic()
     ensure_schema_initialized()
 
+# 登录身份缓存：会话ID带类型前缀（user:ID / admin:ID），两张表的ID可能相同
+IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', '30'))
+identity_cache = {}
+identity_cache_lock = threading.Lock()
+
+def parse_session_identity(session_id):
+    """解析会话中的身份，返回 (类型, ID)；旧会话只有数字ID时类型为None"""
+    kind, _, raw_id = str(session_id).rpartition(':')
+    if kind not in ('', 'user', 'admin'):
+        raise ValueError(f'未知的身份类型: {session_id}')
+    return kind or None, int(raw_id)
+
+def _fetch_identity(kind, identity_id):
+    """用独立session一次查询加载身份（用户连同资料和活跃目标），返回脱离session的对象"""
+    if kind == 'admin':
+        query = db.select(AdminUser).where(AdminUser.id == identity_id)
+    else:
+        query = db.select(User).options(
+            db.joinedload(User.profile), db.joinedload(User.active_goals)
+        ).where(User.id == identity_id)
+    with Session(db.engine) as session:
+        identity = session.execute(query).unique().scalar_one_or_none()
+        session.expunge_all()
+    return identity
+
+def get_cached_identity(kind, identity_id):
+    """读取身份缓存，未命中时加载并缓存IDENTITY_CACHE_TTL秒（不存在的身份不缓存）"""
+    key = (kind, identity_id)
+    now_ts = time.time()
+    with identity_cache_lock:
+        entry = identity_cache.get(key)
+        if entry and entry[0] > now_ts:
+            return entry[1]
+    identity = _fetch_identity(kind, identity_id)
+    if identity is not None and IDENTITY_CACHE_TTL > 0:
+        with identity_cache_lock:
+            identity_cache[key] = (now_ts + IDENTITY_CACHE_TTL, identity)
+    return identity
+
+def invalidate_identity(kind=None, identity_id=None):
+    """清除身份缓存；不传参数时清空全部"""
+    with identity_cache_lock:
+        if kind is None:
+            identity_cache.clear()
+        else:
+            identity_cache.pop((kind, identity_id), None)
+
 @login_manager.user_loader
 def load_user(user_id):
-    # 首先尝试加载普通用户
-    user = User.query.get(int(user_id))
-    if user:
-        return user
-    
-    # 如果不是普通用户，尝试加载管理员用户
-    admin = AdminUser.query.get(int(user_id))
-    if admin:
-        return admin
+    try:
+        kind, identity_id = parse_session_identity(user_id)
+    except ValueError:
+        return None
     
+    # 旧会话没有类型前缀：保持原来的顺序，先普通用户再管理员
+    for candidate in ((kind,) if kind else ('user', 'admin')):
+        identity = get_cached_identity(candidate, identity_id)
+        if identity is not None:
+            # 缓存的是脱离session的对象，合并进当前请求的session（load=False不发查询）
+            return db.session.merge(identity, load=False)
     return None
 
+def _identity_keys_for(obj):
+    """写入会影响哪些缓存身份：用户本身、资料、目标、管理员账号（含角色）"""
+    if isinstance(obj, User):
+        return [('user', obj.id)]
+    if isinstance(obj, (UserProfile, FitnessGoal)):
+        return [('user', obj.user_id)]
+    if isinstance(obj, AdminUser):
+        return [('admin', obj.id)]
+    return []
+
+@event.listens_for(Session, 'before_flush')
+def _track_identity_changes(session, flush_context, instances):
+    keys = session.info.setdefault('identity_invalidations', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        keys.update(_identity_keys_for(obj))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_identities_after_commit(session):
+    for kind, identity_id in session.info.pop('identity_invalidations', ()):
+        invalidate_identity(kind, identity_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_identity_changes(session):
+    session.info.pop('identity_invalidations', None)
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -159,6 +231,19 @@ class User(UserMixin, db.Model):
     exercise_logs = db.relationship('ExerciseLog', backref='user', cascade='all, delete-orphan')
     meal_logs = db.relationship('MealLog', backref='user', cascade='all, delete-orphan')
     weight_logs = db.relationship('WeightLog', backref='user', cascade='all, delete-orphan')
+    # 只读：当前生效的目标（最新的在前），登录时随用户一起加载
+    active_goals = db.relationship(
+        'FitnessGoal', viewonly=True,
+        primaryjoin='and_(User.id == FitnessGoal.user_id, FitnessGoal.is_active == True)',
+        order_by='(FitnessGoal.created_at.desc(), FitnessGoal.id.desc())'
+    )
+    
+    @property
+    def active_goal(self):
+        return self.active_goals[0] if self.active_goals else None
+    
+    def get_id(self):
+        return f'user:{self.id}'
 
 class UserProfile(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -216,6 +301,12 @@ class ExerciseLog(db.Model):
     ai_analysis_result = db.Column(db.JSON)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
+    # 按用户+日期/时间范围查询的复合索引
+    __table_args__ = (
+        db.Index('ix_exercise_log_user_date', 'user_id', 'date'),
+        db.Index('ix_exercise_log_user_created_at', 'user_id', 'created_at'),
+    )
+    
     @property
     def exercise_date(self):
         """兼容性属性 - 返回date字段"""
@@ -252,6 +343,14 @@ class ExerciseLog(db.Model):
         }
         return intensity_map.get(self.intensity, self.intensity)
 
+# 餐次中文名称
+MEAL_TYPE_NAMES = {
+    'breakfast': '早餐',
+    'lunch': '午餐',
+    'dinner': '晚餐',
+    'snack': '加餐'
+}
+
 class MealLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -270,8 +369,16 @@ class MealLog(db.Model):
     amount = db.Column(db.Float)  # 兼容旧代码的数量字段
     unit = db.Column(db.String(10))  # 兼容旧代码的单位字段
     meal_score = db.Column(db.Float)  # 膳食评分
+    # AI分析状态: 'pending', 'completed', 'failed'
+    analysis_status = db.Column(db.String(20), default='completed')
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
+    # 按用户+日期/时间范围查询的复合索引
+    __table_args__ = (
+        db.Index('ix_meal_log_user_date', 'user_id', 'date'),
+        db.Index('ix_meal_log_user_created_at', 'user_id', 'created_at'),
+    )
+    
     # 兼容性属性
     @property
     def meal_date(self):
@@ -299,13 +406,7 @@ class MealLog(db.Model):
     
     @property
     def meal_type_display(self):
-        type_map = {
-            'breakfast': '早餐',
-            'lunch': '午餐', 
-            'dinner': '晚餐',
-            'snack': '加餐'
-        }
-        return type_map.get(self.meal_type, self.meal_type)
+        return MEAL_TYPE_NAMES.get(self.meal_type, self.meal_type)
     
     @property
     def food_items_summary(self):
@@ -341,6 +442,30 @@ class MealLog(db.Model):
     
     # meal_score is now a regular database column, no property needed
 
+# AI分析租约（跨进程合并相同的并发分析请求）
+class AnalysisLease(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    lease_key = db.Column(db.String(80), unique=True, nullable=False)
+    owner = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed
+    result = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)  # UTC（不带时区）
+
+# 饮食AI分析任务（异步执行，记录保存后入队）
+class MealAnalysisJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # 任务状态: 'pending', 'running', 'completed', 'failed'
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)
+    payload = db.Column(db.JSON, nullable=False)  # meal_type, food_items, user_info, food_description, meal_ids
+    meal_ids = db.Column(db.JSON)  # 分析完成后的饮食记录ID（自然语言输入可能拆分为多条）
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
 # 后台管理系统数据模型
 class AdminUser(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -351,6 +476,9 @@ class AdminUser(UserMixin, db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     last_login = db.Column(db.DateTime)
+    
+    def get_id(self):
+        return f'admin:{self.id}'
 
 class PromptTemplate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -367,6 +495,19 @@ class PromptTemplate(db.Model):
         return '运动分析' if self.type == 'exercise' else '其他分析'
 
 # 体重记录模型
+def bmi_status_label(bmi):
+    """BMI状态描述"""
+    if not bmi:
+        return '未知'
+    if bmi < 18.5:
+        return '偏瘦'
+    elif bmi < 24:
+        return '正常'
+    elif bmi < 28:
+        return '偏胖'
+    else:
+        return '肥胖'
+
 class WeightLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -376,8 +517,11 @@ class WeightLog(db.Model):
     notes = db.Column(db.Text)  # 备注
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
-    # 确保每个用户每天只有一条记录
-    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='unique_user_date'),)
+    # 确保每个用户每天只有一条记录（唯一约束同时充当 (user_id, date) 索引）
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', name='unique_user_date'),
+        db.Index('ix_weight_log_user_created_at', 'user_id', 'created_at'),
+    )
     
     @property
     def date_display(self):
@@ -387,16 +531,7 @@ class WeightLog(db.Model):
     @property
     def bmi_status(self):
         """BMI状态描述"""
-        if not self.bmi:
-            return '未知'
-        if self.bmi < 18.5:
-            return '偏瘦'
-        elif self.bmi < 24:
-            return '正常'
-        elif self.bmi < 28:
-            return '偏胖'
-        else:
-            return '肥胖'
+        return bmi_status_label(self.bmi)
     
     @property
     def bmi_color(self):
@@ -412,6 +547,56 @@ class WeightLog(db.Model):
         else:
             return 'danger'
 
+# 用户每日汇总（饮食/运动/体重写入时在同一事务内维护，仪表盘和进度页按天读取）
+class UserDailySummary(db.Model):
+    __tablename__ = 'user_daily_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    calories_in = db.Column(db.Integer, default=0)  # 饮食摄入
+    calories_out = db.Column(db.Integer, default=0)  # 运动消耗
+    protein = db.Column(db.Float, default=0)
+    carbs = db.Column(db.Float, default=0)
+    fat = db.Column(db.Float, default=0)
+    exercise_minutes = db.Column(db.Integer, default=0)
+    exercise_count = db.Column(db.Integer, default=0)
+    meal_count = db.Column(db.Integer, default=0)
+    weight = db.Column(db.Float)  # 当天体重记录
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='unique_user_daily_summary'),)
+    
+    def to_dict(self):
+        return {
+            'date': self.date.isoformat(),
+            'calories_in': self.calories_in or 0,
+            'calories_out': self.calories_out or 0,
+            'protein': round(self.protein or 0, 1),
+            'carbs': round(self.carbs or 0, 1),
+            'fat': round(self.fat or 0, 1),
+            'exercise_minutes': self.exercise_minutes or 0,
+            'exercise_count': self.exercise_count or 0,
+            'meal_count': self.meal_count or 0,
+            'weight': self.weight
+        }
+
+# 全局计数器（后台控制台的总数统计，由写入钩子增量维护，避免每次全表COUNT）
+class AppCounter(db.Model):
+    __tablename__ = 'app_counter'
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+# AI分析结果持久化缓存（跨进程/冷启动共享）
+class AIAnalysisCache(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    cache_key = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    analysis_type = db.Column(db.String(20), nullable=False)  # meal
+    result = db.Column(db.JSON, nullable=False)
+    hit_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    expires_at = db.Column(db.DateTime, nullable=False)
+
 @app.route('/')
 def index():
     try:
@@ -482,19 +667,16 @@ def dashboard():
         # 获取用户资料
         profile = current_user.profile
         
-        # 获取活跃目标
-        active_goal = FitnessGoal.query.filter_by(
-            user_id=current_user.id,
-            is_active=True
-        ).first()
+        # 获取活跃目标（登录时已随用户一起加载）
+        active_goal = current_user.active_goal
         
         # 获取今日运动记录（安全查询避免字段缺失问题）
         today = datetime.now(timezone.utc).date()
-        from sqlalchemy import func
+        today_summary = UserDailySummary.query.filter_by(user_id=current_user.id, date=today).first()
         try:
             today_exercises = ExerciseLog.query.filter(
                 ExerciseLog.user_id == current_user.id,
-                func.date(ExerciseLog.created_at) == today
+                ExerciseLog.date == today
             ).all()
         except Exception as exercise_error:
             # 如果查询失败（可能是exercise_description字段缺失），使用只查询核心字段的方式
@@ -505,11 +687,11 @@ def dashboard():
                 ExerciseLog.created_at
             ).filter(
                 ExerciseLog.user_id == current_user.id,
-                func.date(ExerciseLog.created_at) == today
+                ExerciseLog.date == today
             ).all()
         
-        # 计算今日消耗热量（运动消耗 + 基础代谢）
-        exercise_burned = sum(ex.calories_burned or 0 for ex in today_exercises)
+        # 今日运动消耗取自每日汇总（运动消耗 + 基础代谢）
+        exercise_burned = today_summary.calories_out if today_summary else 0
         
         # 计算基础代谢率(BMR)
         bmr = 0
@@ -550,7 +732,7 @@ def dashboard():
         try:
             today_meals = MealLog.query.filter(
                 MealLog.user_id == current_user.id,
-                func.date(MealLog.created_at) == today
+                MealLog.date == today
             ).all()
         except Exception as meal_error:
             # 如果查询失败（可能是字段缺失），使用只查询核心字段的方式
@@ -559,28 +741,15 @@ def dashboard():
                 MealLog.id, MealLog.food_name, MealLog.calories, MealLog.meal_type, MealLog.created_at
             ).filter(
                 MealLog.user_id == current_user.id,
-                func.date(MealLog.created_at) == today
+                MealLog.date == today
             ).all()
         
-        # 计算今日摄入热量
-        total_consumed = sum(meal.calories or 0 for meal in today_meals)
-        
-        # 按餐次合并饮食记录
-        meals_by_type = {}
-        for meal in today_meals:
-            meal_type = meal.meal_type or 'other'
-            if meal_type not in meals_by_type:
-                meals_by_type[meal_type] = {
-                    'type': meal_type,
-                    'foods': [],
-                    'total_calories': 0,
-                    'created_at': meal.created_at
-                }
-            meals_by_type[meal_type]['foods'].append(meal)
-            meals_by_type[meal_type]['total_calories'] += (meal.calories or 0)
+        # 今日摄入热量取自每日汇总
+        total_consumed = today_summary.calories_in if today_summary else 0
         
-        # 转换为列表并按时间排序
-        grouped_meals = list(meals_by_type.values())
+        # 按餐次合并饮食记录（与饮食历史共用分组逻辑），按时间排序
+        today_groups = group_meals(today_meals, default_type='other')
+        grouped_meals = today_groups[0]['meals'] if today_groups else []
         grouped_meals.sort(key=lambda x: x['created_at'])
         
         return render_template('dashboard.html',
@@ -644,14 +813,222 @@ def profile_setup():
     
     return render_template('profile_setup.html')
 
+# 历史记录分页：每页行数
+MEAL_HISTORY_PAGE_SIZE = 50
+EXERCISE_HISTORY_PAGE_SIZE = 10
+HISTORY_MAX_PAGE_SIZE = 200
+
+def encode_history_cursor(record):
+    """把记录的 (date, created_at, id) 编码为不透明的游标字符串"""
+    raw = json.dumps([record.date.isoformat(), record.created_at.isoformat(), record.id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_history_cursor(cursor):
+    """解析游标，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        day, created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return date.fromisoformat(day), datetime.fromisoformat(created_at), int(record_id)
+    except Exception as e:
+        raise ValueError(f'无效的分页游标: {cursor}') from e
+
+def fetch_history_page(model, user_id, cursor=None, limit=MEAL_HISTORY_PAGE_SIZE):
+    """按 (date, created_at, id) 倒序做键集分页，返回 (记录列表, 下一页游标)
+
+    每页的代价只取决于limit，与用户历史长度无关。页尾那一天如果被截断，
+    会补齐当天剩余的记录，保证同一天不会被拆到两页。
+    """
+    order = (model.date.desc(), model.created_at.desc(), model.id.desc())
+    query = model.query.filter(model.user_id == user_id)
+    if cursor:
+        query = query.filter(tuple_(model.date, model.created_at, model.id) < decode_history_cursor(cursor))
+    records = query.order_by(*order).limit(limit + 1).all()
+
+    has_more = len(records) > limit
+    records = records[:limit]
+    if has_more and records:
+        last = records[-1]
+        records.extend(model.query.filter(
+            model.user_id == user_id,
+            model.date == last.date,
+            tuple_(model.created_at, model.id) < (last.created_at, last.id)
+        ).order_by(*order).all())
+
+    next_cursor = encode_history_cursor(records[-1]) if has_more and records else None
+    return records, next_cursor
+
+def _summarize_food_names(food_items):
+    """食物摘要：最多列出3种，超出时注明总数"""
+    if not food_items:
+        return '无食物记录'
+    summary = '、'.join(item['name'] for item in food_items[:3])
+    if len(food_items) > 3:
+        summary += f"等{len(food_items)}种食物"
+    return summary
+
+def group_meals(meals, default_type=None):
+    """一次遍历把饮食记录分组为 天 -> 餐次 -> 食物
+
+    用 日期 和 (日期, 餐次) 两级字典定位分组，每行记录只处理一次；
+    总热量、食物摘要和评分都在遍历中累积，不需要第二遍。
+    天的顺序与输入顺序一致（历史页按日期倒序传入），同一餐次下保留最新的分析结果。
+    兼容只查询了部分字段的行（仪表盘的兼容性查询），缺失字段按空值处理。
+    """
+    days = {}
+    for meal in meals:
+        meal_date = getattr(meal, 'date', None)
+        day = days.get(meal_date)
+        if day is None:
+            day = days[meal_date] = {
+                'date': meal_date,
+                'meals': [],
+                'meals_by_type': {},
+                'total_daily_calories': 0
+            }
+
+        meal_type = meal.meal_type or default_type
+        calories = meal.calories or 0
+        analysis_result = getattr(meal, 'analysis_result', None)
+        group = day['meals_by_type'].get(meal_type)
+        if group is None:
+            group = day['meals_by_type'][meal_type] = {
+                'id': meal.id,
+                'type': meal_type,
+                'meal_type': meal_type,
+                'meal_type_display': MEAL_TYPE_NAMES.get(meal_type, meal_type),
+                'foods': [],
+                'food_items': [],
+                'food_items_summary': _summarize_food_names([]),
+                'total_calories': 0,
+                'meal_score': 0,
+                'created_at': meal.created_at,
+                'analysis_result': None
+            }
+            day['meals'].append(group)
+
+        group['foods'].append(meal)
+        group['total_calories'] += calories
+        day['total_daily_calories'] += calories
+        if meal.food_name:
+            group['food_items'].append({
+                'name': meal.food_name,
+                'quantity': getattr(meal, 'quantity', None) or 1,
+                'unit': '份'
+            })
+            group['food_items_summary'] = _summarize_food_names(group['food_items'])
+        if analysis_result:
+            group['analysis_result'] = analysis_result
+            if isinstance(analysis_result, dict):
+                group['meal_score'] = (analysis_result.get('meal_analysis') or {}).get('meal_score', 0)
+
+    return list(days.values())
+
+def flatten_meal_history(days):
+    """展开为模板使用的餐次列表，每个餐次带上日期和当日总热量"""
+    recent_meals = []
+    for daily_data in days:
+        for meal_data in daily_data['meals']:
+            meal_data['date'] = daily_data['date']
+            meal_data['date_display'] = daily_data['date'].strftime('%m-%d')
+            meal_data['daily_total_calories'] = daily_data['total_daily_calories']
+            recent_meals.append(meal_data)
+    return recent_meals
+
+def serialize_meal_history_day(daily_data):
+    """把一天的分组结果转为JSON（不含完整的AI分析结果，查看报告时再单独加载）"""
+    return {
+        'date': daily_data['date'].isoformat(),
+        'date_display': daily_data['date'].strftime('%m-%d'),
+        'weekday': daily_data['date'].strftime('%A'),
+        'total_calories': daily_data['total_daily_calories'],
+        'meals': [{
+            'id': meal_data['id'],
+            'meal_type': meal_data['meal_type'],
+            'meal_type_display': meal_data['meal_type_display'],
+            'food_items': meal_data['food_items'],
+            'food_items_summary': meal_data['food_items_summary'],
+            'total_calories': meal_data['total_calories'],
+            'meal_score': meal_data['meal_score']
+        } for meal_data in daily_data['meals']]
+    }
+
+def serialize_exercise_history_day(day, exercises):
+    """把一天的运动记录转为JSON"""
+    return {
+        'date': day.isoformat(),
+        'date_display': day.strftime('%m-%d'),
+        'weekday': day.strftime('%a'),
+        'total_duration': sum(exercise.duration or 0 for exercise in exercises),
+        'total_calories': sum(exercise.calories_burned or 0 for exercise in exercises),
+        'exercises': [{
+            'id': exercise.id,
+            'exercise_type': exercise.exercise_type,
+            'exercise_type_display': exercise.exercise_type_display,
+            'exercise_name': exercise.exercise_name,
+            'duration': exercise.duration,
+            'calories_burned': exercise.calories_burned,
+            'intensity_display': exercise.intensity_display if exercise.intensity else None,
+            'analysis_status': exercise.analysis_status,
+            'notes': exercise.notes,
+            'ai_analysis_result': exercise.ai_analysis_result
+        } for exercise in exercises]
+    }
+
+def _history_page_args(default_limit):
+    """读取分页参数：cursor 和 limit（限制在 1..HISTORY_MAX_PAGE_SIZE）"""
+    limit = request.args.get('limit', default_limit, type=int) or default_limit
+    return request.args.get('cursor') or None, max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+
+@app.route('/api/meal-history')
+@login_required
+def meal_history_api():
+    """饮食历史分页API：返回按天、餐次分好组的一页记录和下一页游标"""
+    cursor, limit = _history_page_args(MEAL_HISTORY_PAGE_SIZE)
+    try:
+        meals, next_cursor = fetch_history_page(MealLog, current_user.id, cursor, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取饮食历史失败: {e}")
+        return jsonify({'success': False, 'error': '获取历史记录失败'}), 500
+
+    return jsonify({
+        'success': True,
+        'days': [serialize_meal_history_day(day) for day in group_meals(meals)],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/exercise-history')
+@login_required
+def exercise_history_api():
+    """运动历史分页API：返回按天分好组的一页记录和下一页游标"""
+    cursor, limit = _history_page_args(EXERCISE_HISTORY_PAGE_SIZE)
+    try:
+        exercises, next_cursor = fetch_history_page(ExerciseLog, current_user.id, cursor, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"获取运动历史失败: {e}")
+        return jsonify({'success': False, 'error': '获取历史记录失败'}), 500
+
+    # 记录已按日期倒序排列，相邻同日期的记录归为一组
+    days = []
+    for exercise in exercises:
+        if not days or days[-1][0] != exercise.date:
+            days.append((exercise.date, []))
+        days[-1][1].append(exercise)
+
+    return jsonify({
+        'success': True,
+        'days': [serialize_exercise_history_day(day, items) for day, items in days],
+        'next_cursor': next_cursor
+    })
+
 @app.route('/exercise-log', methods=['GET', 'POST'])
 @login_required
 def exercise_log():
     """运动记录页面"""
     try:
-        # 确保ExerciseLog表存在
-        db.create_all()
-        
         if request.method == 'POST':
             try:
                 exercise_date_str = request.form['exercise_date']
@@ -746,16 +1123,18 @@ def exercise_log():
                 flash('保存失败，请稍后重试')
                 return redirect(url_for('exercise_log'))
     
-        # 获取最近的运动记录
+        # 获取最近的运动记录（第一页），更早的记录由 /api/exercise-history 无限滚动加载
         try:
-            recent_exercises = ExerciseLog.query.filter_by(
-                user_id=current_user.id
-            ).order_by(ExerciseLog.created_at.desc()).limit(10).all()
+            recent_exercises, next_cursor = fetch_history_page(
+                ExerciseLog, current_user.id, limit=EXERCISE_HISTORY_PAGE_SIZE
+            )
         except Exception as e:
             logger.error(f"查询运动记录失败: {e}")
             recent_exercises = []
+            next_cursor = None
         
-        return render_template('exercise_log.html', recent_exercises=recent_exercises)
+        return render_template('exercise_log.html', recent_exercises=recent_exercises,
+                               next_cursor=next_cursor)
     
     except Exception as e:
         logger.error(f"运动记录页面错误: {e}")
@@ -769,9 +1148,6 @@ def exercise_log():
 def meal_log():
     """饮食记录页面"""
     try:
-        # 确保MealLog表存在
-        db.create_all()
-        
         if request.method == 'POST':
             meal_date_str = request.form['meal_date']
             meal_type = request.form['meal_type']
@@ -810,256 +1186,91 @@ def meal_log():
                         'unit': food_units[i] if i < len(food_units) else '个'
                     })
             
-            # 如果没有手动输入但有自然语言描述，尝试解析
-            if not food_items and food_description:
-                try:
-                    # 尝试使用AI解析自然语言
-                    parse_result = parse_natural_language_food(food_description, meal_type)
-                    if parse_result['success']:
-                        food_items = parse_result['food_items']
-                        logger.info(f"成功解析自然语言输入: {len(food_items)}项食物")
-                    else:
-                        # AI解析失败，创建简单的食物项
-                        food_items = [{
-                            'name': food_description[:100],  # 截取描述作为食物名
-                            'amount': 1,
-                            'unit': '份'
-                        }]
-                        logger.info("AI解析失败，使用简化食物项")
-                except Exception as e:
-                    logger.warning(f"自然语言解析失败: {e}")
-                    # 解析完全失败时，仍然创建一个基础记录
-                    food_items = [{
-                        'name': food_description[:100],
-                        'amount': 1,
-                        'unit': '份'
-                    }]
-            
             # 检查是否有任何食物信息
             if not food_items and not food_description:
                 flash('请描述您的饮食或手动添加食物项！')
                 return redirect(url_for('meal_log'))
             
-            # 创建饮食记录（每个食物项创建单独记录）
+            # 只有自然语言描述时先保存一条占位记录，AI解析后再拆分为具体食物
+            if not food_items:
+                food_items = [{
+                    'name': food_description[:100],
+                    'amount': 1,
+                    'unit': '份'
+                }]
+                needs_parsing = True
+            else:
+                needs_parsing = False
+            
+            # 立即保存饮食记录，AI分析进入后台任务队列
             try:
                 # 准备notes信息
                 combined_notes = {'notes': notes}
                 if food_description:
                     combined_notes['original_description'] = food_description
                 
-                # 为每个食物项创建单独的记录并收集ID
-                saved_entries = []
-                for food_item in food_items:
-                    meal_log_entry = MealLog(
-                        user_id=current_user.id,
-                        date=meal_date,  # 使用date字段
-                        meal_type=meal_type,
-                        food_name=food_item.get('name', '未知食物'),
-                        quantity=food_item.get('amount', 1),
-                        amount=food_item.get('amount', 1),  # 新字段
-                        unit=food_item.get('unit', '份'),  # 新字段
-                        food_description=food_description,  # 新字段：原始描述
-                        calories=0,  # 初始值，等AI分析后更新
-                        analysis_result=combined_notes
-                    )
-                    
-                    db.session.add(meal_log_entry)
-                    saved_entries.append(meal_log_entry)
+                # 每个食物项一条记录，一条多行INSERT写入
+                meal_ids = insert_meal_logs([{
+                    'user_id': current_user.id,
+                    'date': meal_date,
+                    'meal_type': meal_type,
+                    'food_name': food_item.get('name', '未知食物'),
+                    'quantity': food_item.get('amount', 1),
+                    'amount': food_item.get('amount', 1),
+                    'unit': food_item.get('unit', '份'),
+                    'food_description': food_description,
+                    'calories': 0,  # 初始值，等AI分析后更新
+                    'analysis_result': combined_notes,
+                    'analysis_status': 'pending'
+                } for food_item in food_items])
                 
+                job = MealAnalysisJob(
+                    user_id=current_user.id,
+                    status='pending',
+                    payload={
+                        'meal_type': meal_type,
+                        'food_items': [] if needs_parsing else food_items,
+                        'food_description': food_description,
+                        'notes': notes,
+                        'user_info': build_meal_user_info(current_user),
+                        'meal_ids': meal_ids
+                    }
+                )
+                db.session.add(job)
                 db.session.commit()
                 
-                # 获取保存后的记录ID
-                meal_ids = [entry.id for entry in saved_entries]
+                enqueue_meal_analysis_job(job.id)
+                logger.info(f"用户{current_user.id}保存了{len(meal_ids)}条饮食记录，分析任务{job.id}已入队")
                 
-                # 立即进行AI分析并更新营养数据
-                try:
-                    # 获取用户资料用于AI分析
-                    user_profile = getattr(current_user, 'profile', None)
-                    if not user_profile:
-                        weight = 70
-                        height = 170
-                        age = 30
-                        gender = '未知'
-                        fitness_goal = 'maintain_weight'
-                    else:
-                        weight = user_profile.weight or 70
-                        height = user_profile.height or 170
-                        age = user_profile.age or 30
-                        gender = user_profile.gender or '未知'
-                        fitness_goal = getattr(user_profile, 'fitness_goals', 'maintain_weight')
-                    
-                    # 调用AI分析
-                    print(f"开始AI分析 - 餐次: {meal_type}, 食物项: {len(food_items)}, 描述: {food_description[:100] if food_description else 'None'}")
-                    analysis_result = call_gemini_meal_analysis(meal_type, food_items, {
-                        'age': age,
-                        'gender': gender,
-                        'weight': weight,
-                        'height': height,
-                        'fitness_goal': fitness_goal
-                    }, food_description)
-                    print(f"AI分析结果: {'成功' if analysis_result else '失败'}")
-                    if analysis_result:
-                        print(f"分析结果类型: {type(analysis_result)}")
-                        print(f"分析结果keys: {list(analysis_result.keys()) if isinstance(analysis_result, dict) else 'N/A'}")
-                        basic = analysis_result.get('basic_nutrition', {}) if isinstance(analysis_result, dict) else {}
-                        print(f"basic_nutrition存在: {'是' if basic else '否'}")
-                        if basic:
-                            print(f"  热量: {basic.get('total_calories', 'N/A')}")
-                    
-                    # 更新营养数据
-                    if analysis_result:
-                        basic_nutrition = analysis_result.get('basic_nutrition', {})
-                        total_calories = basic_nutrition.get('total_calories', 0)
-                        protein = basic_nutrition.get('protein', 0)
-                        carbs = basic_nutrition.get('carbohydrates', 0)
-                        fat = basic_nutrition.get('fat', 0)
-                        
-                        # 提取meal_score
-                        meal_analysis = analysis_result.get('meal_analysis', {})
-                        meal_score = meal_analysis.get('meal_score', 7)
-                        
-                        # 按食物数量分配营养素
-                        food_count = len(saved_entries)
-                        for entry in saved_entries:
-                            entry.calories = int(total_calories / food_count) if food_count > 0 else total_calories
-                            entry.protein = round(protein / food_count, 1) if food_count > 0 else protein
-                            entry.carbs = round(carbs / food_count, 1) if food_count > 0 else carbs
-                            entry.fat = round(fat / food_count, 1) if food_count > 0 else fat
-                            entry.meal_score = meal_score  # 保存膳食评分
-                            entry.analysis_result = analysis_result
-                        
-                        db.session.commit()
-                        logger.info(f"自动更新了{len(saved_entries)}条饮食记录的营养数据")
-                        
-                        # 🚨 关键修复4: 验证数据库更新结果
-                        verification_failed = False
-                        for entry in saved_entries:
-                            db.session.refresh(entry)  # 刷新数据库状态
-                            if entry.calories <= 0:
-                                print(f"❌ WARNING: 记录{entry.id}热量仍为0，尝试修复")
-                                entry.calories = max(200, total_calories // len(saved_entries))
-                                entry.protein = max(5, protein // len(saved_entries))
-                                entry.carbs = max(10, carbs // len(saved_entries))
-                                entry.fat = max(3, fat // len(saved_entries))
-                                verification_failed = True
-                        
-                        if verification_failed:
-                            db.session.commit()
-                            print(f"✅ 已修复零热量记录")
-                        
-                        flash(f'饮食记录已保存并完成AI营养分析！共记录了{len(saved_entries)}种食物，总热量{total_calories}卡路里')
-                    else:
-                        flash(f'饮食记录已保存！共记录了{len(saved_entries)}种食物，AI分析失败请稍后重试')
-                        
-                except Exception as ai_error:
-                    import traceback
-                    error_details = traceback.format_exc()
-                    print(f"❌ AI分析异常详情: {ai_error}")
-                    print(f"❌ 完整错误栈: {error_details}")
-                    logger.error(f"AI分析失败: {ai_error}")
-                    flash(f'饮食记录已保存！共记录了{len(saved_entries)}种食物，AI分析失败: {str(ai_error)}')
+                # 统一AI流程（前端轮询分析状态），返回JSON
+                if request.form.get('analysis_status') == 'pending':
+                    return jsonify({
+                        'success': True,
+                        'job_id': job.id,
+                        'meal_ids': meal_ids,
+                        'status_url': url_for('meal_analysis_job_status', job_id=job.id),
+                        'message': '饮食记录已保存，AI分析进行中...'
+                    })
                 
+                flash(f'饮食记录已保存！共记录了{len(meal_ids)}种食物，AI营养分析进行中')
                 return redirect(url_for('meal_log'))
                 
             except Exception as e:
                 db.session.rollback()
                 logger.error(f"保存饮食记录失败: {e}")
+                if request.form.get('analysis_status') == 'pending':
+                    return jsonify({'success': False, 'error': '保存失败，请稍后重试'}), 500
                 flash('保存失败，请稍后重试')
                 return redirect(url_for('meal_log'))
         
-        # 获取最近的饮食记录并按日期分组
+        # 第一页历史记录由服务端渲染，后续页面由前端通过 /api/meal-history 无限滚动加载
         try:
-            # 获取最近30天的饮食记录
-            all_meals = MealLog.query.filter_by(
-                user_id=current_user.id
-            ).order_by(MealLog.date.desc(), MealLog.created_at.desc()).limit(100).all()
-            
-            # 按日期分组，每个日期下包含所有餐次
-            daily_grouped_meals = {}
-            for meal in all_meals:
-                date_key = meal.date.isoformat()
-                
-                if date_key not in daily_grouped_meals:
-                    daily_grouped_meals[date_key] = {
-                        'date': meal.date,
-                        'meals': [],
-                        'total_daily_calories': 0
-                    }
-                
-                # 查找是否已有相同餐次的记录
-                existing_meal = None
-                for existing in daily_grouped_meals[date_key]['meals']:
-                    if existing['meal_type'] == meal.meal_type:
-                        existing_meal = existing
-                        break
-                
-                if existing_meal:
-                    # 合并同餐次的食物
-                    if meal.food_name:
-                        existing_meal['food_items'].append({
-                            'name': meal.food_name,
-                            'quantity': meal.quantity or 1,
-                            'unit': '份'
-                        })
-                        existing_meal['total_calories'] += meal.calories or 0
-                        daily_grouped_meals[date_key]['total_daily_calories'] += meal.calories or 0
-                        
-                        # 更新analysis_result（使用最新的）
-                        if meal.analysis_result:
-                            existing_meal['analysis_result'] = meal.analysis_result
-                else:
-                    # 创建新的餐次记录
-                    meal_data = {
-                        'id': meal.id,
-                        'meal_type': meal.meal_type,
-                        'meal_type_display': meal.meal_type_display,
-                        'food_items': [],
-                        'total_calories': meal.calories or 0,
-                        'created_at': meal.created_at,
-                        'analysis_result': meal.analysis_result
-                    }
-                    
-                    if meal.food_name:
-                        meal_data['food_items'].append({
-                            'name': meal.food_name,
-                            'quantity': meal.quantity or 1,
-                            'unit': '份'
-                        })
-                    
-                    daily_grouped_meals[date_key]['meals'].append(meal_data)
-                    daily_grouped_meals[date_key]['total_daily_calories'] += meal.calories or 0
-            
-            # 转换为模板需要的格式
-            recent_meals = []
-            for date_key in sorted(daily_grouped_meals.keys(), reverse=True)[:7]:  # 最近7天
-                daily_data = daily_grouped_meals[date_key]
-                
-                for meal_data in daily_data['meals']:
-                    # 生成食物摘要
-                    food_names = [item['name'] for item in meal_data['food_items']]
-                    meal_data['food_items_summary'] = '、'.join(food_names[:3]) if food_names else '无食物记录'
-                    if len(food_names) > 3:
-                        meal_data['food_items_summary'] += f"等{len(food_names)}种食物"
-                    
-                    # 日期显示格式
-                    meal_data['date'] = daily_data['date']
-                    meal_data['date_display'] = daily_data['date'].strftime('%m-%d')
-                    
-                    # 从analysis_result中提取meal_score
-                    if meal_data['analysis_result'] and isinstance(meal_data['analysis_result'], dict):
-                        meal_analysis = meal_data['analysis_result'].get('meal_analysis', {})
-                        meal_data['meal_score'] = meal_analysis.get('meal_score', 0)
-                    else:
-                        meal_data['meal_score'] = 0
-                    
-                    # 添加日期总热量信息（用于新模板）
-                    meal_data['daily_total_calories'] = daily_data['total_daily_calories']
-                    
-                    recent_meals.append(meal_data)
-                
+            page_meals, next_cursor = fetch_history_page(MealLog, current_user.id, limit=MEAL_HISTORY_PAGE_SIZE)
+            recent_meals = flatten_meal_history(group_meals(page_meals))
         except Exception as e:
             logger.error(f"获取饮食记录失败: {e}")
             recent_meals = []
+            next_cursor = None
         
         print(f"🔍 调试信息 - 准备渲染模板:")
         print(f"  recent_meals数量: {len(recent_meals)}")
@@ -1067,6 +1278,7 @@ def meal_log():
         
         return render_template('meal_log_new.html', 
                              recent_meals=recent_meals,
+                             next_cursor=next_cursor,
                              today=datetime.now(timezone.utc).date())
         
     except Exception as e:
@@ -1074,6 +1286,227 @@ def meal_log():
         flash('页面加载失败，请稍后重试')
         return redirect(url_for('dashboard'))
 
+def build_meal_user_info(user):
+    """提取用于饮食AI分析的用户资料（缺失字段使用默认值）"""
+    user_profile = getattr(user, 'profile', None)
+    if not user_profile:
+        return {
+            'age': 30,
+            'gender': '未知',
+            'weight': 70,
+            'height': 170,
+            'fitness_goal': 'maintain_weight'
+        }
+    return {
+        'age': user_profile.age or 30,
+        'gender': user_profile.gender or '未知',
+        'weight': user_profile.weight or 70,
+        'height': user_profile.height or 170,
+        'fitness_goal': getattr(user_profile, 'fitness_goals', 'maintain_weight')
+    }
+
+# ==================== 饮食AI分析任务队列 ====================
+# 任务先写入meal_analysis_job表，再提交到有界线程池执行；
+# 进程被冻结/回收时，状态查询接口会把超时未完成的任务重新入队。
+MEAL_ANALYSIS_WORKERS = int(os.getenv('MEAL_ANALYSIS_WORKERS', '4'))
+MEAL_ANALYSIS_QUEUE_SIZE = int(os.getenv('MEAL_ANALYSIS_QUEUE_SIZE', '32'))
+MEAL_ANALYSIS_LEASE_SECONDS = int(os.getenv('MEAL_ANALYSIS_LEASE_SECONDS', '60'))
+
+_meal_analysis_executor = None
+_meal_analysis_slots = threading.BoundedSemaphore(MEAL_ANALYSIS_QUEUE_SIZE)
+_meal_analysis_inflight = set()
+_meal_analysis_lock = threading.Lock()
+
+def _get_meal_analysis_executor():
+    """延迟创建分析线程池"""
+    global _meal_analysis_executor
+    with _meal_analysis_lock:
+        if _meal_analysis_executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _meal_analysis_executor = ThreadPoolExecutor(
+                max_workers=MEAL_ANALYSIS_WORKERS, thread_name_prefix='meal-analysis')
+        return _meal_analysis_executor
+
+def enqueue_meal_analysis_job(job_id):
+    """将分析任务提交到线程池，队列已满或已在执行时返回False（任务仍保留在数据库中）"""
+    with _meal_analysis_lock:
+        if job_id in _meal_analysis_inflight:
+            return False
+        if not _meal_analysis_slots.acquire(blocking=False):
+            logger.warning(f"饮食分析队列已满，任务{job_id}等待重新入队")
+            return False
+        _meal_analysis_inflight.add(job_id)
+
+    def _run():
+        try:
+            with app.app_context():
+                process_meal_analysis_job(job_id)
+        finally:
+            with _meal_analysis_lock:
+                _meal_analysis_inflight.discard(job_id)
+            _meal_analysis_slots.release()
+
+    try:
+        _get_meal_analysis_executor().submit(_run)
+    except RuntimeError as e:
+        with _meal_analysis_lock:
+            _meal_analysis_inflight.discard(job_id)
+        _meal_analysis_slots.release()
+        logger.error(f"提交饮食分析任务{job_id}失败: {e}")
+        return False
+    return True
+
+def _claim_meal_analysis_job(job_id):
+    """原子地领取任务：pending任务，或租约已过期的running任务"""
+    now = datetime.now(timezone.utc)
+    lease_expired = now - timedelta(seconds=MEAL_ANALYSIS_LEASE_SECONDS)
+    claimed = MealAnalysisJob.query.filter(
+        MealAnalysisJob.id == job_id,
+        db.or_(
+            MealAnalysisJob.status == 'pending',
+            db.and_(MealAnalysisJob.status == 'running', MealAnalysisJob.started_at < lease_expired)
+        )
+    ).update({
+        'status': 'running',
+        'started_at': now,
+        'attempts': MealAnalysisJob.attempts + 1
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+def process_meal_analysis_job(job_id):
+    """执行一条饮食分析任务：调用AI分析并回写饮食记录的营养数据"""
+    if not _claim_meal_analysis_job(job_id):
+        return
+    
+    job = db.session.get(MealAnalysisJob, job_id)
+    payload = job.payload or {}
+    try:
+        analysis_result = call_gemini_meal_analysis(
+            payload.get('meal_type'),
+            payload.get('food_items') or [],
+            payload.get('user_info') or build_meal_user_info(None),
+            payload.get('food_description')
+        )
+        
+        meals = db.session.execute(
+            db.select(MealLog.id, MealLog.food_name, MealLog.quantity, MealLog.amount, MealLog.unit,
+                      MealLog.user_id, MealLog.date, MealLog.meal_type, MealLog.food_description,
+                      MealLog.created_at)
+            .where(MealLog.id.in_(job.meal_ids or payload.get('meal_ids') or []),
+                   MealLog.user_id == job.user_id)
+            .order_by(MealLog.id)
+        ).all()
+        if not meals:
+            raise ValueError('任务对应的饮食记录不存在')
+        
+        # 自然语言输入：用解析出的食物替换占位记录，其余食物一条多行INSERT写入。
+        # 是否已拆分看任务行的 meal_ids（与拆分在同一事务内写入），不能看占位记录的名称：
+        # 描述本身可能就等于第一种食物的名称
+        if not payload.get('food_items') and job.meal_ids is None and len(payload.get('meal_ids') or []) == 1:
+            parsed_foods = (analysis_result.get('parsed_food_info') or {}).get('parsed_foods') or []
+            if parsed_foods:
+                template = meals[0]
+                foods = [{
+                    'food_name': str(food_item.get('name', '未知食物'))[:100],
+                    'quantity': food_item.get('amount', 1),
+                    'amount': food_item.get('amount', 1),
+                    'unit': str(food_item.get('unit', '份'))[:10]
+                } for food_item in parsed_foods]
+                new_ids = insert_meal_logs([dict(
+                    food,
+                    user_id=template.user_id,
+                    date=template.date,
+                    meal_type=template.meal_type,
+                    food_description=template.food_description,
+                    created_at=template.created_at,
+                    analysis_status='pending'
+                ) for food in foods[1:]])
+                meals = [SimpleNamespace(id=meal_id, **food)
+                         for meal_id, food in zip([template.id] + new_ids, foods)]
+                job.meal_ids = [entry.id for entry in meals]
+        
+        meal_score = analysis_result.get('meal_analysis', {}).get('meal_score', 7)
+        
+        combined_notes = {'notes': payload.get('notes', '')}
+        if payload.get('food_description'):
+            combined_notes['original_description'] = payload['food_description']
+        
+        # 按每项食物的实际营养写回（含拆分后的食物名称和数量），一条批量UPDATE
+        row_result = dict(analysis_result, **combined_notes)
+        food_count = bulk_update_meal_nutrition(meals, analysis_result, lambda entry: {
+            'food_name': entry.food_name,
+            'quantity': entry.quantity,
+            'amount': entry.amount,
+            'unit': entry.unit,
+            'meal_score': meal_score,
+            'analysis_result': row_result,
+            'analysis_status': 'completed'
+        })
+        job.status = 'completed'
+        job.meal_ids = [entry.id for entry in meals]
+        job.error = None
+        job.finished_at = datetime.now(timezone.utc)
+        db.session.commit()
+        logger.info(f"饮食分析任务{job_id}完成，更新了{food_count}条记录")
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"饮食分析任务{job_id}失败: {e}")
+        job = db.session.get(MealAnalysisJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)[:500]
+        job.finished_at = datetime.now(timezone.utc)
+        MealLog.query.filter(
+            MealLog.id.in_(payload.get('meal_ids') or []),
+            MealLog.user_id == job.user_id
+        ).update({'analysis_status': 'failed'}, synchronize_session=False)
+        db.session.commit()
+
+def drain_meal_analysis_jobs(limit=20):
+    """同步处理积压的任务（供独立worker进程或定时任务调用），返回处理的任务数"""
+    lease_expired = datetime.now(timezone.utc) - timedelta(seconds=MEAL_ANALYSIS_LEASE_SECONDS)
+    job_ids = [row.id for row in db.session.query(MealAnalysisJob.id).filter(
+        db.or_(
+            MealAnalysisJob.status == 'pending',
+            db.and_(MealAnalysisJob.status == 'running', MealAnalysisJob.started_at < lease_expired)
+        )
+    ).order_by(MealAnalysisJob.id).limit(limit).all()]
+    for job_id in job_ids:
+        process_meal_analysis_job(job_id)
+    return len(job_ids)
+
+@app.route('/api/meal-analysis-jobs/<int:job_id>', methods=['GET'])
+@login_required
+def meal_analysis_job_status(job_id):
+    """查询饮食AI分析任务状态（前端轮询）"""
+    job = MealAnalysisJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if not job:
+        return jsonify({'success': False, 'error': '未找到指定的分析任务'}), 404
+    
+    # 任务未在本进程执行且已超时（进程被回收等），重新入队
+    if job.status in ('pending', 'running'):
+        started_at = job.started_at or job.created_at
+        if started_at and started_at.tzinfo is None:
+            started_at = started_at.replace(tzinfo=timezone.utc)
+        stale = job.status == 'pending' or (
+            started_at and (datetime.now(timezone.utc) - started_at).total_seconds() > MEAL_ANALYSIS_LEASE_SECONDS)
+        if stale:
+            enqueue_meal_analysis_job(job.id)
+    
+    response = {
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'meal_ids': job.meal_ids or (job.payload or {}).get('meal_ids', [])
+    }
+    if job.status == 'completed':
+        meals = MealLog.query.filter(MealLog.id.in_(response['meal_ids'])).all()
+        response['total_calories'] = sum(meal.calories or 0 for meal in meals)
+    elif job.status == 'failed':
+        response['error'] = 'AI分析失败，请稍后重试'
+    return jsonify(response)
+
 def estimate_calories_burned(exercise_type, exercise_name, duration, weight):
     """估算消耗的卡路里"""
     # MET值表（代谢当量）
@@ -1236,29 +1669,27 @@ def analyze_exercise():
             age = user_profile.age or 30
             gender = user_profile.gender or '未知'
         
-        # 调用Gemini AI进行运动分析
+        user_info = {
+            'age': age,
+            'gender': gender,
+            'weight': weight,
+            'height': height,
+            'activity_level': getattr(user_profile, 'activity_level', 'moderately_active')
+        }
+        
+        # 调用Gemini AI进行运动分析（相同输入的并发请求合并为一次调用）
         if exercise_description:
             # 新的自然语言描述分析
-            analysis_result = call_gemini_exercise_analysis(
-                None, None, None, {
-                    'age': age,
-                    'gender': gender,
-                    'weight': weight,
-                    'height': height,
-                    'activity_level': getattr(user_profile, 'activity_level', 'moderately_active')
-                }, exercise_description  # 传递运动描述
-            )
+            analysis_key = build_exercise_analysis_key(None, None, None, user_info, exercise_description)
+            analysis_result = run_single_flight('exercise:' + analysis_key, lambda: call_gemini_exercise_analysis(
+                None, None, None, user_info, exercise_description  # 传递运动描述
+            ), lambda: generate_fallback_exercise_analysis(None, None, None, user_info, exercise_description))
         else:
             # 传统的分离字段分析
-            analysis_result = call_gemini_exercise_analysis(
-                exercise_type, exercise_name, duration, {
-                    'age': age,
-                    'gender': gender,
-                    'weight': weight,
-                    'height': height,
-                    'activity_level': getattr(user_profile, 'activity_level', 'moderately_active')
-                }
-            )
+            analysis_key = build_exercise_analysis_key(exercise_type, exercise_name, duration, user_info)
+            analysis_result = run_single_flight('exercise:' + analysis_key, lambda: call_gemini_exercise_analysis(
+                exercise_type, exercise_name, duration, user_info
+            ), lambda: generate_fallback_exercise_analysis(exercise_type, exercise_name, duration, user_info))
         
         # 如果提供了exercise_id，更新已存在的记录
         if exercise_id:
@@ -1448,49 +1879,35 @@ def analyze_meal():
             gender = user_profile.gender or '未知'
             fitness_goal = getattr(user_profile, 'fitness_goals', 'maintain_weight')
         
-        # 调用Gemini AI进行营养分析
-        analysis_result = call_gemini_meal_analysis(meal_type, food_items, {
+        user_info = {
             'age': age,
             'gender': gender,
             'weight': weight,
             'height': height,
             'fitness_goal': fitness_goal
-        }, natural_language_input)
+        }
+        
+        # 调用Gemini AI进行营养分析（相同输入的并发请求合并为一次调用）
+        analysis_key = build_meal_analysis_cache_key(meal_type, food_items, user_info, natural_language_input)
+        analysis_result = run_single_flight('meal:' + analysis_key, lambda: call_gemini_meal_analysis(
+            meal_type, food_items, user_info, natural_language_input
+        ), lambda: build_meal_fallback_analysis(meal_type, food_items, natural_language_input))
         
         # 如果有meal_ids参数，更新对应的饮食记录
         meal_ids = data.get('meal_ids', [])
         if meal_ids and analysis_result:
             try:
-                # 从AI分析结果中提取营养数据
-                basic_nutrition = analysis_result.get('basic_nutrition', {})
-                total_calories = basic_nutrition.get('total_calories', 0)
-                protein = basic_nutrition.get('protein', 0)
-                carbs = basic_nutrition.get('carbohydrates', 0)
-                fat = basic_nutrition.get('fat', 0)
-                
-                # 更新每个饮食记录
-                for meal_id in meal_ids:
-                    meal_record = MealLog.query.filter_by(
-                        id=meal_id,
-                        user_id=current_user.id
-                    ).first()
-                    
-                    if meal_record:
-                        # 按食物数量分配营养素（简化处理）
-                        food_count = len(meal_ids)
-                        meal_record.calories = int(total_calories / food_count) if food_count > 0 else total_calories
-                        meal_record.protein = round(protein / food_count, 1) if food_count > 0 else protein
-                        meal_record.carbs = round(carbs / food_count, 1) if food_count > 0 else carbs
-                        meal_record.fat = round(fat / food_count, 1) if food_count > 0 else fat
-                        
-                        # 保存AI分析结果
-                        if meal_record.analysis_result:
-                            meal_record.analysis_result.update(analysis_result)
-                        else:
-                            meal_record.analysis_result = analysis_result
+                # 按每项食物的营养更新对应的饮食记录（一条批量UPDATE）
+                meal_records = MealLog.query.filter(
+                    MealLog.id.in_(meal_ids),
+                    MealLog.user_id == current_user.id
+                ).order_by(MealLog.id).all()
+                updated_count = bulk_update_meal_nutrition(meal_records, analysis_result, lambda meal: {
+                    'analysis_result': dict(meal.analysis_result or {}, **analysis_result)
+                })
                 
                 db.session.commit()
-                logger.info(f"更新了{len(meal_ids)}条饮食记录的营养数据")
+                logger.info(f"更新了{updated_count}条饮食记录的营养数据")
                 
             except Exception as e:
                 logger.error(f"更新饮食记录营养数据失败: {e}")
@@ -1527,37 +1944,14 @@ def update_meal_nutrition():
         if not meal_ids or not nutrition_data:
             return jsonify({'error': '缺少必要的参数'}), 400
         
-        # 提取营养数据
-        basic_nutrition = nutrition_data.get('basic_nutrition', {})
-        total_calories = basic_nutrition.get('total_calories', 0)
-        protein = basic_nutrition.get('protein', 0)
-        carbs = basic_nutrition.get('carbohydrates', 0)
-        fat = basic_nutrition.get('fat', 0)
-        
-        updated_count = 0
-        
-        # 更新每个饮食记录
-        for meal_id in meal_ids:
-            meal_record = MealLog.query.filter_by(
-                id=meal_id,
-                user_id=current_user.id
-            ).first()
-            
-            if meal_record:
-                # 按食物数量平均分配营养素
-                food_count = len(meal_ids)
-                meal_record.calories = int(total_calories / food_count) if food_count > 0 else total_calories
-                meal_record.protein = round(protein / food_count, 1) if food_count > 0 else protein
-                meal_record.carbs = round(carbs / food_count, 1) if food_count > 0 else carbs
-                meal_record.fat = round(fat / food_count, 1) if food_count > 0 else fat
-                
-                # 更新analysis_result
-                if meal_record.analysis_result:
-                    meal_record.analysis_result.update(nutrition_data)
-                else:
-                    meal_record.analysis_result = nutrition_data
-                
-                updated_count += 1
+        # 按每项食物的营养更新饮食记录（一条批量UPDATE）
+        meal_records = MealLog.query.filter(
+            MealLog.id.in_(meal_ids),
+            MealLog.user_id == current_user.id
+        ).order_by(MealLog.id).all()
+        updated_count = bulk_update_meal_nutrition(meal_records, nutrition_data, lambda meal: {
+            'analysis_result': dict(meal.analysis_result or {}, **nutrition_data)
+        })
         
         db.session.commit()
         
@@ -1706,18 +2100,24 @@ def progress():
         end_date = date.today()
         start_date = end_date - timedelta(days=days)
         
-        # 获取运动数据
-        exercises_data = get_exercises_data(current_user.id, start_date, end_date)
+        # 每日汇总：所选区间 + 热力图的最近90天，一次查询
+        heatmap_start = end_date - timedelta(days=PROGRESS_HEATMAP_DAYS)
+        summaries = get_daily_summaries(current_user.id, min(start_date, heatmap_start), end_date)
+        daily_summaries = [summary.to_dict() for summary in summaries if summary.date >= start_date]
+        heatmap_activity = {
+            summary.date.isoformat(): (summary.exercise_count or 0) + (summary.meal_count or 0)
+            for summary in summaries if summary.date >= heatmap_start
+        }
         
-        # 获取饮食数据
-        meals_data = get_meals_data(current_user.id, start_date, end_date)
+        # 按运动类型/强度的聚合在数据库中GROUP BY完成
+        exercise_breakdown = get_exercise_breakdown(current_user.id, start_date, end_date)
         
         # 计算统计数据
-        stats = calculate_progress_stats(exercises_data, meals_data)
+        stats = calculate_progress_stats(daily_summaries, exercise_breakdown)
         
         return render_template('progress.html', 
-                             exercises_data=exercises_data,
-                             meals_data=meals_data,
+                             daily_summaries=daily_summaries,
+                             heatmap_activity=heatmap_activity,
                              stats=stats)
                              
     except Exception as e:
@@ -1725,80 +2125,57 @@ def progress():
         flash('页面加载失败，请稍后重试')
         return redirect(url_for('dashboard'))
 
-def get_exercises_data(user_id, start_date, end_date):
-    """获取用户运动数据"""
+def get_exercise_breakdown(user_id, start_date, end_date):
+    """按 (运动类型, 强度) GROUP BY 返回次数和总时长"""
+    from sqlalchemy import func
+    
     try:
-        exercises = ExerciseLog.query.filter(
+        rows = db.session.query(
+            ExerciseLog.exercise_type,
+            ExerciseLog.intensity,
+            func.count(ExerciseLog.id),
+            func.coalesce(func.sum(ExerciseLog.duration), 0)
+        ).filter(
             ExerciseLog.user_id == user_id,
             ExerciseLog.date >= start_date,
             ExerciseLog.date <= end_date
-        ).order_by(ExerciseLog.date.desc()).all()
-        
-        return [{
-            'date': exercise.date.isoformat(),
-            'exercise_type': exercise.exercise_type,
-            'exercise_name': exercise.exercise_name,
-            'duration': exercise.duration,
-            'calories_burned': exercise.calories_burned or 0,
-            'intensity': exercise.intensity or 'medium'
-        } for exercise in exercises]
-        
-    except Exception as e:
-        logger.error(f"获取运动数据失败: {e}")
-        return []
-
-def get_meals_data(user_id, start_date, end_date):
-    """获取用户饮食数据"""
-    try:
-        # 使用created_at字段进行查询以保持与Dashboard一致
-        from sqlalchemy import func
-        meals = MealLog.query.filter(
-            MealLog.user_id == user_id,
-            func.date(MealLog.created_at) >= start_date,
-            func.date(MealLog.created_at) <= end_date
-        ).order_by(MealLog.created_at.desc()).all()
+        ).group_by(ExerciseLog.exercise_type, ExerciseLog.intensity).all()
         
         return [{
-            'date': meal.created_at.date().isoformat(),  # 使用created_at的日期部分
-            'meal_type': meal.meal_type,
-            'food_name': meal.food_name,
-            'calories': meal.calories or 0,
-            'protein': meal.protein or 0,
-            'carbs': meal.carbs or 0,
-            'fat': meal.fat or 0
-        } for meal in meals]
+            'exercise_type': exercise_type or 'unknown',
+            'intensity': intensity or 'medium',
+            'count': count,
+            'duration': int(duration or 0)
+        } for exercise_type, intensity, count, duration in rows]
         
     except Exception as e:
-        logger.error(f"获取饮食数据失败: {e}")
+        logger.error(f"获取运动聚合数据失败: {e}")
         return []
 
-def calculate_progress_stats(exercises_data, meals_data):
-    """计算进度统计数据"""
+def calculate_progress_stats(daily_summaries, exercise_breakdown):
+    """由每日汇总和运动类型聚合计算进度统计数据"""
     try:
         # 运动统计
-        total_burned = sum(ex.get('calories_burned', 0) for ex in exercises_data)
-        total_minutes = sum(ex.get('duration', 0) for ex in exercises_data)
-        exercise_days = len(set(ex.get('date') for ex in exercises_data))
+        total_burned = sum(day['calories_out'] for day in daily_summaries)
+        total_minutes = sum(day['exercise_minutes'] for day in daily_summaries)
+        exercise_days = sum(1 for day in daily_summaries if day['exercise_count'])
         
         # 饮食统计
-        total_consumed = sum(meal.get('calories', 0) for meal in meals_data)
-        total_protein = sum(meal.get('protein', 0) for meal in meals_data)
-        total_carbs = sum(meal.get('carbs', 0) for meal in meals_data)
-        total_fat = sum(meal.get('fat', 0) for meal in meals_data)
+        total_consumed = sum(day['calories_in'] for day in daily_summaries)
+        total_protein = round(sum(day['protein'] for day in daily_summaries), 1)
+        total_carbs = round(sum(day['carbs'] for day in daily_summaries), 1)
+        total_fat = round(sum(day['fat'] for day in daily_summaries), 1)
         
-        # 强度分布统计
+        # 强度分布与运动类型统计
         intensity_count = {'low': 0, 'medium': 0, 'high': 0}
-        for ex in exercises_data:
-            intensity = ex.get('intensity', 'medium')
-            if intensity in intensity_count:
-                intensity_count[intensity] += 1
-        
-        # 运动类型统计
         type_duration = {}
-        for ex in exercises_data:
-            ex_type = ex.get('exercise_type', 'unknown')
-            duration = ex.get('duration', 0)
-            type_duration[ex_type] = type_duration.get(ex_type, 0) + duration
+        type_count = {}
+        for row in exercise_breakdown:
+            if row['intensity'] in intensity_count:
+                intensity_count[row['intensity']] += row['count']
+            ex_type = row['exercise_type']
+            type_duration[ex_type] = type_duration.get(ex_type, 0) + row['duration']
+            type_count[ex_type] = type_count.get(ex_type, 0) + row['count']
         
         return {
             'total_burned': total_burned,
@@ -1810,6 +2187,7 @@ def calculate_progress_stats(exercises_data, meals_data):
             'total_fat': total_fat,
             'intensity_distribution': intensity_count,
             'type_duration': type_duration,
+            'type_count': type_count,
             'calorie_balance': total_consumed - total_burned
         }
         
@@ -1825,82 +2203,1139 @@ def calculate_progress_stats(exercises_data, meals_data):
             'total_fat': 0,
             'intensity_distribution': {'low': 0, 'medium': 0, 'high': 0},
             'type_duration': {},
+            'type_count': {},
             'calorie_balance': 0
         }
 
-def get_gemini_model():
-    """获取配置好的Gemini模型"""
-    try:
-        import google.generativeai as genai
-        
-        # 配置Gemini API
-        api_key = os.getenv('GEMINI_API_KEY')
-        if not api_key:
-            raise Exception("Gemini API Key未配置")
-        
-        genai.configure(api_key=api_key)
-        return genai.GenerativeModel('gemini-2.5-flash')
-    except Exception as e:
-        logger.warning(f"Gemini配置错误: {e}")
-        raise
+# 影响每日汇总的字段，记录被修改但这些字段不变时无需重算
+DAILY_SUMMARY_SOURCES = {
+    MealLog: ('user_id', 'date', 'calories', 'protein', 'carbs', 'fat'),
+    ExerciseLog: ('user_id', 'date', 'calories_burned', 'duration'),
+    WeightLog: ('user_id', 'date', 'weight'),
+}
 
-def parse_natural_language_food(food_description, meal_type):
-    """使用Gemini AI解析自然语言食物描述"""
-    try:
-        model = get_gemini_model()
-        
-        # 构建食物解析prompt
-        parse_prompt = f"""
-请解析以下自然语言描述的食物，提取出具体的食物项目信息。
+def _collect_summary_days(obj, days, check_changes=False):
+    """收集记录影响的 (user_id, 日期)，包括修改前的旧用户/旧日期"""
+    from sqlalchemy.orm.attributes import get_history
+    
+    fields = DAILY_SUMMARY_SOURCES[type(obj)]
+    if check_changes and not any(get_history(obj, field).has_changes() for field in fields):
+        return
+    user_ids = {obj.user_id} | set(get_history(obj, 'user_id').deleted)
+    dates = {obj.date} | set(get_history(obj, 'date').deleted)
+    for user_id in user_ids:
+        for day in dates:
+            if user_id and day:
+                days.add((user_id, day))
 
-用户描述: "{food_description}"
-餐次类型: {meal_type}
+def _keep_previous_value(target, value, oldvalue, initiator):
+    return value
 
-请按照以下JSON格式返回解析结果（只返回JSON，不要其他文字）：
+# 修改已过期的 user_id/date 时先加载旧值，before_flush才能重算原来那一天
+for _model in DAILY_SUMMARY_SOURCES:
+    for _field in ('user_id', 'date'):
+        event.listen(getattr(_model, _field), 'set', _keep_previous_value, active_history=True, retval=True)
 
-{{
-    "parsed_foods": [
-        {{
-            "name": "食物名称",
-            "amount": 数量,
-            "unit": "单位",
-            "estimated_weight": "估算重量(克)"
-        }}
-    ],
-    "confidence": "解析置信度(high/medium/low)",
-    "notes": "解析说明或注意事项"
-}}
+def mark_daily_summary_days(pairs, session=None):
+    """登记需要重算的 (user_id, 日期)，用于绕过ORM单元的批量UPDATE"""
+    session = session or db.session
+    session.info.setdefault('daily_summary_days', set()).update(
+        (user_id, day) for user_id, day in pairs if user_id and day)
 
-解析要求：
-1. 准确识别食物名称，使用常见的中文名称
-2. 提取数量信息，如果没有明确数量则估算合理分量
-3. 识别单位，优先使用常见单位（个、片、碗、盒、杯等）
-4. 估算每项食物的大概重量（克）
-5. 如果描述不清楚，在notes中说明
-"""
-        
-        # 调用Gemini API解析
-        response = model.generate_content(parse_prompt)
-        result_text = response.text.strip()
-        
-        # 清理响应文本
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-        
-        import json
-        parsed_result = json.loads(result_text)
-        
-        # 转换为标准的food_items格式
-        food_items = []
-        for food in parsed_result.get('parsed_foods', []):
-            food_items.append({
-                'name': food.get('name', ''),
-                'amount': food.get('amount', 1),
-                'unit': food.get('unit', '份'),
-                'estimated_weight': food.get('estimated_weight', '100')
-            })
+@event.listens_for(Session, 'before_flush')
+def _track_daily_summary_changes(session, flush_context, instances):
+    days = session.info.setdefault('daily_summary_days', set())
+    for obj in list(session.new) + list(session.deleted):
+        if type(obj) in DAILY_SUMMARY_SOURCES:
+            _collect_summary_days(obj, days)
+    for obj in session.dirty:
+        if type(obj) in DAILY_SUMMARY_SOURCES:
+            _collect_summary_days(obj, days, check_changes=True)
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_daily_summaries_before_commit(session):
+    if not (session.info.get('daily_summary_days') or session.new or session.dirty or session.deleted):
+        return
+    session.flush()
+    days = session.info.pop('daily_summary_days', None)
+    if days:
+        refresh_daily_summaries(days, session)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_daily_summary_changes(session):
+    session.info.pop('daily_summary_days', None)
+
+def _dialect_insert(session, model):
+    """按数据库方言取支持 ON CONFLICT 的 insert 构造"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'不支持的数据库: {dialect}')
+    return insert(model)
+
+def refresh_daily_summaries(days, session=None):
+    """从原始记录重算指定 (user_id, 日期) 的汇总行（在调用方事务内执行）
+    
+    有数据的天用 INSERT ... ON CONFLICT (user_id, date) DO UPDATE 写入，并发事务写同一天时不会
+    违反唯一约束；只删除已经没有任何记录的天"""
+    from sqlalchemy import func
+    
+    session = session or db.session
+    dates_by_user = {}
+    for user_id, day in days:
+        dates_by_user.setdefault(user_id, set()).add(day)
+    
+    table = UserDailySummary.__table__
+    now = datetime.now(timezone.utc)
+    refreshed = 0
+    for user_id, dates in dates_by_user.items():
+        dates = sorted(dates)
+        rows = {day: {
+            'user_id': user_id, 'date': day, 'calories_in': 0, 'calories_out': 0,
+            'protein': 0.0, 'carbs': 0.0, 'fat': 0.0, 'exercise_minutes': 0,
+            'exercise_count': 0, 'meal_count': 0, 'weight': None, 'updated_at': now
+        } for day in dates}
+        has_data = set()
+        
+        for day, calories, protein, carbs, fat, count in session.execute(
+            db.select(MealLog.date, func.sum(MealLog.calories), func.sum(MealLog.protein),
+                      func.sum(MealLog.carbs), func.sum(MealLog.fat), func.count(MealLog.id))
+            .where(MealLog.user_id == user_id, MealLog.date.in_(dates))
+            .group_by(MealLog.date)
+        ):
+            rows[day].update(calories_in=int(calories or 0), protein=float(protein or 0),
+                             carbs=float(carbs or 0), fat=float(fat or 0), meal_count=count)
+            has_data.add(day)
+        
+        for day, calories, minutes, count in session.execute(
+            db.select(ExerciseLog.date, func.sum(ExerciseLog.calories_burned),
+                      func.sum(ExerciseLog.duration), func.count(ExerciseLog.id))
+            .where(ExerciseLog.user_id == user_id, ExerciseLog.date.in_(dates))
+            .group_by(ExerciseLog.date)
+        ):
+            rows[day].update(calories_out=int(calories or 0), exercise_minutes=int(minutes or 0),
+                             exercise_count=count)
+            has_data.add(day)
+        
+        for day, weight in session.execute(
+            db.select(WeightLog.date, WeightLog.weight)
+            .where(WeightLog.user_id == user_id, WeightLog.date.in_(dates))
+        ):
+            rows[day]['weight'] = weight
+            has_data.add(day)
+        
+        empty = [day for day in dates if day not in has_data]
+        if empty:
+            session.execute(table.delete().where(table.c.user_id == user_id, table.c.date.in_(empty)))
+        upserts = [rows[day] for day in dates if day in has_data]
+        if upserts:
+            statement = _dialect_insert(session, UserDailySummary).values(upserts)
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.date],
+                set_={column: statement.excluded[column] for column in upserts[0]
+                      if column not in ('user_id', 'date')})
+            session.execute(statement)
+        refreshed += len(upserts)
+    return refreshed
+
+def _rebuild_daily_summary_rows(session, user_id=None, batch_size=500):
+    """丢弃汇总表并从原始记录全量重建（在调用方事务内执行），返回重建的天数"""
+    sources = (MealLog, ExerciseLog, WeightLog)
+    days = set()
+    for model in sources:
+        query = db.select(model.user_id, model.date).distinct()
+        if user_id:
+            query = query.where(model.user_id == user_id)
+        days.update((row_user_id, day) for row_user_id, day in session.execute(query) if day)
+    
+    table = UserDailySummary.__table__
+    stale = table.delete()
+    if user_id:
+        stale = stale.where(table.c.user_id == user_id)
+    session.execute(stale)
+    
+    ordered = sorted(days)
+    rebuilt = 0
+    for start in range(0, len(ordered), batch_size):
+        rebuilt += refresh_daily_summaries(ordered[start:start + batch_size], session)
+    return rebuilt
+
+def rebuild_daily_summaries(user_id=None, batch_size=500):
+    """修复任务：丢弃汇总表并从原始记录全量重建，返回重建的天数"""
+    rebuilt = _rebuild_daily_summary_rows(db.session, user_id, batch_size)
+    db.session.commit()
+    logger.info(f"每日汇总重建完成: {rebuilt}天")
+    return rebuilt
+
+# 后台计数器：模型 -> 计数器名称
+APP_COUNTER_SOURCES = {
+    User: 'users',
+    ExerciseLog: 'exercise_logs',
+    MealLog: 'meal_logs',
+    WeightLog: 'weight_logs',
+}
+
+def add_app_counter_deltas(deltas, session=None):
+    """登记计数器增量，随当前事务提交；用于绕过ORM单元的批量写入"""
+    session = session or db.session
+    pending = session.info.setdefault('app_counter_deltas', {})
+    for name, delta in deltas.items():
+        if delta:
+            pending[name] = pending.get(name, 0) + delta
+
+@event.listens_for(Session, 'before_flush')
+def _track_app_counter_changes(session, flush_context, instances):
+    deltas = {}
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            name = APP_COUNTER_SOURCES.get(type(obj))
+            if name:
+                deltas[name] = deltas.get(name, 0) + sign
+    add_app_counter_deltas(deltas, session)
+
+@event.listens_for(Session, 'before_commit')
+def _apply_app_counters_before_commit(session):
+    if session.new or session.deleted:
+        session.flush()
+    deltas = session.info.pop('app_counter_deltas', None)
+    if not deltas:
+        return
+    table = AppCounter.__table__
+    now = datetime.now(timezone.utc)
+    for name, delta in deltas.items():
+        # 原子自增；计数器行不存在时跳过，读取时会用精确COUNT补建
+        session.execute(table.update().where(table.c.name == name)
+                        .values(value=table.c.value + delta, updated_at=now))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_app_counter_changes(session):
+    session.info.pop('app_counter_deltas', None)
+
+def _write_exact_app_counters(session, names=None):
+    """用精确COUNT写入计数器（在调用方事务内执行），返回 {名称: 数量}
+    
+    INSERT ... ON CONFLICT (name) DO UPDATE：多个冷启动实例同时补建时不会主键冲突，
+    也不会出现先删后插之间读到空计数器的窗口"""
+    from sqlalchemy import func
+    
+    counts = {}
+    for model, name in APP_COUNTER_SOURCES.items():
+        if names is None or name in names:
+            counts[name] = session.execute(db.select(func.count()).select_from(model)).scalar() or 0
+    if counts:
+        now = datetime.now(timezone.utc)
+        statement = _dialect_insert(session, AppCounter).values(
+            [{'name': name, 'value': value, 'updated_at': now} for name, value in counts.items()])
+        statement = statement.on_conflict_do_update(
+            index_elements=[AppCounter.__table__.c.name],
+            set_={'value': statement.excluded.value, 'updated_at': statement.excluded.updated_at})
+        session.execute(statement)
+    return counts
+
+def rebuild_app_counters(names=None):
+    """用精确COUNT重建计数器（缺失时补建，或批量删除导致偏差后校正）"""
+    counts = _write_exact_app_counters(db.session, names)
+    db.session.commit()
+    invalidate_admin_stats()
+    return counts
+
+def get_app_counters():
+    """读取所有计数器，缺失的计数器先用精确COUNT补建"""
+    rows = dict(db.session.execute(db.select(AppCounter.name, AppCounter.value)).all())
+    missing = set(APP_COUNTER_SOURCES.values()) - set(rows)
+    if missing:
+        rows.update(rebuild_app_counters(missing))
+    return rows
+
+# 后台统计缓存时间（秒）和活跃度序列天数
+ADMIN_STATS_TTL = int(os.getenv('ADMIN_STATS_TTL', '60'))
+ADMIN_ACTIVITY_DAYS = 30
+admin_stats_cache = {}
+admin_stats_cache_lock = threading.Lock()
+
+def invalidate_admin_stats():
+    with admin_stats_cache_lock:
+        admin_stats_cache.clear()
+
+def get_activity_series(days=ADMIN_ACTIVITY_DAYS, today=None):
+    """从每日汇总表计算DAU/WAU和每日记录量序列（不扫描原始记录表）
+    
+    按记录所属的日期统计，不是按提交时间：今天补录的昨天的饮食计入昨天的活跃，
+    后台页面上也这样标注"""
+    from sqlalchemy import func
+    
+    today = today or date.today()
+    start_date = today - timedelta(days=days - 1)
+    by_day = {
+        day: (active, meals, exercises, weights)
+        for day, active, meals, exercises, weights in db.session.execute(
+            db.select(UserDailySummary.date,
+                      func.count(UserDailySummary.user_id),
+                      func.coalesce(func.sum(UserDailySummary.meal_count), 0),
+                      func.coalesce(func.sum(UserDailySummary.exercise_count), 0),
+                      func.count(UserDailySummary.weight))
+            .where(UserDailySummary.date >= start_date, UserDailySummary.date <= today)
+            .group_by(UserDailySummary.date)
+        )
+    }
+    wau = db.session.execute(
+        db.select(func.count(func.distinct(UserDailySummary.user_id)))
+        .where(UserDailySummary.date >= today - timedelta(days=6), UserDailySummary.date <= today)
+    ).scalar() or 0
+    
+    series = {'dates': [], 'active_users': [], 'meal_logs': [], 'exercise_logs': [], 'weight_logs': []}
+    for offset in range(days):
+        day = start_date + timedelta(days=offset)
+        active, meals, exercises, weights = by_day.get(day, (0, 0, 0, 0))
+        series['dates'].append(day.isoformat())
+        series['active_users'].append(int(active))
+        series['meal_logs'].append(int(meals))
+        series['exercise_logs'].append(int(exercises))
+        series['weight_logs'].append(int(weights))
+    return {'dau': series['active_users'][-1], 'wau': int(wau), 'series': series}
+
+def get_admin_stats():
+    """后台控制台统计：计数器 + 活跃度，带短TTL的进程内缓存"""
+    now_ts = time.time()
+    with admin_stats_cache_lock:
+        cached = admin_stats_cache.get('stats')
+        if cached and cached[0] > now_ts:
+            return cached[1]
+    
+    counters = get_app_counters()
+    stats = {
+        'user_count': counters.get('users', 0),
+        'exercise_count': counters.get('exercise_logs', 0),
+        'meal_count': counters.get('meal_logs', 0),
+        'weight_count': counters.get('weight_logs', 0),
+    }
+    stats.update(get_activity_series())
+    with admin_stats_cache_lock:
+        admin_stats_cache['stats'] = (now_ts + ADMIN_STATS_TTL, stats)
+    return stats
+
+# 进度页打卡热力图显示的天数
+PROGRESS_HEATMAP_DAYS = 90
+
+def get_daily_summaries(user_id, start_date, end_date):
+    """按日期升序返回区间内有记录的每日汇总"""
+    return UserDailySummary.query.filter(
+        UserDailySummary.user_id == user_id,
+        UserDailySummary.date >= start_date,
+        UserDailySummary.date <= end_date
+    ).order_by(UserDailySummary.date).all()
+
+# 图表数据接口：可返回的列、默认/上限点数和最大天数
+CHART_SERIES = ('calories_in', 'calories_out', 'weight', 'protein', 'carbs', 'fat', 'exercise_minutes')
+CHART_DEFAULT_POINTS = 120
+CHART_MAX_POINTS = 1000
+CHART_MAX_DAYS = 3650
+
+def lttb_indices(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets降采样，返回保留点的下标（首尾必保留）"""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点作为三角形第三个顶点
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        span = avg_end - avg_start
+        avg_x = sum(xs[avg_start:avg_end]) / span
+        avg_y = sum(ys[avg_start:avg_end]) / span
+
+        # 当前桶中与上一个选中点、下一桶均值构成面积最大的点
+        range_start = int(i * every) + 1
+        range_end = int((i + 1) * every) + 1
+        max_area = -1
+        chosen = range_start
+        for j in range(range_start, range_end):
+            area = abs((xs[a] - avg_x) * (ys[j] - ys[a]) - (xs[a] - xs[j]) * (avg_y - ys[a]))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        selected.append(chosen)
+        a = chosen
+    selected.append(n - 1)
+    return selected
+
+def bucket_average_columns(start_date, dates, columns, bucket_days):
+    """按固定天数分桶求平均，空值不参与平均；返回 (桶起始日期列表, 列字典)"""
+    buckets = {}
+    for index, day in enumerate(dates):
+        buckets.setdefault((day - start_date).days // bucket_days, []).append(index)
+
+    bucket_dates = []
+    averaged = {name: [] for name in columns}
+    for bucket in sorted(buckets):
+        indices = buckets[bucket]
+        bucket_dates.append(start_date + timedelta(days=bucket * bucket_days))
+        for name, values in columns.items():
+            present = [values[i] for i in indices if values[i] is not None]
+            averaged[name].append(round(sum(present) / len(present), 1) if present else None)
+    return bucket_dates, averaged
+
+def build_chart_data(user_id, start_date, end_date, points=CHART_DEFAULT_POINTS,
+                     series=CHART_SERIES, method='bucket'):
+    """从每日汇总表生成列式图表数据，超过points时在服务端降采样
+
+    method='bucket' 按固定天数分桶求平均；
+    method='lttb' 每列在自己有值的日期上选点（保留折线形状），点数预算按列均分，
+    返回所有列选中日期的并集，只有体重没有饮食的日子也不会被丢掉。
+    """
+    summaries = get_daily_summaries(user_id, start_date, end_date)
+    dates = [summary.date for summary in summaries]
+    columns = {name: [getattr(summary, name) for summary in summaries] for name in series}
+    source_points = len(dates)
+    applied = 'none'
+
+    if source_points > points:
+        if method == 'lttb':
+            budget = max(3, points // len(columns))
+            keep = set()
+            for values in columns.values():
+                present = [i for i, value in enumerate(values) if value is not None]
+                keep.update(present[i] for i in lttb_indices(
+                    [dates[i].toordinal() for i in present], [values[i] for i in present], budget))
+            keep = sorted(keep)
+            dates = [dates[i] for i in keep]
+            columns = {name: [values[i] for i in keep] for name, values in columns.items()}
+            applied = 'lttb'
+        else:
+            total_days = (end_date - start_date).days + 1
+            bucket_days = -(-total_days // points)
+            dates, columns = bucket_average_columns(start_date, dates, columns, bucket_days)
+            applied = 'bucket'
+
+    data = {'dates': [day.isoformat() for day in dates]}
+    data.update(columns)
+    return {
+        'data': data,
+        'source_points': source_points,
+        'points': len(dates),
+        'method': applied,
+        'downsampled': applied != 'none'
+    }
+
+def _bucket_user_profile(user_info):
+    """将用户资料分档，使相近的用户共享同一条缓存"""
+    user_info = user_info or {}
+
+    def _band(value, width, default):
+        try:
+            return int(float(value) // width * width)
+        except (TypeError, ValueError):
+            return default
+
+    gender = str(user_info.get('gender') or '').strip().lower()
+    gender = {'男': 'male', 'female': 'female', '女': 'female'}.get(gender, gender if gender == 'male' else 'unknown')
+    return {
+        'weight_band': _band(user_info.get('weight'), 5, 70),
+        'age_band': _band(user_info.get('age'), 10, 30),
+        'gender': gender,
+        'fitness_goal': user_info.get('fitness_goal') or 'maintain_weight'
+    }
+
+def _normalize_food_items(food_items):
+    """规范化食物列表（去空白、统一数量格式、排序），用于生成缓存key"""
+    normalized = []
+    for item in food_items or []:
+        name = ''.join(str(item.get('name', '')).split()).lower()
+        if not name:
+            continue
+        try:
+            amount = round(float(item.get('amount', 1) or 1), 2)
+        except (TypeError, ValueError):
+            amount = 1.0
+        unit = ''.join(str(item.get('unit') or '份').split()).lower()
+        normalized.append([name, amount, unit])
+    normalized.sort()
+    return normalized
+
+def build_meal_analysis_cache_key(meal_type, food_items, user_info, natural_language_input=None):
+    """生成饮食分析的内容寻址缓存key"""
+    payload = {
+        'type': 'meal',
+        'meal_type': meal_type or '',
+        'profile': _bucket_user_profile(user_info)
+    }
+    items = _normalize_food_items(food_items)
+    if items:
+        payload['food_items'] = items
+    else:
+        payload['description'] = ''.join((natural_language_input or '').split()).lower()
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _cache_store_memory(cache_key, result, expires_ts):
+    """写入内存LRU，超出容量时淘汰最久未使用的项"""
+    with ai_analysis_cache_lock:
+        ai_analysis_cache[cache_key] = (expires_ts, result)
+        ai_analysis_cache.move_to_end(cache_key)
+        while len(ai_analysis_cache) > AI_CACHE_MAX_SIZE:
+            ai_analysis_cache.popitem(last=False)
+            ai_cache_stats['evictions'] += 1
+
+def get_cached_analysis(cache_key):
+    """按 内存LRU -> 数据库 的顺序查找缓存的分析结果，未命中返回None"""
+    now_ts = time.time()
+    with ai_analysis_cache_lock:
+        entry = ai_analysis_cache.get(cache_key)
+        if entry:
+            expires_ts, result = entry
+            if expires_ts > now_ts:
+                ai_analysis_cache.move_to_end(cache_key)
+                ai_cache_stats['hits'] += 1
+                return copy.deepcopy(result)
+            del ai_analysis_cache[cache_key]
+
+    # 内存未命中，查询持久层（使用独立连接，不影响调用方的session）
+    try:
+        table = AIAnalysisCache.__table__
+        with db.engine.begin() as conn:
+            row = conn.execute(
+                db.select(table.c.result, table.c.expires_at).where(table.c.cache_key == cache_key)
+            ).first()
+            if row:
+                expires_at = row.expires_at
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                if expires_at.timestamp() > now_ts:
+                    conn.execute(
+                        table.update().where(table.c.cache_key == cache_key)
+                        .values(hit_count=table.c.hit_count + 1)
+                    )
+                    result = row.result
+                    _cache_store_memory(cache_key, result, expires_at.timestamp())
+                    with ai_analysis_cache_lock:
+                        ai_cache_stats['db_hits'] += 1
+                    return copy.deepcopy(result)
+    except Exception as e:
+        logger.warning(f"读取AI缓存表失败: {e}")
+
+    with ai_analysis_cache_lock:
+        ai_cache_stats['misses'] += 1
+    return None
+
+def set_cached_analysis(cache_key, result, analysis_type='meal'):
+    """写入内存LRU和数据库缓存表"""
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=AI_CACHE_TTL_SECONDS)
+    result = copy.deepcopy(result)
+    _cache_store_memory(cache_key, result, expires_at.timestamp())
+
+    try:
+        table = AIAnalysisCache.__table__
+        with db.engine.begin() as conn:
+            updated = conn.execute(
+                table.update().where(table.c.cache_key == cache_key)
+                .values(result=result, created_at=now, expires_at=expires_at)
+            ).rowcount
+            if not updated:
+                conn.execute(table.insert().values(
+                    cache_key=cache_key, analysis_type=analysis_type, result=result,
+                    hit_count=0, created_at=now, expires_at=expires_at
+                ))
+        with ai_analysis_cache_lock:
+            ai_cache_stats['writes'] += 1
+    except Exception as e:
+        logger.warning(f"写入AI缓存表失败: {e}")
+
+def clear_analysis_cache():
+    """清空内存和数据库中的AI分析缓存，返回清理的内存缓存项数"""
+    with ai_analysis_cache_lock:
+        cache_size = len(ai_analysis_cache)
+        ai_analysis_cache.clear()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(AIAnalysisCache.__table__.delete())
+    except Exception as e:
+        logger.warning(f"清理AI缓存表失败: {e}")
+    return cache_size
+
+def get_analysis_cache_info():
+    """AI缓存统计信息（用于后台设置页面）"""
+    with ai_analysis_cache_lock:
+        stats = dict(ai_cache_stats)
+        cache_size = len(ai_analysis_cache)
+        cache_keys = list(ai_analysis_cache.keys())[-5:]
+    lookups = stats['hits'] + stats['db_hits'] + stats['misses']
+    try:
+        persisted_size = db.session.query(db.func.count(AIAnalysisCache.id)).scalar()
+    except Exception:
+        db.session.rollback()
+        persisted_size = None
+    return {
+        'cache_size': cache_size,
+        'cache_keys': cache_keys,
+        'max_size': AI_CACHE_MAX_SIZE,
+        'ttl_hours': round(AI_CACHE_TTL_SECONDS / 3600, 1),
+        'persisted_size': persisted_size,
+        'hit_rate': round((stats['hits'] + stats['db_hits']) * 100 / lookups, 1) if lookups else 0,
+        **stats
+    }
+
+# ==================== AI分析请求合并（single-flight） ====================
+# 同一进程内相同输入的并发请求等待同一个Future；跨进程通过analysis_lease表的租约行协调，
+# 持有租约的请求负责调用AI，其余请求轮询租约行拿到结果。
+ANALYSIS_LEASE_SECONDS = int(os.getenv('ANALYSIS_LEASE_SECONDS', '25'))
+ANALYSIS_RESULT_GRACE_SECONDS = int(os.getenv('ANALYSIS_RESULT_GRACE_SECONDS', '30'))
+
+_single_flight_calls = {}
+_single_flight_lock = threading.Lock()
+single_flight_stats = {'leaders': 0, 'coalesced': 0, 'lease_waits': 0, 'fallbacks': 0}
+
+def _lease_now():
+    """租约表统一使用不带时区的UTC时间"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _acquire_analysis_lease(lease_key, owner):
+    """尝试获取租约，返回 ('owner', None) / ('completed', result) / ('busy', None)"""
+    from sqlalchemy.exc import IntegrityError
+    table = AnalysisLease.__table__
+    now = _lease_now()
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.expires_at < now))
+            row = conn.execute(
+                db.select(table.c.status, table.c.result).where(table.c.lease_key == lease_key)
+            ).first()
+            if row:
+                return ('completed', row.result) if row.status == 'completed' else ('busy', None)
+            conn.execute(table.insert().values(
+                lease_key=lease_key, owner=owner, status='running', created_at=now,
+                expires_at=now + timedelta(seconds=ANALYSIS_LEASE_SECONDS)
+            ))
+        return 'owner', None
+    except IntegrityError:
+        return 'busy', None
+    except Exception as e:
+        # 租约表不可用时退化为仅进程内合并
+        logger.warning(f"获取分析租约失败: {e}")
+        return 'owner', None
+
+def _wait_for_analysis_lease(lease_key):
+    """等待其他进程完成分析，租约过期仍无结果时返回None"""
+    table = AnalysisLease.__table__
+    deadline = time.time() + ANALYSIS_LEASE_SECONDS
+    while time.time() < deadline:
+        time.sleep(0.2)
+        try:
+            with db.engine.connect() as conn:
+                row = conn.execute(
+                    db.select(table.c.status, table.c.result, table.c.expires_at)
+                    .where(table.c.lease_key == lease_key)
+                ).first()
+        except Exception as e:
+            logger.warning(f"查询分析租约失败: {e}")
+            return None
+        if not row or row.expires_at < _lease_now():
+            return None
+        if row.status == 'completed':
+            return row.result
+    return None
+
+def _finish_analysis_lease(lease_key, owner, result=None):
+    """写回分析结果（短暂保留给重试请求），失败时释放租约"""
+    table = AnalysisLease.__table__
+    try:
+        with db.engine.begin() as conn:
+            owned = (table.c.lease_key == lease_key) & (table.c.owner == owner)
+            if result is None:
+                conn.execute(table.delete().where(owned))
+            else:
+                conn.execute(table.update().where(owned).values(
+                    status='completed', result=result,
+                    expires_at=_lease_now() + timedelta(seconds=ANALYSIS_RESULT_GRACE_SECONDS)
+                ))
+    except Exception as e:
+        logger.warning(f"更新分析租约失败: {e}")
+
+def _count_single_flight(name):
+    with _single_flight_lock:
+        single_flight_stats[name] += 1
+
+def _run_with_analysis_lease(lease_key, compute, fallback):
+    owner = uuid.uuid4().hex
+    state, result = _acquire_analysis_lease(lease_key, owner)
+    if state == 'completed':
+        return result
+    if state == 'busy':
+        _count_single_flight('lease_waits')
+        result = _wait_for_analysis_lease(lease_key)
+        if result is not None:
+            return result
+        # 持有租约的进程超时或失败，此时请求预算已经用完，返回规则估算结果而不是再调用一次AI
+        _count_single_flight('fallbacks')
+        return fallback()
+    
+    try:
+        result = compute()
+    except Exception:
+        _finish_analysis_lease(lease_key, owner)
+        raise
+    _finish_analysis_lease(lease_key, owner, result)
+    return result
+
+def run_single_flight(lease_key, compute, fallback):
+    """合并相同lease_key的并发调用，所有调用方共享同一个结果
+    
+    等待方超时或领头的调用失败时返回 fallback() 的规则估算结果，不会再调用一次AI：
+    等待时长与请求预算相同，超时时已经没有时间再做一次调用"""
+    from concurrent.futures import Future
+    with _single_flight_lock:
+        future = _single_flight_calls.get(lease_key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _single_flight_calls[lease_key] = future
+            single_flight_stats['leaders'] += 1
+        else:
+            single_flight_stats['coalesced'] += 1
+    
+    if not is_leader:
+        try:
+            return copy.deepcopy(future.result(timeout=ANALYSIS_LEASE_SECONDS))
+        except Exception as e:
+            logger.warning(f"等待合并请求失败，使用规则估算结果: {e}")
+            _count_single_flight('fallbacks')
+            return fallback()
+    
+    try:
+        result = _run_with_analysis_lease(lease_key, compute, fallback)
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _single_flight_lock:
+            _single_flight_calls.pop(lease_key, None)
+
+def build_exercise_analysis_key(exercise_type, exercise_name, duration, user_info, exercise_description=None):
+    """生成运动分析请求的规范化key"""
+    payload = {
+        'type': 'exercise',
+        'description': ''.join((exercise_description or '').split()).lower(),
+        'exercise_type': exercise_type or '',
+        'exercise_name': ''.join((exercise_name or '').split()).lower(),
+        'duration': duration,
+        'user_info': {k: user_info.get(k) for k in sorted(user_info)}
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+# ==================== Gemini客户端注册表 ====================
+# genai.configure()每个进程只执行一次，GenerativeModel按模型名缓存复用，
+# 避免每次调用都重建底层连接。不同用途可以通过环境变量配置不同模型。
+GEMINI_MODEL_NAMES = {
+    'parse': os.getenv('GEMINI_PARSE_MODEL', 'gemini-2.5-flash'),
+    'analysis': os.getenv('GEMINI_ANALYSIS_MODEL', 'gemini-2.5-flash')
+}
+
+_gemini_models = {}
+_gemini_configured = False
+_gemini_lock = threading.Lock()
+gemini_client_metrics = {
+    'configure_ms': None,
+    'construct_ms': {},  # 模型名 -> 构建耗时(ms)
+    'created': 0,
+    'reused': 0
+}
+
+def get_gemini_model(use_case='analysis'):
+    """获取配置好的Gemini模型（进程内单例，线程安全）"""
+    model_name = GEMINI_MODEL_NAMES.get(use_case, GEMINI_MODEL_NAMES['analysis'])
+    model = _gemini_models.get(model_name)
+    if model is not None:
+        gemini_client_metrics['reused'] += 1
+        return model
+    
+    global _gemini_configured
+    try:
+        with _gemini_lock:
+            model = _gemini_models.get(model_name)
+            if model is not None:
+                gemini_client_metrics['reused'] += 1
+                return model
+            
+            if not _gemini_configured:
+                # 配置Gemini API
+                api_key = os.getenv('GEMINI_API_KEY')
+                if not api_key:
+                    raise Exception("Gemini API Key未配置")
+                start = time.perf_counter()
+                genai.configure(api_key=api_key)
+                gemini_client_metrics['configure_ms'] = round((time.perf_counter() - start) * 1000, 2)
+                _gemini_configured = True
+            
+            start = time.perf_counter()
+            model = genai.GenerativeModel(model_name)
+            gemini_client_metrics['construct_ms'][model_name] = round((time.perf_counter() - start) * 1000, 2)
+            gemini_client_metrics['created'] += 1
+            _gemini_models[model_name] = model
+            logger.info(f"Gemini模型已创建: {model_name} ({use_case})")
+            return model
+    except Exception as e:
+        logger.warning(f"Gemini配置错误: {e}")
+        raise
+
+def reset_gemini_clients():
+    """清空已创建的模型（API Key或模型配置变更后调用）"""
+    global _gemini_configured
+    with _gemini_lock:
+        _gemini_models.clear()
+        _gemini_configured = False
+
+# ==================== Gemini结构化输出 ====================
+# 与各prompt中json_template一致的响应schema，配合response_mime_type=application/json使用，
+# 模型输出直接是合法JSON；extract_json_object()兼容旧模型/异常输出中的markdown标记、多余文字和截断。
+def _schema_object(properties, required=None):
+    return {'type': 'object', 'properties': properties, 'required': required or list(properties)}
+
+def _schema_numbers(*names):
+    return {name: {'type': 'number'} for name in names}
+
+def _schema_strings(*names):
+    return {name: {'type': 'string'} for name in names}
+
+_STRING_LIST_SCHEMA = {'type': 'array', 'items': {'type': 'string'}}
+
+FOOD_PARSE_ITEMS_SCHEMA = {
+    'type': 'array',
+    'items': _schema_object({
+        'name': {'type': 'string'},
+        'amount': {'type': 'number'},
+        'unit': {'type': 'string'},
+        'estimated_weight': {'type': 'string'}
+    })
+}
+
+FOOD_PARSE_SCHEMA = _schema_object({
+    'parsed_foods': FOOD_PARSE_ITEMS_SCHEMA,
+    'confidence': {'type': 'string', 'enum': ['high', 'medium', 'low']},
+    'notes': {'type': 'string'}
+})
+
+MEAL_ANALYSIS_SCHEMA = _schema_object({
+    'basic_nutrition': _schema_object(_schema_numbers(
+        'total_calories', 'protein', 'carbohydrates', 'fat', 'fiber', 'sugar', 'sodium', 'calcium', 'vitamin_c')),
+    'nutrition_breakdown': _schema_object(_schema_numbers('protein_percentage', 'carbs_percentage', 'fat_percentage')),
+    'meal_analysis': _schema_object(dict(
+        _schema_numbers('meal_score'),
+        **_schema_strings('balance_rating', 'meal_type_suitability', 'portion_assessment'))),
+    'detailed_analysis': _schema_object({
+        'strengths': _STRING_LIST_SCHEMA,
+        'areas_for_improvement': _STRING_LIST_SCHEMA
+    }),
+    'personalized_feedback': _schema_object(_schema_strings('calorie_assessment', 'macro_balance', 'health_impact')),
+    'recommendations': _schema_object(_schema_strings('next_meal_suggestion', 'daily_nutrition_tip', 'hydration_reminder')),
+    'motivation_message': {'type': 'string'},
+    # 逐项食物的营养数值，写入每条饮食记录
+    'food_items_nutrition': {
+        'type': 'array',
+        'items': _schema_object(dict(_schema_strings('name'),
+                                     **_schema_numbers('calories', 'protein', 'carbohydrates', 'fat')))
+    }
+})
+
+# 合并模式（解析+分析）在分析schema基础上要求返回parsed_foods
+MEAL_PARSE_ANALYSIS_SCHEMA = _schema_object(
+    dict(MEAL_ANALYSIS_SCHEMA['properties'], parsed_foods=FOOD_PARSE_ITEMS_SCHEMA))
+
+EXERCISE_ANALYSIS_SCHEMA = _schema_object({
+    'basic_metrics': _schema_object(dict(
+        _schema_numbers('calories_burned', 'fitness_score', 'met_value'),
+        **_schema_strings('intensity_level'))),
+    'exercise_analysis': _schema_object(dict(
+        _schema_strings('heart_rate_zone', 'energy_system'),
+        primary_benefits=_STRING_LIST_SCHEMA,
+        muscle_groups=_STRING_LIST_SCHEMA,
+        technique_points=_STRING_LIST_SCHEMA)),
+    'personalized_feedback': _schema_object(dict(
+        _schema_strings('suitable_level', 'age_considerations', 'fitness_level_match'),
+        improvement_areas=_STRING_LIST_SCHEMA)),
+    'recommendations': _schema_object(_schema_strings(
+        'next_workout', 'intensity_adjustment', 'duration_suggestion', 'recovery_advice', 'frequency_recommendation')),
+    'health_insights': _schema_object(_schema_strings(
+        'calorie_burn_efficiency', 'cardiovascular_benefit', 'strength_development', 'injury_risk')),
+    'motivation_message': {'type': 'string'}
+})
+
+# 按用途统计JSON解析结果: parsed=直接解析成功, repaired=清理/补全后成功, failed=无法解析
+json_parse_stats = {}
+_json_parse_stats_lock = threading.Lock()
+
+def _record_json_parse(use_case, outcome):
+    with _json_parse_stats_lock:
+        stats = json_parse_stats.setdefault(use_case, {'parsed': 0, 'repaired': 0, 'failed': 0})
+        stats[outcome] += 1
+
+def get_json_parse_stats():
+    """各用途的JSON解析统计及失败率"""
+    with _json_parse_stats_lock:
+        result = {}
+        for use_case, stats in json_parse_stats.items():
+            total = sum(stats.values())
+            result[use_case] = dict(stats, total=total,
+                                    failure_rate=round(stats['failed'] * 100 / total, 1) if total else 0)
+        return result
+
+def extract_json_object(text):
+    """从模型输出中提取第一个JSON对象
+
+    容忍markdown代码块、前后多余文字，以及流式输出被截断导致的未闭合字符串/括号。
+    无法提取时抛出ValueError。
+    """
+    start = text.find('{')
+    if start < 0:
+        raise ValueError('响应中没有JSON对象')
+    
+    stack = []
+    in_string = False
+    escaped = False
+    end = None
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if not stack or stack.pop() != char:
+                raise ValueError('JSON括号不匹配')
+            if not stack:
+                end = index + 1
+                break
+    
+    if end is not None:
+        return json.loads(text[start:end])
+    
+    # 截断的输出：补全未闭合的字符串和括号
+    candidate = text[start:]
+    if in_string:
+        candidate += '"'
+    candidate = candidate.rstrip()
+    while candidate and candidate[-1] in ',:':
+        candidate = candidate[:-1].rstrip()
+    candidate += ''.join(reversed(stack))
+    return json.loads(candidate)
+
+def parse_gemini_json(text, use_case):
+    """解析Gemini返回的JSON并记录解析统计，失败时抛出ValueError"""
+    text = (text or '').strip()
+    try:
+        result = json.loads(text)
+        if isinstance(result, dict):
+            _record_json_parse(use_case, 'parsed')
+            return result
+    except ValueError:
+        pass
+    
+    try:
+        result = extract_json_object(text)
+    except ValueError as e:
+        _record_json_parse(use_case, 'failed')
+        logger.warning(f"Gemini {use_case} 响应JSON解析失败: {e}; 响应前100字符: {text[:100]}")
+        raise ValueError(f"无法解析Gemini响应: {e}")
+    _record_json_parse(use_case, 'repaired')
+    return result
+
+# ==================== Gemini熔断器 ====================
+# 连续失败或慢调用达到阈值后熔断，熔断期间直接走fallback；冷却后放行一个探测请求（半开）。
+# 每次调用的超时由当前请求剩余的时间预算决定，保证在Vercel的maxDuration内返回。
+REQUEST_BUDGET_SECONDS = float(os.getenv('REQUEST_BUDGET_SECONDS', '25'))
+GEMINI_CALL_TIMEOUT_SECONDS = float(os.getenv('GEMINI_CALL_TIMEOUT_SECONDS', '20'))
+GEMINI_MIN_CALL_SECONDS = 2.0  # 剩余预算不足该值时不再调用Gemini
+GEMINI_FALLBACK_RESERVE_SECONDS = 1.5  # 为fallback和写库预留的时间
+
+class GeminiUnavailableError(Exception):
+    """熔断打开或请求预算不足，调用方应直接使用fallback"""
+
+class CircuitBreaker:
+    """简单的三态熔断器: closed -> open -> half_open -> closed"""
+
+    def __init__(self, failure_threshold=5, slow_call_seconds=10.0, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0}
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == 'open':
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    self.stats['rejected'] += 1
+                    return False
+                self.state = 'half_open'
+                self.probe_in_flight = False
+            if self.state == 'half_open':
+                if self.probe_in_flight:
+                    self.stats['rejected'] += 1
+                    return False
+                self.probe_in_flight = True
+            self.stats['calls'] += 1
+            return True
+
+    def record_success(self, elapsed):
+        if elapsed > self.slow_call_seconds:
+            with self._lock:
+                self.stats['slow_calls'] += 1
+            self.record_failure()
+            return
+        with self._lock:
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.stats['opened'] += 1
+                    logger.warning(f"Gemini熔断器打开（连续失败{self.consecutive_failures}次）")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self.probe_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, state=self.state, consecutive_failures=self.consecutive_failures)
+
+gemini_breaker = CircuitBreaker(
+    failure_threshold=int(os.getenv('GEMINI_BREAKER_FAILURES', '5')),
+    slow_call_seconds=float(os.getenv('GEMINI_SLOW_CALL_SECONDS', '10')),
+    reset_timeout=float(os.getenv('GEMINI_BREAKER_RESET_SECONDS', '30'))
+)
+
+def get_remaining_request_budget():
+    """当前请求剩余的时间预算（秒），后台线程中返回单次调用超时上限"""
+    if has_request_context() and getattr(g, 'request_started_at', None) is not None:
+        return REQUEST_BUDGET_SECONDS - (time.monotonic() - g.request_started_at)
+    return GEMINI_CALL_TIMEOUT_SECONDS
+
+def generate_gemini_content(model, prompt, response_schema=None):
+    """经过熔断器和截止时间控制的Gemini调用，提供response_schema时要求结构化JSON输出"""
+    timeout = min(GEMINI_CALL_TIMEOUT_SECONDS, get_remaining_request_budget() - GEMINI_FALLBACK_RESERVE_SECONDS)
+    if timeout < GEMINI_MIN_CALL_SECONDS:
+        raise GeminiUnavailableError(f"请求剩余时间不足({timeout:.1f}s)，跳过Gemini调用")
+    if not gemini_breaker.allow_request():
+        raise GeminiUnavailableError("Gemini熔断中，直接使用fallback")
+    
+    start = time.monotonic()
+    try:
+        kwargs = {'request_options': {'timeout': timeout}}
+        if response_schema:
+            kwargs['generation_config'] = {
+                'response_mime_type': 'application/json',
+                'response_schema': response_schema
+            }
+        response = model.generate_content(prompt, **kwargs)
+    except Exception:
+        gemini_breaker.record_failure()
+        raise
+    gemini_breaker.record_success(time.monotonic() - start)
+    return response
+
+def normalize_parsed_foods(parsed_foods):
+    """将模型返回的parsed_foods转换为标准的food_items格式"""
+    food_items = []
+    for food in parsed_foods:
+        if not isinstance(food, dict) or not food.get('name'):
+            continue
+        food_items.append({
+            'name': food.get('name', ''),
+            'amount': food.get('amount', 1),
+            'unit': food.get('unit', '份'),
+            'estimated_weight': food.get('estimated_weight', '100')
+        })
+    return food_items
+
+# 本地规则解析的置信度达到该阈值时不再调用Gemini解析
+LOCAL_PARSE_MIN_CONFIDENCE = float(os.getenv('LOCAL_PARSE_MIN_CONFIDENCE', '0.8'))
+
+def parse_food_description_locally(food_description):
+    """本地规则解析食物描述，置信度足够时返回food_items，否则返回None"""
+    local_parse = parse_food_description(food_description)
+    print(f"🔍 DEBUG: 本地解析置信度 {local_parse['confidence']}，未识别: {local_parse['unknown_foods']}")
+    if local_parse['food_items'] and local_parse['confidence'] >= LOCAL_PARSE_MIN_CONFIDENCE:
+        return local_parse
+    return None
+
+def parse_natural_language_food(food_description, meal_type):
+    """解析自然语言食物描述：先用本地规则解析，置信度低时再调用Gemini AI"""
+    local_parse = parse_food_description_locally(food_description)
+    if local_parse:
+        return {
+            'success': True,
+            'food_items': local_parse['food_items'],
+            'confidence': 'high' if local_parse['confidence'] >= 0.9 else 'medium',
+            'notes': '',
+            'parsing_method': 'local_rules',
+            'original_description': food_description
+        }
+    
+    try:
+        model = get_gemini_model('parse')
+        
+        # 构建食物解析prompt
+        parse_prompt = f"""
+请解析以下自然语言描述的食物，提取出具体的食物项目信息。
+
+用户描述: "{food_description}"
+餐次类型: {meal_type}
+
+请按照以下JSON格式返回解析结果（只返回JSON，不要其他文字）：
+
+{{
+    "parsed_foods": [
+        {{
+            "name": "食物名称",
+            "amount": 数量,
+            "unit": "单位",
+            "estimated_weight": "估算重量(克)"
+        }}
+    ],
+    "confidence": "解析置信度(high/medium/low)",
+    "notes": "解析说明或注意事项"
+}}
+
+解析要求：
+1. 准确识别食物名称，使用常见的中文名称
+2. 提取数量信息，如果没有明确数量则估算合理分量
+3. 识别单位，优先使用常见单位（个、片、碗、盒、杯等）
+4. 估算每项食物的大概重量（克）
+5. 如果描述不清楚，在notes中说明
+"""
+        
+        # 调用Gemini API解析
+        response = generate_gemini_content(model, parse_prompt, FOOD_PARSE_SCHEMA)
+        parsed_result = parse_gemini_json(response.text, 'food_parse')
+        
+        # 转换为标准的food_items格式
+        food_items = normalize_parsed_foods(parsed_result.get('parsed_foods', []))
         
         return {
             'success': True,
@@ -1929,6 +3364,43 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
     print(f"  - natural_language_input: {natural_language_input}")
     print(f"  - user_info: {user_info}")
     
+    # 只有自然语言描述、没有已解析的食物项时，解析与营养分析合并为一次模型调用
+    needs_parsing = not food_items and bool(natural_language_input)
+    parsing_method = 'ai_combined' if needs_parsing else 'provided'
+    
+    # 描述能被本地规则可靠解析时，不再需要模型解析
+    if needs_parsing:
+        local_parse = parse_food_description_locally(natural_language_input)
+        if local_parse:
+            food_items = local_parse['food_items']
+            needs_parsing = False
+            parsing_method = 'local_rules'
+    
+    # 本地食物成分表：已知食物直接计算，只把未知食物交给Gemini
+    all_food_items = food_items
+    local_items = []
+    if food_items:
+        local_items, food_items = resolve_food_items_locally(food_items)
+        if not food_items:
+            print(f"⚡ DEBUG: {len(local_items)}项食物全部命中本地成分表，跳过Gemini")
+            result = build_local_nutrition_analysis(local_items, meal_type)
+            result['food_items_nutrition'] = attribute_item_nutrition(all_food_items, result['basic_nutrition'])
+            if natural_language_input:
+                result['parsed_food_info'] = {
+                    'original_description': natural_language_input,
+                    'parsed_foods': all_food_items,
+                    'parsing_method': parsing_method
+                }
+            return result
+    
+    # 查询分析缓存（key基于原始输入，在补全默认食物项之前计算）
+    cache_key = build_meal_analysis_cache_key(meal_type, all_food_items, user_info, natural_language_input)
+    cached_result = get_cached_analysis(cache_key)
+    if cached_result:
+        print(f"⚡ DEBUG: 命中AI分析缓存 {cache_key[:12]}")
+        cached_result['motivation_message'] = get_daily_quote()
+        return cached_result
+    
     # 🚨 关键修复1: 确保有有效的食物数据
     if not food_items and not natural_language_input:
         print("❌ DEBUG: 没有食物数据，使用默认数据")
@@ -1940,32 +3412,18 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
     try:
         # 先尝试获取Gemini模型
         try:
-            model = get_gemini_model()
+            model = get_gemini_model('analysis')
             print(f"✅ DEBUG: Gemini模型获取成功")
         except Exception as e:
             print(f"❌ DEBUG: Gemini API不可用，使用fallback: {e}")
             logger.warning(f"Gemini API不可用，使用fallback: {e}")
-            # 如果有自然语言输入但没有Gemini API，创建简单的食物项
-            if natural_language_input and not food_items:
-                food_items = [{'name': natural_language_input[:50], 'amount': 1, 'unit': '份'}]
-            fallback_result = generate_fallback_nutrition_analysis(food_items, meal_type)
+            fallback_result = merge_local_nutrition(
+                generate_fallback_nutrition_analysis(food_items, meal_type), local_items)
+            fallback_result['food_items_nutrition'] = attribute_item_nutrition(
+                all_food_items or food_items, fallback_result['basic_nutrition'])
             print(f"🔄 DEBUG: Fallback结果: {fallback_result.get('basic_nutrition', {}).get('total_calories', 'N/A')} 卡路里")
             return fallback_result
         
-        # 如果是自然语言输入，先解析提取食物信息
-        if natural_language_input:
-            try:
-                parse_result = parse_natural_language_food(natural_language_input, meal_type)
-                if parse_result['success']:
-                    food_items = parse_result['food_items']
-                else:
-                    # 解析失败，创建简单的食物项
-                    food_items = [{'name': natural_language_input[:50], 'amount': 1, 'unit': '份'}]
-            except Exception as e:
-                logger.warning(f"自然语言解析失败: {e}")
-                # 创建简单的食物项用于营养分析
-                food_items = [{'name': natural_language_input[:50], 'amount': 1, 'unit': '份'}]
-        
         # 构建food_items字符串
         food_list_str = '\n'.join([
             f"- {item['name']} {item['amount']}{item['unit']}" 
@@ -1981,9 +3439,27 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
         }
         meal_type_cn = meal_type_map.get(meal_type, meal_type)
         
-        # 构建详细的营养分析prompt
+        # 构建详细的营养分析prompt（合并模式下额外要求返回解析出的食物列表）
+        parsed_foods_template = '''
+    "parsed_foods": [
+        {
+            "name": "食物名称",
+            "amount": 数量,
+            "unit": "单位",
+            "estimated_weight": "估算重量(克)"
+        }
+    ],''' if needs_parsing else ''
         json_template = '''
-{
+{''' + parsed_foods_template + '''
+    "food_items_nutrition": [
+        {
+            "name": "食物名称",
+            "calories": 数值,
+            "protein": 数值,
+            "carbohydrates": 数值,
+            "fat": 数值
+        }
+    ],
     "basic_nutrition": {
         "total_calories": 数值,
         "protein": 数值,
@@ -2024,6 +3500,14 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
 }
 '''
         
+        if needs_parsing:
+            food_info_str = f"""- 用户描述："{natural_language_input}"
+
+请先从用户描述中识别具体的食物项目（使用常见中文名称，提取数量和单位，没有明确数量时估算合理分量），
+填入parsed_foods字段，再基于这些食物进行营养分析。"""
+        else:
+            food_info_str = f"- 食物列表：\n{food_list_str}"
+        
         prompt = f"""
 作为专业营养师，请分析以下饮食信息并返回详细的营养分析结果。
 
@@ -2036,8 +3520,7 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
 
 饮食信息：
 - 餐次：{meal_type_cn}
-- 食物列表：
-{food_list_str}
+{food_info_str}
 
 请按照以下JSON格式返回营养分析结果（只返回JSON，不要其他文字）：
 
@@ -2049,30 +3532,28 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
 - 钙含量：重点评估奶制品、豆制品、绿叶蔬菜等
 - 维生素C：主要来源于新鲜蔬菜水果
 - 如果某营养成分含量极少可设为0，但应尽量给出合理估值
+- food_items_nutrition需逐项给出每种食物的热量和三大营养素，各项之和应等于basic_nutrition中的对应数值
 
 请基于营养学专业知识进行准确分析，确保数据真实可靠。注意：motivation_message字段会被系统自动替换为每日鼓励名言，可以留空或填写占位符。
 """
         
         # 调用Gemini API
         print(f"🚀 DEBUG: 调用Gemini API...")
-        response = model.generate_content(prompt)
+        response = generate_gemini_content(
+            model, prompt, MEAL_PARSE_ANALYSIS_SCHEMA if needs_parsing else MEAL_ANALYSIS_SCHEMA)
         print(f"✅ DEBUG: Gemini API调用成功")
         
         # 解析JSON响应
-        import json
-        result_text = response.text.strip()
-        print(f"📝 DEBUG: API响应长度: {len(result_text)}")
-        print(f"📝 DEBUG: API响应前200字符: {result_text[:200]}...")
-        
-        # 清理响应文本，移除可能的markdown标记
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-        
-        result = json.loads(result_text)
+        print(f"📝 DEBUG: API响应长度: {len(response.text)}")
+        result = parse_gemini_json(response.text, 'meal_analysis')
         print(f"✅ DEBUG: JSON解析成功")
         
+        # 合并模式：从同一响应中取出解析出的食物项
+        if needs_parsing:
+            parsed_foods = normalize_parsed_foods(result.pop('parsed_foods', None) or [])
+            if parsed_foods:
+                food_items = parsed_foods
+        
         # 验证营养数据
         basic_nutrition = result.get('basic_nutrition', {})
         total_calories = basic_nutrition.get('total_calories', 0)
@@ -2082,8 +3563,11 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
         # 🚨 关键修复2: 确保热量数据有效
         if not total_calories or total_calories <= 0:
             print("❌ DEBUG: AI返回热量无效，使用估算热量")
-            # 基于食物项数量估算最小热量
-            estimated_calories = len(food_items) * 150  # 每项食物最少150卡路里
+            # 按各项食物的份量估算热量
+            estimated_calories = int(sum(
+                estimate_food_calories(item.get('name', ''), item.get('amount', 1), item.get('unit'))
+                for item in food_items
+            ))
             if estimated_calories < 100:
                 estimated_calories = 200  # 最低保证200卡路里
             
@@ -2094,6 +3578,13 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
             result['basic_nutrition'] = basic_nutrition
             print(f"🔧 DEBUG: 修复后热量: {estimated_calories}")
         
+        # 合并本地成分表计算的食物，并拆分出逐项营养
+        model_items = result.pop('food_items_nutrition', None)
+        result = merge_local_nutrition(result, local_items)
+        result['food_items_nutrition'] = attribute_item_nutrition(
+            food_items if needs_parsing else all_food_items or food_items,
+            result['basic_nutrition'], model_items)
+        
         # 添加每日激励名言到结果中
         result['motivation_message'] = get_daily_quote()
         
@@ -2101,10 +3592,13 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
         if natural_language_input:
             result['parsed_food_info'] = {
                 'original_description': natural_language_input,
-                'parsed_foods': food_items,
-                'parsing_method': 'ai_natural_language'
+                'parsed_foods': food_items if needs_parsing else all_food_items,
+                'parsing_method': parsing_method
             }
         
+        # 只缓存Gemini的真实分析结果，fallback结果不写入缓存
+        set_cached_analysis(cache_key, result)
+        
         print(f"✅ DEBUG: 返回AI分析结果")
         return result
         
@@ -2114,14 +3608,17 @@ def call_gemini_meal_analysis(meal_type, food_items, user_info, natural_language
         print(f"完整错误信息: {traceback.format_exc()}")
         logger.error(f"Gemini营养分析失败，使用fallback: {e}")
         # 返回模拟数据作为fallback
-        return generate_fallback_nutrition_analysis(food_items, meal_type)
+        fallback_result = merge_local_nutrition(generate_fallback_nutrition_analysis(food_items, meal_type), local_items)
+        fallback_result['food_items_nutrition'] = attribute_item_nutrition(
+            all_food_items or food_items, fallback_result['basic_nutrition'])
+        return fallback_result
 
 def call_gemini_exercise_analysis(exercise_type, exercise_name, duration, user_info, exercise_description=None):
     """调用Gemini AI进行运动分析"""
     try:
         # 尝试获取Gemini模型
         try:
-            model = get_gemini_model()
+            model = get_gemini_model('analysis')
         except Exception as e:
             logger.warning(f"Gemini API不可用，使用fallback: {e}")
             return generate_fallback_exercise_analysis(exercise_type, exercise_name, duration, user_info, exercise_description)
@@ -2235,19 +3732,10 @@ def call_gemini_exercise_analysis(exercise_type, exercise_name, duration, user_i
 """
         
         # 调用Gemini API
-        response = model.generate_content(prompt)
+        response = generate_gemini_content(model, prompt, EXERCISE_ANALYSIS_SCHEMA)
         
         # 解析JSON响应
-        import json
-        result_text = response.text.strip()
-        
-        # 清理响应文本
-        if result_text.startswith('```json'):
-            result_text = result_text[7:]
-        if result_text.endswith('```'):
-            result_text = result_text[:-3]
-        
-        result = json.loads(result_text)
+        result = parse_gemini_json(response.text, 'exercise_analysis')
         
         # 添加每日激励名言到结果中
         result['motivation_message'] = get_daily_quote()
@@ -2256,10 +3744,15 @@ def call_gemini_exercise_analysis(exercise_type, exercise_name, duration, user_i
         
     except Exception as e:
         print(f"Gemini运动分析错误: {e}")
-        return generate_fallback_exercise_analysis(exercise_type, exercise_name, duration, user_info)
+        return generate_fallback_exercise_analysis(exercise_type, exercise_name, duration, user_info, exercise_description)
 
 def generate_fallback_exercise_analysis(exercise_type, exercise_name, duration, user_info, exercise_description=None):
     """生成运动分析的fallback数据"""
+    # 自然语言描述模式下没有分离字段，使用默认值估算
+    exercise_type = exercise_type or 'unknown'
+    exercise_name = exercise_name or (exercise_description or '运动')[:50]
+    duration = duration or 30
+    
     # 计算卡路里消耗（传统方法）
     calories_burned, intensity = estimate_calories_burned(exercise_type, exercise_name, duration, user_info['weight'])
     
@@ -2303,6 +3796,216 @@ def generate_fallback_exercise_analysis(exercise_type, exercise_name, duration,
         'motivation_message': get_daily_quote()
     }
 
+def resolve_food_items_locally(food_items):
+    """用本地成分表计算已知食物的营养，返回 (已计算的食物列表, 未知食物列表)"""
+    local_items = []
+    unknown_items = []
+    for item in food_items:
+        match = lookup_food(item.get('name', ''))
+        if not match:
+            unknown_items.append(item)
+            continue
+        food, match_type = match
+        grams = estimate_grams(food, item.get('amount', 1), item.get('unit'))
+        local_items.append(dict(
+            item,
+            matched_food=food['name'],
+            match_type=match_type,
+            grams=round(grams),
+            nutrition=nutrition_for_grams(food, grams)
+        ))
+    return local_items, unknown_items
+
+def merge_local_nutrition(result, local_items):
+    """把本地计算的食物营养累加进分析结果的basic_nutrition，并重算三大营养素占比"""
+    if not local_items:
+        return result
+    
+    basic_nutrition = result.setdefault('basic_nutrition', {})
+    for field in NUTRIENT_FIELDS:
+        local_total = sum(item['nutrition'][field] for item in local_items)
+        current = basic_nutrition.get(field) or 0
+        value = current + local_total
+        basic_nutrition[field] = int(round(value)) if field == 'total_calories' else round(value, 1)
+    
+    protein_kcal = basic_nutrition['protein'] * 4
+    carbs_kcal = basic_nutrition['carbohydrates'] * 4
+    fat_kcal = basic_nutrition['fat'] * 9
+    macro_kcal = protein_kcal + carbs_kcal + fat_kcal
+    if macro_kcal > 0:
+        breakdown = {
+            'protein_percentage': round(protein_kcal * 100 / macro_kcal, 1),
+            'carbs_percentage': round(carbs_kcal * 100 / macro_kcal, 1),
+            'fat_percentage': round(fat_kcal * 100 / macro_kcal, 1)
+        }
+        result['nutrition_breakdown'] = breakdown
+        feedback = result.setdefault('personalized_feedback', {})
+        feedback['macro_balance'] = (f"蛋白质{breakdown['protein_percentage']:.0f}%，"
+                                     f"碳水{breakdown['carbs_percentage']:.0f}%，"
+                                     f"脂肪{breakdown['fat_percentage']:.0f}%")
+    
+    result['local_food_items'] = [
+        {key: item[key] for key in ('name', 'amount', 'unit', 'matched_food', 'grams')}
+        for item in local_items
+    ]
+    return result
+
+# 逐项营养字段 -> basic_nutrition字段
+ITEM_NUTRITION_FIELDS = (('calories', 'total_calories'), ('protein', 'protein'),
+                         ('carbohydrates', 'carbohydrates'), ('fat', 'fat'))
+
+def attribute_item_nutrition(food_items, basic_nutrition, model_items=None):
+    """把一餐的总营养拆分到每项食物
+    
+    成分表中的食物使用实际数值，模型逐项给出的食物使用模型数值，其余食物按份量估算的
+    热量比例分摊剩余总量；没有需要分摊的食物，或固定数值之和已超过总量时，固定数值按比例
+    缩放到总量（其余食物记为0），保证各项之和等于总量。
+    """
+    model_by_name = {
+        item.get('name'): item for item in (model_items or [])
+        if isinstance(item, dict) and item.get('name')
+    }
+    fixed = []
+    weights = []
+    for item in food_items:
+        name = item.get('name', '')
+        match = lookup_food(name)
+        if match:
+            nutrition = nutrition_for_grams(match[0], estimate_grams(match[0], item.get('amount', 1), item.get('unit')))
+            fixed.append({key: nutrition[field] for key, field in ITEM_NUTRITION_FIELDS})
+        elif name in model_by_name:
+            fixed.append({key: float(model_by_name[name].get(key) or 0) for key, _ in ITEM_NUTRITION_FIELDS})
+        else:
+            fixed.append(None)
+        weights.append(estimate_food_calories(name, item.get('amount', 1), item.get('unit')))
+    
+    flexible_weight = sum(weight for weight, values in zip(weights, fixed) if values is None)
+    per_item = [{key: 0.0 for key, _ in ITEM_NUTRITION_FIELDS} for _ in food_items]
+    for key, field in ITEM_NUTRITION_FIELDS:
+        total = float(basic_nutrition.get(field) or 0)
+        fixed_total = sum(values[key] for values in fixed if values is not None)
+        if flexible_weight > 0 and total > fixed_total:
+            remaining = total - fixed_total
+            for index, values in enumerate(fixed):
+                per_item[index][key] = (values[key] if values is not None
+                                        else remaining * weights[index] / flexible_weight)
+        else:
+            scale = total / fixed_total if fixed_total > 0 else 0
+            for index, values in enumerate(fixed):
+                if values is not None:
+                    per_item[index][key] = values[key] * scale
+    
+    result = []
+    for item, values in zip(food_items, per_item):
+        result.append({
+            'name': item.get('name', ''),
+            'amount': item.get('amount', 1),
+            'unit': item.get('unit', '份'),
+            'calories': int(round(values['calories'])),
+            'protein': round(values['protein'], 1),
+            'carbohydrates': round(values['carbohydrates'], 1),
+            'fat': round(values['fat'], 1)
+        })
+    
+    # 四舍五入误差计入热量最高的一项，保证各项热量之和等于总热量
+    if result:
+        drift = int(round(float(basic_nutrition.get('total_calories') or 0))) - sum(item['calories'] for item in result)
+        if drift and abs(drift) <= len(result):
+            max(result, key=lambda item: item['calories'])['calories'] += drift
+    return result
+
+def meal_item_nutrition(meals, analysis_result):
+    """取每条饮食记录对应的逐项营养，分析结果中的逐项数据与记录对不上时重新拆分"""
+    food_items = [{
+        'name': meal.food_name or '',
+        'amount': meal.amount or meal.quantity or 1,
+        'unit': meal.unit or '份'
+    } for meal in meals]
+    per_item = analysis_result.get('food_items_nutrition') or []
+    if [item.get('name') for item in per_item] == [item['name'] for item in food_items]:
+        return per_item
+    return attribute_item_nutrition(food_items, analysis_result.get('basic_nutrition') or {}, per_item)
+
+def insert_meal_logs(rows, session=None):
+    """批量 INSERT ... RETURNING 写入饮食记录，按输入顺序返回ID
+    
+    sort_by_parameter_order 让RETURNING的顺序与rows一致：PostgreSQL上合并为一条多行INSERT，
+    SQLite不能保证多行RETURNING的顺序，会逐行执行。绕过ORM单元，计数器和每日汇总在这里登记；
+    rows 中每行的字段应相同"""
+    from sqlalchemy import insert
+    
+    session = session or db.session
+    if not rows:
+        return []
+    ids = session.execute(insert(MealLog).returning(MealLog.id, sort_by_parameter_order=True), rows).scalars().all()
+    add_app_counter_deltas({APP_COUNTER_SOURCES[MealLog]: len(ids)}, session)
+    mark_daily_summary_days(((row['user_id'], row['date']) for row in rows), session)
+    return ids
+
+def update_meal_logs(rows, session=None):
+    """一条 UPDATE ... FROM (逐行取值的派生表) 按ID更新饮食记录，返回更新的行数
+    
+    rows 中每行都包含 id 和相同的字段；被更新记录的 (user_id, 日期) 由 RETURNING 取回并登记汇总重算"""
+    from sqlalchemy import cast, literal, select, union_all
+    
+    session = session or db.session
+    if not rows:
+        return 0
+    table = MealLog.__table__
+    names = list(rows[0])
+    # SQLite按类型名推断亲和性，CAST(... AS DATE/JSON) 会把值转成数字，只在其他数据库上显式标注类型
+    typed = session.get_bind().dialect.name != 'sqlite'
+    
+    def _value(row, name):
+        value = literal(row[name], table.c[name].type)
+        return (cast(value, table.c[name].type) if typed else value).label(name)
+    
+    selects = [select(*[_value(row, name) for name in names]) for row in rows]
+    source = (union_all(*selects) if len(selects) > 1 else selects[0]).subquery('meal_values')
+    updated = session.execute(
+        table.update()
+        .where(table.c.id == source.c.id)
+        .values({name: source.c[name] for name in names if name != 'id'})
+        .returning(table.c.user_id, table.c.date)
+    ).all()
+    mark_daily_summary_days(((row.user_id, row.date) for row in updated), session)
+    return len(updated)
+
+def bulk_update_meal_nutrition(meals, analysis_result, row_values=None):
+    """用一条批量UPDATE把逐项营养写回饮食记录，row_values(meal)可返回每行的额外字段"""
+    rows = []
+    for meal, nutrition in zip(meals, meal_item_nutrition(meals, analysis_result)):
+        row = {
+            'id': meal.id,
+            'calories': int(nutrition.get('calories') or 0),
+            'protein': nutrition.get('protein') or 0,
+            'carbs': nutrition.get('carbohydrates') or 0,
+            'fat': nutrition.get('fat') or 0
+        }
+        if row_values:
+            row.update(row_values(meal))
+        rows.append(row)
+    return update_meal_logs(rows)
+
+def build_local_nutrition_analysis(local_items, meal_type):
+    """所有食物都在本地成分表中时，直接生成完整的营养分析结果"""
+    result = generate_fallback_nutrition_analysis(local_items, meal_type)
+    result['basic_nutrition'] = {field: 0 for field in NUTRIENT_FIELDS}
+    result = merge_local_nutrition(result, local_items)
+    result['analysis_source'] = 'local_food_db'
+    return result
+
+def build_meal_fallback_analysis(meal_type, food_items, natural_language_input=None):
+    """不调用Gemini的饮食分析：已知食物用成分表数值，其余按规则估算"""
+    food_items = food_items or [{'name': (natural_language_input or '未知食物')[:50], 'amount': 1, 'unit': '份'}]
+    local_items, unknown_items = resolve_food_items_locally(food_items)
+    if unknown_items:
+        result = merge_local_nutrition(generate_fallback_nutrition_analysis(unknown_items, meal_type), local_items)
+    else:
+        result = build_local_nutrition_analysis(local_items, meal_type)
+    result['food_items_nutrition'] = attribute_item_nutrition(food_items, result['basic_nutrition'])
+    return result
+
 def generate_fallback_nutrition_analysis(food_items, meal_type):
     """生成智能化的营养分析数据（基于食物内容）"""
     import hashlib
@@ -2311,18 +4014,18 @@ def generate_fallback_nutrition_analysis(food_items, meal_type):
     food_text = ''.join([item.get('name', '') for item in food_items])
     food_hash = int(hashlib.md5(food_text.encode()).hexdigest()[:8], 16)
     
-    # 基于食物内容的智能热量估算
-    base_calories = len(food_items) * 120  # 基础热量
+    # 基于份量的热量估算：成分表中的食物按实际营养计算，其余按份量估算后再按关键词调整
+    base_calories = 0
     
     # 分析食物关键词，调整营养成分
     protein_boost = 0
     carbs_boost = 0
     fat_boost = 0
-    calorie_multiplier = 1.0
     health_score_base = 7.0
     
     for item in food_items:
         name = item.get('name', '').lower()
+        calorie_multiplier = 1.0
         
         # 蛋白质丰富食物
         if any(word in name for word in ['鸡蛋', '牛奶', '肉', '鱼', '虾', '豆腐', '酸奶', '坚果']):
@@ -2348,10 +4051,15 @@ def generate_fallback_nutrition_analysis(food_items, meal_type):
         if any(word in name for word in ['可乐', '汽水', '炸鸡', '薯条', '方便面', '糖果']):
             health_score_base -= 0.8
             calorie_multiplier += 0.3
+        
+        item_calories = estimate_food_calories(name, item.get('amount', 1), item.get('unit'))
+        if lookup_food(name):
+            calorie_multiplier = 1.0  # 成分表数据已包含烹饪方式，不再按关键词放大
+        base_calories += item_calories * calorie_multiplier
     
     # 计算最终营养成分
     # 🚨 关键修复3: 确保fallback永远不返回零热量
-    estimated_calories = max(200, int(base_calories * calorie_multiplier))  # 最少200卡路里
+    estimated_calories = max(50, int(base_calories))  # 最少50卡路里
     
     # 营养成分比例（基于食物类型动态调整）
     protein_pct = min(35, max(10, 15 + protein_boost * 100))
@@ -2426,52 +4134,418 @@ def generate_fallback_nutrition_analysis(food_items, meal_type):
         "motivation_message": motivation
     }
 
+# 记录表的复合索引: (表名, 索引名, 列)
+LOG_TABLE_INDEXES = (
+    ('exercise_log', 'ix_exercise_log_user_date', ('user_id', 'date')),
+    ('exercise_log', 'ix_exercise_log_user_created_at', ('user_id', 'created_at')),
+    ('meal_log', 'ix_meal_log_user_date', ('user_id', 'date')),
+    ('meal_log', 'ix_meal_log_user_created_at', ('user_id', 'created_at')),
+    ('weight_log', 'ix_weight_log_user_created_at', ('user_id', 'created_at')),
+)
+
+# ==================== 数据库迁移 ====================
+# 已执行的迁移记录在 schema_migration 表中。每个迁移都是幂等的，
+# 这样在手动执行过旧迁移脚本的数据库上重放也不会出错。
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migration'
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+MIGRATIONS = []
+
+def migration(version, name, transactional=True):
+    """注册一个迁移，按版本号顺序执行；函数接收一个处于事务中的连接
+    
+    transactional=False 时在PostgreSQL上改为传入自动提交的连接（用于 CREATE INDEX CONCURRENTLY），
+    迁移函数需要自己保证中途失败后可以重跑"""
+    def register(func):
+        func.transactional = transactional
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+def _add_missing_columns(conn, table_name, columns):
+    """给已存在的表补充缺失的列，返回新增的列名"""
+    from sqlalchemy import inspect, text
+    
+    inspector = inspect(conn)
+    if table_name not in inspector.get_table_names():
+        return []
+    existing = {column['name'] for column in inspector.get_columns(table_name)}
+    added = []
+    for column_name, column_type in columns:
+        if column_name not in existing:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+            added.append(column_name)
+    return added
+
+@migration(1, 'create_tables')
+def _migration_create_tables(conn):
+    """创建所有模型表（已存在的表跳过，替代 create_weight_log_table.py）"""
+    db.metadata.create_all(conn, checkfirst=True)
+
+@migration(2, 'exercise_log_analysis_columns')
+def _migration_exercise_log_columns(conn):
+    """运动记录的描述和AI分析字段（替代 migrate_database.py、migrate_exercise_description.py）"""
+    # 旧脚本添加的列没有默认值时留下的NULL由回填 exercise_log_analysis_status 分批补齐
+    _add_missing_columns(conn, 'exercise_log', (
+        ('exercise_description', 'TEXT'),
+        ('analysis_status', "VARCHAR(20) DEFAULT 'completed'"),
+        ('ai_analysis_result', 'JSON'),
+    ))
+
+@migration(3, 'meal_log_v2_columns')
+def _migration_meal_log_columns(conn):
+    """饮食记录的自然语言描述、数量单位、评分和分析状态字段（替代 db_migration.py 中仍在使用的字段）"""
+    _add_missing_columns(conn, 'meal_log', (
+        ('food_description', 'TEXT'),
+        ('amount', 'FLOAT'),
+        ('unit', 'VARCHAR(10)'),
+        ('meal_score', 'FLOAT'),
+        ('analysis_status', "VARCHAR(20) DEFAULT 'completed'"),
+    ))
+
+@migration(4, 'log_table_indexes', transactional=False)
+def _migration_log_indexes(conn):
+    """记录表的 (user_id, date) / (user_id, created_at) 复合索引
+    
+    PostgreSQL上用 CREATE INDEX CONCURRENTLY，千万行的记录表建索引期间不阻塞写入；
+    中断留下的无效索引先删除再重建"""
+    from sqlalchemy import text
+    
+    concurrently = ''
+    if conn.dialect.name == 'postgresql':
+        concurrently = 'CONCURRENTLY '
+        invalid = conn.execute(text("""
+            SELECT c.relname FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+            WHERE NOT i.indisvalid AND c.relname = ANY(:names)
+        """), {'names': [index_name for _, index_name, _ in LOG_TABLE_INDEXES]}).scalars().all()
+        for index_name in invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+    for table_name, index_name, columns in LOG_TABLE_INDEXES:
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {index_name} ON {table_name} ({', '.join(columns)})"))
+
+class BackfillCheckpoint(db.Model):
+    """分批回填的进度检查点，每批处理后与数据修改在同一事务内更新"""
+    __tablename__ = 'backfill_checkpoint'
+    name = db.Column(db.String(100), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, completed, failed
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    max_id = db.Column(db.Integer, nullable=False, default=0)
+    scanned = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    batches = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+@migration(5, 'backfill_checkpoint_table')
+def _migration_backfill_checkpoint(conn):
+    """分批回填检查点表"""
+    BackfillCheckpoint.__table__.create(conn, checkfirst=True)
+
+@migration(6, 'weight_log_unique_user_date')
+def _migration_weight_log_unique(conn):
+    """体重记录的 (user_id, date) 唯一约束，ON CONFLICT 写入依赖它；早期建的表没有约束时先去重再补唯一索引"""
+    from sqlalchemy import func, inspect, text
+    
+    inspector = inspect(conn)
+    if 'weight_log' not in inspector.get_table_names():
+        return
+    unique_columns = [constraint['column_names'] for constraint in inspector.get_unique_constraints('weight_log')]
+    unique_columns += [index['column_names'] for index in inspector.get_indexes('weight_log') if index['unique']]
+    if any(sorted(columns) == ['date', 'user_id'] for columns in unique_columns):
+        return
+    # 同一天保留最新的一条；删除绕过ORM，受影响的每日汇总和体重计数器在这里同步修正
+    table = WeightLog.__table__
+    latest = db.select(func.max(table.c.id).label('keep_id')).group_by(table.c.user_id, table.c.date).subquery()
+    duplicates = conn.execute(
+        db.select(table.c.id, table.c.user_id, table.c.date)
+        .where(table.c.id.not_in(db.select(latest.c.keep_id)))
+        .order_by(table.c.user_id, table.c.date, table.c.id)
+    ).all()
+    if duplicates:
+        conn.execute(table.delete().where(table.c.id.in_([row.id for row in duplicates])))
+        for row in duplicates:
+            logger.info(f"删除重复的体重记录: user_id={row.user_id}, date={row.date}, id={row.id}")
+        with Session(bind=conn) as session:
+            refresh_daily_summaries({(row.user_id, row.date) for row in duplicates}, session)
+        counters = AppCounter.__table__
+        conn.execute(counters.update().where(counters.c.name == 'weight_logs')
+                     .values(value=counters.c.value - len(duplicates), updated_at=datetime.now(timezone.utc)))
+        logger.info(f"删除了{len(duplicates)}条重复的体重记录，已更新每日汇总和计数器")
+    conn.execute(text("CREATE UNIQUE INDEX unique_user_date ON weight_log (user_id, date)"))
+
+@migration(7, 'user_daily_summary_initial_build')
+def _migration_daily_summary_build(conn):
+    """从原始记录建立每日汇总，部署前已有的记录在仪表盘和进度页不会显示为0"""
+    with Session(bind=conn) as session:
+        rebuilt = _rebuild_daily_summary_rows(session)
+    logger.info(f"每日汇总初始建立完成: {rebuilt}天")
+
+@migration(8, 'app_counter_seed')
+def _migration_seed_app_counters(conn):
+    """用精确COUNT建立后台计数器，部署后冷启动的实例读取时不需要补建"""
+    with Session(bind=conn) as session:
+        counts = _write_exact_app_counters(session)
+    logger.info(f"后台计数器已建立: {counts}")
+
+def get_schema_version(engine=None):
+    """读取当前schema版本；版本表不存在时返回0"""
+    from sqlalchemy.exc import OperationalError, ProgrammingError
+    
+    engine = engine or db.engine
+    table = SchemaMigration.__table__
+    try:
+        with engine.connect() as conn:
+            return conn.execute(db.select(db.func.max(table.c.version))).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+# PostgreSQL advisory lock 的键，多个实例冷启动时串行执行迁移
+MIGRATION_LOCK_KEY = 7305001
+
+@contextmanager
+def _migration_lock(engine):
+    """PostgreSQL上持有迁移的 advisory lock；SQLite没有并发DDL的问题，不加锁
+    
+    用会话级锁而不是事务级锁，因为 CREATE INDEX CONCURRENTLY 不能在事务内执行"""
+    from sqlalchemy import text
+    
+    if engine.dialect.name != 'postgresql':
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+            conn.commit()
+
+def run_migrations(engine=None):
+    """按版本顺序执行未执行过的迁移，每个迁移一个事务，返回执行的迁移名称
+    
+    先取迁移锁再读取已执行的版本：同时冷启动的实例排队等待，拿到锁后看到前一个实例
+    已执行的迁移直接跳过，不会并发执行同一条DDL"""
+    from sqlalchemy.exc import IntegrityError
+    
+    engine = engine or db.engine
+    table = SchemaMigration.__table__
+    applied = []
+    with _migration_lock(engine):
+        table.create(engine, checkfirst=True)
+        with engine.connect() as conn:
+            applied_versions = set(conn.execute(db.select(table.c.version)).scalars())
+        
+        for version, name, func in MIGRATIONS:
+            if version in applied_versions:
+                continue
+            record = table.insert().values(version=version, name=name, applied_at=datetime.now(timezone.utc))
+            try:
+                if not func.transactional and engine.dialect.name == 'postgresql':
+                    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                        func(conn)
+                    with engine.begin() as conn:
+                        conn.execute(record)
+                else:
+                    with engine.begin() as conn:
+                        func(conn)
+                        conn.execute(record)
+                applied.append(name)
+                logger.info(f"执行数据库迁移 {version}: {name}")
+            except IntegrityError:
+                # 没有迁移锁的数据库（SQLite）上另一个进程已经执行了同一个迁移
+                logger.info(f"数据库迁移 {version} 已由其他进程执行")
+    return applied
+
+def ensure_schema_current(engine=None):
+    """schema版本落后时执行迁移；最新时只有一条查询"""
+    if get_schema_version(engine) >= MIGRATIONS[-1][0]:
+        return []
+    return run_migrations(engine)
+
 def ensure_database_schema():
-    """确保数据库schema正确"""
+    """确保数据库schema正确（执行所有未执行的迁移）"""
     try:
-        from sqlalchemy import inspect, text
-        
-        # 检查表是否存在
-        inspector = inspect(db.engine)
-        if 'meal_log' not in inspector.get_table_names():
-            return True  # 表不存在，create_all会创建
-            
-        # 检查必要字段是否存在
-        existing_columns = {col['name'] for col in inspector.get_columns('meal_log')}
-        required_fields = {
-            'food_description': 'TEXT',
-            'amount': 'FLOAT', 
-            'unit': 'VARCHAR(10)',
-            'meal_score': 'FLOAT'
-        }
-        
-        missing_fields = set(required_fields.keys()) - existing_columns
-        
-        if missing_fields:
-            logger.info(f"添加缺失的数据库字段: {', '.join(missing_fields)}")
-            
-            for field_name in missing_fields:
-                field_type = required_fields[field_name]
-                try:
-                    sql = f"ALTER TABLE meal_log ADD COLUMN {field_name} {field_type};"
-                    db.session.execute(text(sql))
-                    logger.info(f"添加字段: {field_name}")
-                except Exception as e:
-                    logger.warning(f"添加字段失败 {field_name}: {e}")
-                    
-            db.session.commit()
-            
+        ensure_schema_current()
         return True
-        
     except Exception as e:
         logger.error(f"数据库schema检查失败: {e}")
         return False
 
+# 分批回填：按主键范围分批处理，每批一个短事务并同时写入检查点，批间休眠，
+# 中断或超过时间预算后下次从检查点继续，可以在高峰期执行而不长时间锁表
+BACKFILL_BATCH_SIZE = int(os.getenv('BACKFILL_BATCH_SIZE', '500'))
+BACKFILL_SLEEP_MS = int(os.getenv('BACKFILL_SLEEP_MS', '50'))
+BACKFILL_TIME_BUDGET = float(os.getenv('BACKFILL_TIME_BUDGET', '20'))
+BACKFILLS = {}
+
+def backfill(name, table_name, description):
+    """注册一个分批回填；函数接收表对象，返回 (需要处理的行的条件, 要更新的值)
+    
+    回填绕过ORM，不能修改每日汇总、计数器或身份缓存依赖的字段"""
+    def register(func):
+        BACKFILLS[name] = {'name': name, 'table': table_name, 'description': description, 'build': func}
+        return func
+    return register
+
+@backfill('meal_log_damaged_analysis', 'meal_log', '清除损坏的饮食AI分析结果（"{"、"{}"、null 等）')
+def _backfill_damaged_meal_analysis(table):
+    """替代 /admin/fix-analysis-data 的整表正则UPDATE：这些损坏值的文本长度都小于10"""
+    from sqlalchemy import cast, func, null
+    
+    analysis_text = func.trim(cast(table.c.analysis_result, db.Text))
+    return (table.c.analysis_result.isnot(None) & (func.length(analysis_text) < 10),
+            {'analysis_result': null()})
+
+@backfill('exercise_log_analysis_status', 'exercise_log', '补齐运动记录缺失的分析状态')
+def _backfill_exercise_analysis_status(table):
+    """旧脚本添加 analysis_status 列时没有默认值，历史记录为NULL"""
+    return table.c.analysis_status.is_(None), {'analysis_status': 'completed'}
+
+def _backfill_spec(name):
+    spec = BACKFILLS.get(name)
+    if spec is None:
+        raise ValueError(f'未知的回填任务: {name}')
+    table = db.metadata.tables[spec['table']]
+    condition, values = spec['build'](table)
+    return spec, table, condition, values
+
+def _backfill_progress(spec, state):
+    """检查点转换为进度字典"""
+    state = state or {}
+    status = state.get('status', 'pending')
+    max_id = state.get('max_id') or 0
+    if status == 'completed':
+        percent = 100.0
+    else:
+        percent = round(min(state.get('last_id') or 0, max_id) * 100.0 / max_id, 1) if max_id else 0.0
+    progress = {
+        'name': spec['name'],
+        'table': spec['table'],
+        'description': spec['description'],
+        'status': status,
+        'percent': percent,
+    }
+    for key in ('last_id', 'max_id', 'scanned', 'updated', 'batches'):
+        progress[key] = state.get(key) or 0
+    progress['error'] = state.get('error')
+    for key in ('started_at', 'updated_at', 'finished_at'):
+        progress[key] = state[key].isoformat() if state.get(key) else None
+    return progress
+
+def count_backfill_rows(name, engine=None):
+    """试运行：统计需要处理的行数，不修改数据"""
+    from sqlalchemy import func
+    
+    engine = engine or db.engine
+    _, table, condition, _ = _backfill_spec(name)
+    with engine.connect() as conn:
+        return conn.execute(db.select(func.count()).select_from(table).where(condition)).scalar()
+
+def get_backfill_progress(engine=None):
+    """所有已注册回填的进度；检查点表还不存在时都视为未开始"""
+    from sqlalchemy.exc import OperationalError, ProgrammingError
+    
+    engine = engine or db.engine
+    checkpoints = BackfillCheckpoint.__table__
+    try:
+        with engine.connect() as conn:
+            rows = {row['name']: dict(row) for row in conn.execute(db.select(checkpoints)).mappings()}
+    except (OperationalError, ProgrammingError):
+        rows = {}
+    return [_backfill_progress(spec, rows.get(name)) for name, spec in BACKFILLS.items()]
+
+def run_backfill(name, engine=None, batch_size=None, sleep_ms=None, time_budget=None, max_batches=None,
+                 restart=False):
+    """执行一段回填，超过时间预算或批数上限时停止，返回进度
+    
+    开始时记下表的最大主键，只处理此前已有的行；restart=True 时从头重新扫描"""
+    from sqlalchemy import func
+    
+    engine = engine or db.engine
+    spec, table, condition, values = _backfill_spec(name)
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    sleep_ms = BACKFILL_SLEEP_MS if sleep_ms is None else sleep_ms
+    time_budget = BACKFILL_TIME_BUDGET if time_budget is None else time_budget
+    checkpoints = BackfillCheckpoint.__table__
+    primary_key = table.c.id
+    
+    with engine.begin() as conn:
+        row = conn.execute(db.select(checkpoints).where(checkpoints.c.name == name)).mappings().first()
+        if row is None or restart:
+            now = datetime.now(timezone.utc)
+            state = {'name': name, 'status': 'running', 'last_id': 0,
+                     'max_id': conn.execute(db.select(func.max(primary_key))).scalar() or 0,
+                     'scanned': 0, 'updated': 0, 'batches': 0, 'error': None,
+                     'started_at': now, 'updated_at': now, 'finished_at': None}
+            if row is None:
+                conn.execute(checkpoints.insert().values(**state))
+            else:
+                conn.execute(checkpoints.update().where(checkpoints.c.name == name).values(**state))
+        else:
+            state = dict(row)
+    if state['status'] == 'completed':
+        return _backfill_progress(spec, state)
+    
+    state['status'] = 'running'
+    state['error'] = None
+    deadline = time.monotonic() + time_budget
+    batches = 0
+    try:
+        while True:
+            # 本批的进度只在事务提交后生效
+            batch_state = dict(state)
+            with engine.begin() as conn:
+                ids = conn.execute(
+                    db.select(primary_key)
+                    .where(primary_key > state['last_id'], primary_key <= state['max_id'])
+                    .order_by(primary_key)
+                    .limit(batch_size)
+                ).scalars().all()
+                if ids:
+                    in_batch = (primary_key > state['last_id']) & (primary_key <= ids[-1])
+                    result = conn.execute(table.update().where(in_batch, condition).values(**values))
+                    batch_state['last_id'] = ids[-1]
+                    batch_state['scanned'] += len(ids)
+                    batch_state['updated'] += max(result.rowcount or 0, 0)
+                    batch_state['batches'] += 1
+                batch_state['updated_at'] = datetime.now(timezone.utc)
+                if not ids or batch_state['last_id'] >= batch_state['max_id']:
+                    batch_state['status'] = 'completed'
+                    batch_state['finished_at'] = batch_state['updated_at']
+                conn.execute(checkpoints.update().where(checkpoints.c.name == name).values(
+                    {key: value for key, value in batch_state.items() if key != 'name'}))
+            state = batch_state
+            batches += 1
+            
+            if state['status'] == 'completed':
+                logger.info(f"回填 {name} 完成：扫描{state['scanned']}行，修改{state['updated']}行")
+                break
+            if (max_batches and batches >= max_batches) or time.monotonic() >= deadline:
+                break
+            if sleep_ms:
+                time.sleep(sleep_ms / 1000.0)
+    except Exception as e:
+        logger.error(f"回填 {name} 失败: {e}")
+        state['status'] = 'failed'
+        state['error'] = str(e)
+        with engine.begin() as conn:
+            conn.execute(checkpoints.update().where(checkpoints.c.name == name).values(
+                status='failed', error=str(e), updated_at=datetime.now(timezone.utc)))
+    return _backfill_progress(spec, state)
+
 def init_database():
     """初始化数据库函数"""
     print("🚀 初始化数据库...")
-    ensure_database_schema()
-    db.create_all()
+    run_migrations()
     create_default_admin()
     create_default_prompts()
 
@@ -2493,8 +4567,8 @@ def init_database_endpoint():
         if not (os.getenv('VERCEL') or os.getenv('DATABASE_URL')):
             return jsonify({"error": "仅限生产环境使用"}), 403
         
-        # 创建所有表
-        db.create_all()
+        # 创建所有表并执行迁移
+        run_migrations()
         
         # 验证表结构
         tables_status = {}
@@ -2537,8 +4611,8 @@ def diagnose_meal_system():
         
         # 2. 检查MealLog表
         try:
-            # 尝试创建表
-            db.create_all()
+            # 确保schema是最新版本
+            ensure_schema_current()
             
             # 检查表结构
             result = db.session.execute(text("SELECT COUNT(*) FROM meal_log"))
@@ -2635,88 +4709,25 @@ def get_fix_recommendations(diagnosis):
 # 生产环境数据库迁移端点
 @app.route('/migrate-database-schema-secret-99999')
 def migrate_database_schema():
-    """生产环境数据库schema迁移端点"""
+    """生产环境数据库schema迁移端点（执行迁移注册表中未执行的迁移）"""
+    # 检查是否为生产环境
+    if not (os.getenv('VERCEL') or os.getenv('DATABASE_URL')):
+        return jsonify({"error": "仅限生产环境使用"}), 403
+    
     try:
-        from sqlalchemy import text
-        
-        # 检查是否为生产环境
-        if not (os.getenv('VERCEL') or os.getenv('DATABASE_URL')):
-            return jsonify({"error": "仅限生产环境使用"}), 403
-        
-        migration_results = []
-        
-        # 检查并添加exercise_log表的缺失字段
-        try:
-            # 检查analysis_status字段
-            try:
-                result = db.session.execute(text("""
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = 'exercise_log' AND column_name = 'analysis_status'
-                """))
-                analysis_status_exists = len(result.fetchall()) > 0
-            except:
-                analysis_status_exists = False
-            
-            if not analysis_status_exists:
-                db.session.execute(text("""
-                    ALTER TABLE exercise_log 
-                    ADD COLUMN analysis_status VARCHAR(20) DEFAULT 'pending'
-                """))
-                migration_results.append("✅ 添加analysis_status字段")
-            else:
-                migration_results.append("ℹ️ analysis_status字段已存在")
-            
-            # 检查ai_analysis_result字段
-            try:
-                result = db.session.execute(text("""
-                    SELECT column_name FROM information_schema.columns 
-                    WHERE table_name = 'exercise_log' AND column_name = 'ai_analysis_result'
-                """))
-                ai_analysis_result_exists = len(result.fetchall()) > 0
-            except:
-                ai_analysis_result_exists = False
-            
-            if not ai_analysis_result_exists:
-                db.session.execute(text("""
-                    ALTER TABLE exercise_log 
-                    ADD COLUMN ai_analysis_result JSON
-                """))
-                migration_results.append("✅ 添加ai_analysis_result字段")
-            else:
-                migration_results.append("ℹ️ ai_analysis_result字段已存在")
-            
-            # 提交更改
-            db.session.commit()
-            
-            # 验证表结构
-            result = db.session.execute(text("""
-                SELECT column_name, data_type 
-                FROM information_schema.columns 
-                WHERE table_name = 'exercise_log'
-                ORDER BY ordinal_position
-            """))
-            columns = result.fetchall()
-            
-            return jsonify({
-                "status": "success",
-                "message": "数据库迁移完成",
-                "migrations": migration_results,
-                "current_schema": [{"name": col[0], "type": col[1]} for col in columns],
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            })
-            
-        except Exception as e:
-            db.session.rollback()
-            return jsonify({
-                "status": "error",
-                "message": f"迁移失败: {str(e)}",
-                "migrations": migration_results
-            }), 500
-            
+        applied = run_migrations()
+        return jsonify({
+            "status": "success",
+            "message": "数据库迁移完成",
+            "migrations": [f"✅ {name}" for name in applied] or ["ℹ️ schema已是最新版本"],
+            "schema_version": get_schema_version(),
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
     except Exception as e:
+        logger.error(f"数据库迁移失败: {e}")
         return jsonify({
             "status": "error",
-            "message": f"迁移过程错误: {str(e)}"
+            "message": f"迁移失败: {str(e)}"
         }), 500
 
 # SystemSettings 模型
@@ -2733,19 +4744,16 @@ class SystemSettings(db.Model):
 @app.route('/admin')
 def admin_index():
     """后台管理首页 - 无需登录验证"""
-    user_count = User.query.count()
-    exercise_count = ExerciseLog.query.count()
-    meal_count = MealLog.query.count()
+    # 总数来自计数器表，活跃度来自每日汇总表，结果缓存ADMIN_STATS_TTL秒
     try:
-        active_users = User.query.join(ExerciseLog).distinct().count()
-    except:
-        active_users = 0
+        stats = get_admin_stats()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"获取后台统计失败: {e}")
+        stats = {'user_count': 0, 'exercise_count': 0, 'meal_count': 0, 'weight_count': 0,
+                 'dau': 0, 'wau': 0, 'series': None}
     
-    return render_template('admin/dashboard.html',
-                         user_count=user_count,
-                         exercise_count=exercise_count,
-                         meal_count=meal_count,
-                         active_users=active_users)
+    return render_template('admin/dashboard.html', stats=stats)
 
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
@@ -2774,13 +4782,50 @@ def admin_login():
     
     return render_template('admin/login.html')
 
+def get_user_activity_stats(user_ids):
+    """一次聚合查询统计用户的运动/饮食记录数和最近活跃时间
+
+    返回 {user_id: {'exercise_count', 'meal_count', 'weight_count', 'last_activity'}}，
+    没有任何记录的用户不在结果中。
+    """
+    from sqlalchemy import func, case, literal, union_all
+
+    if not user_ids:
+        return {}
+
+    activity = union_all(*[
+        db.select(model.user_id, literal(kind).label('kind'), model.created_at)
+        .where(model.user_id.in_(user_ids))
+        for kind, model in (('exercise', ExerciseLog), ('meal', MealLog), ('weight', WeightLog))
+    ]).subquery()
+    rows = db.session.execute(
+        db.select(
+            activity.c.user_id,
+            func.sum(case((activity.c.kind == 'exercise', 1), else_=0)),
+            func.sum(case((activity.c.kind == 'meal', 1), else_=0)),
+            func.sum(case((activity.c.kind == 'weight', 1), else_=0)),
+            func.max(activity.c.created_at)
+        ).group_by(activity.c.user_id)
+    ).all()
+    return {
+        user_id: {
+            'exercise_count': int(exercise_count or 0),
+            'meal_count': int(meal_count or 0),
+            'weight_count': int(weight_count or 0),
+            'last_activity': last_activity
+        }
+        for user_id, exercise_count, meal_count, weight_count, last_activity in rows
+    }
+
 @app.route('/admin/users')
 def admin_users():
     """用户管理 - 无需登录验证"""
     page = request.args.get('page', 1, type=int)
-    users = User.query.order_by(User.created_at.desc()).paginate(
+    # 个人资料随用户一起JOIN加载，记录数和最近活跃时间用一条聚合查询取回
+    users = User.query.options(db.joinedload(User.profile)).order_by(User.created_at.desc()).paginate(
         page=page, per_page=20, error_out=False)
-    return render_template('admin/users.html', users=users)
+    activity = get_user_activity_stats([user.id for user in users.items])
+    return render_template('admin/users.html', users=users, activity=activity)
 
 @app.route('/admin/users/<int:user_id>/toggle')
 def admin_toggle_user(user_id):
@@ -2851,11 +4896,11 @@ def admin_settings():
     """系统设置 - 无需登录验证"""
     try:
         settings = SystemSettings.query.all()
-        cache_info = {
-            'cache_size': len(ai_analysis_cache),
-            'cache_keys': list(ai_analysis_cache.keys())[:5]
-        }
-        return render_template('admin/settings.html', settings=settings, cache_info=cache_info)
+        cache_info = get_analysis_cache_info()
+        gemini_info = dict(gemini_client_metrics, models=GEMINI_MODEL_NAMES,
+                           breaker=gemini_breaker.snapshot(), json_parse=get_json_parse_stats())
+        return render_template('admin/settings.html', settings=settings, cache_info=cache_info,
+                               gemini_info=gemini_info, backfills=get_backfill_progress())
     except Exception as e:
         logger.error(f"Admin settings error: {str(e)}")
         return f"Admin settings error: {str(e)}", 500
@@ -2885,136 +4930,270 @@ def admin_settings_debug():
 @app.route('/admin/cache/clear', methods=['POST'])
 def admin_clear_cache():
     """清理AI分析缓存 - 无需登录验证"""
-    global ai_analysis_cache
-    cache_size = len(ai_analysis_cache)
-    ai_analysis_cache.clear()
+    cache_size = clear_analysis_cache()
     logger.info(f"清理了AI缓存，共清理了{cache_size}个缓存项")
     flash(f'AI缓存已清理，共清理了{cache_size}个缓存项')
     return redirect(url_for('admin_settings'))
 
-@app.route('/admin/fix-analysis-data', methods=['POST'])
-def admin_fix_analysis_data():
-    """修复损坏的AI分析数据"""
+@app.route('/admin/daily-summary/rebuild', methods=['POST'])
+def admin_rebuild_daily_summary():
+    """从原始记录重建每日汇总表"""
     try:
-        from sqlalchemy import text
-        
-        # 直接使用原生SQL查询，避免ORM的JSON类型转换问题
-        result = db.session.execute(text("""
-            UPDATE meal_log 
-            SET analysis_result = NULL 
-            WHERE analysis_result IS NOT NULL 
-              AND (
-                  analysis_result::text = '{}' 
-                  OR analysis_result::text = '"{"' 
-                  OR analysis_result::text = '"{}"'
-                  OR analysis_result::text = '"}"'
-                  OR analysis_result::text = '""'
-                  OR analysis_result::text = 'null'
-                  OR analysis_result::text = '{'
-                  OR analysis_result::text = '}'
-                  OR analysis_result::text = '"{'
-                  OR analysis_result::text = '"}"'
-                  OR LENGTH(TRIM(analysis_result::text)) < 10
-                  OR analysis_result::text ~ '^"?\\{?\\}?"?$'
-              )
-        """))
-        
-        damaged_count = result.rowcount
-        db.session.commit()
-        
-        logger.info(f"修复了{damaged_count}条损坏的AI分析数据")
-        flash(f'已修复 {damaged_count} 条损坏的AI分析数据')
-        
+        rebuilt = rebuild_daily_summaries()
+        flash(f'每日汇总已重建，共{rebuilt}天')
     except Exception as e:
-        logger.error(f"修复分析数据失败: {str(e)}")
         db.session.rollback()
-        
-        # 最后的fallback：只清理明确为NULL的记录
-        try:
-            result = db.session.execute(text("""
-                SELECT COUNT(*) FROM meal_log WHERE analysis_result IS NULL
-            """))
-            null_count = result.fetchone()[0]
-            
-            flash(f'发现 {null_count} 条空分析数据，请用户重新进行AI分析')
-            logger.info(f"发现{null_count}条空分析数据")
-            
-        except Exception as e2:
-            logger.error(f"查询也失败: {str(e2)}")
-            flash(f'数据库查询失败: {str(e2)}', 'error')
-        
+        logger.error(f"重建每日汇总失败: {e}")
+        flash(f'重建每日汇总失败: {e}', 'error')
     return redirect(url_for('admin_settings'))
 
-@app.route('/admin/fix-specific-data', methods=['POST'])
-def admin_fix_specific_data():
-    """针对性修复特定损坏数据"""
+@app.route('/admin/counters/rebuild', methods=['POST'])
+def admin_rebuild_counters():
+    """用精确COUNT校正后台计数器"""
     try:
-        from sqlalchemy import text
-        
-        # 方法1: 使用LENGTH函数
-        try:
-            result = db.session.execute(text("""
-                UPDATE meal_log 
-                SET analysis_result = NULL 
-                WHERE analysis_result IS NOT NULL 
-                  AND LENGTH(analysis_result::text) <= 3
-            """))
-            
-            db.session.commit()
-            fixed_count = result.rowcount
-            
-            logger.info(f"通过LENGTH函数修复了{fixed_count}条损坏数据")
-            flash(f'通过LENGTH函数修复了 {fixed_count} 条损坏的AI分析数据')
-            
-        except Exception as e1:
-            logger.error(f"LENGTH方法失败: {str(e1)}")
-            db.session.rollback()
-            
-            # 方法2: 直接查询并逐一修复
-            try:
-                # 查询所有非NULL的analysis_result
-                result = db.session.execute(text("""
-                    SELECT id FROM meal_log 
-                    WHERE analysis_result IS NOT NULL 
-                    ORDER BY id DESC 
-                    LIMIT 50
-                """))
-                
-                # 通过ORM获取记录并检查
-                ids_to_fix = []
-                for row in result:
-                    meal_id = row[0]
-                    meal = MealLog.query.get(meal_id)
-                    if meal and meal.analysis_result:
-                        analysis_str = str(meal.analysis_result)
-                        if len(analysis_str.strip()) <= 5 or analysis_str.strip() in ['{', '}', '""', 'null']:
-                            ids_to_fix.append(meal_id)
-                
-                # 批量修复
-                if ids_to_fix:
-                    for meal_id in ids_to_fix:
-                        db.session.execute(text("UPDATE meal_log SET analysis_result = NULL WHERE id = :id"), {"id": meal_id})
-                    
-                    db.session.commit()
-                    
-                    logger.info(f"通过ORM检查修复了{len(ids_to_fix)}条损坏数据: {ids_to_fix}")
-                    flash(f'通过ORM检查修复了 {len(ids_to_fix)} 条损坏数据 (IDs: {ids_to_fix[:10]})')
-                else:
-                    flash('没有发现需要修复的损坏数据')
-                    
-            except Exception as e2:
-                logger.error(f"ORM方法也失败: {str(e2)}")
-                db.session.rollback()
-                flash(f'所有修复方法都失败: {str(e2)}', 'error')
-        
+        counts = rebuild_app_counters()
+        flash('计数器已校正: ' + '，'.join(f'{name}={value}' for name, value in counts.items()))
     except Exception as e:
-        logger.error(f"针对性修复完全失败: {str(e)}")
         db.session.rollback()
-        flash(f'修复失败: {str(e)}', 'error')
-        
+        logger.error(f"校正计数器失败: {e}")
+        flash(f'校正计数器失败: {e}', 'error')
+    return redirect(url_for('admin_settings'))
+
+def _flash_backfill_progress(progress):
+    if progress['status'] == 'failed':
+        flash(f"回填 {progress['name']} 失败: {progress['error']}", 'error')
+        return
+    message = (f"回填 {progress['name']}：已扫描{progress['scanned']}行，修改{progress['updated']}行，"
+               f"进度{progress['percent']}%")
+    if progress['status'] != 'completed':
+        message += '，尚未完成，可再次运行从断点继续'
+    flash(message)
+
+@app.route('/admin/backfills')
+def admin_backfills():
+    """所有分批回填的进度"""
+    return jsonify({'success': True, 'backfills': get_backfill_progress()})
+
+@app.route('/admin/backfills/<name>/dry-run', methods=['POST'])
+def admin_backfill_dry_run(name):
+    """试运行回填：只统计需要处理的行数"""
+    if name not in BACKFILLS:
+        flash(f'未知的回填任务: {name}', 'error')
+        return redirect(url_for('admin_settings'))
+    try:
+        flash(f'回填 {name} 试运行：共{count_backfill_rows(name)}行需要处理')
+    except Exception as e:
+        logger.error(f"回填试运行失败: {e}")
+        flash(f'回填试运行失败: {e}', 'error')
+    return redirect(url_for('admin_settings'))
+
+@app.route('/admin/backfills/<name>/run', methods=['POST'])
+def admin_run_backfill(name):
+    """在时间预算内执行一段回填，进度写入检查点"""
+    if name not in BACKFILLS:
+        flash(f'未知的回填任务: {name}', 'error')
+        return redirect(url_for('admin_settings'))
+    _flash_backfill_progress(run_backfill(name, restart=request.form.get('restart') == '1'))
+    return redirect(url_for('admin_settings'))
+
+@app.route('/admin/fix-analysis-data', methods=['POST'])
+def admin_fix_analysis_data():
+    """修复损坏的AI分析数据（分批回填，上次已完成时重新扫描）"""
+    name = 'meal_log_damaged_analysis'
+    previous = next(progress for progress in get_backfill_progress() if progress['name'] == name)
+    _flash_backfill_progress(run_backfill(name, restart=previous['status'] == 'completed'))
     return redirect(url_for('admin_settings'))
 
 # 体重记录API接口
+WEIGHT_BULK_MAX_RECORDS = 366
+
+def upsert_weight_logs(rows, session=None):
+    """一条 INSERT ... ON CONFLICT (user_id, date) DO UPDATE 写入多天体重，返回保存后的行（按日期排序）
+    
+    rows 中每行包含 user_id、date、weight、bmi、notes，同一天出现多次时以最后一次为准；
+    返回行的 inserted 表示是否为新记录。绕过ORM单元，计数器、每日汇总和体重统计缓存在这里登记"""
+    from sqlalchemy import literal
+    
+    session = session or db.session
+    latest = {}
+    for row in rows:
+        latest[(row['user_id'], row['date'])] = row
+    if not latest:
+        return []
+    
+    # 新插入行的 created_at 等于本次写入时间，冲突更新不修改 created_at，据此区分插入和更新
+    now = datetime.now(timezone.utc)
+    table = WeightLog.__table__
+    statement = _dialect_insert(session, WeightLog).values([
+        {'user_id': row['user_id'], 'date': row['date'], 'weight': row['weight'],
+         'bmi': row.get('bmi'), 'notes': row.get('notes'), 'created_at': now}
+        for row in latest.values()
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.date],
+        set_={'weight': statement.excluded.weight, 'bmi': statement.excluded.bmi,
+              'notes': statement.excluded.notes}
+    ).returning(
+        table.c.id, table.c.user_id, table.c.date, table.c.weight, table.c.bmi, table.c.notes,
+        table.c.created_at, (table.c.created_at == literal(now, table.c.created_at.type)).label('inserted')
+    )
+    saved = sorted(session.execute(statement).all(), key=lambda row: (row.user_id, row.date))
+    add_app_counter_deltas({APP_COUNTER_SOURCES[WeightLog]: sum(1 for row in saved if row.inserted)}, session)
+    mark_daily_summary_days(((row.user_id, row.date) for row in saved), session)
+    mark_weight_stats_users((row.user_id for row in saved), session)
+    return saved
+
+def upsert_weight_log(user_id, record_date, weight, bmi=None, notes=None, session=None):
+    """原子地保存某天的体重（已有记录时更新），返回保存后的行"""
+    return upsert_weight_logs([{'user_id': user_id, 'date': record_date, 'weight': weight,
+                                'bmi': bmi, 'notes': notes}], session)[0]
+
+def calculate_bmi(user, weight):
+    """按用户资料中的身高计算BMI，没有身高时返回None"""
+    profile = getattr(user, 'profile', None)
+    if not profile or not profile.height:
+        return None
+    height_m = profile.height / 100  # 转换为米
+    return round(weight / (height_m ** 2), 1)
+
+def parse_weight_value(value):
+    """校验体重数值，返回 (体重, 错误信息)"""
+    if not value:
+        return None, '体重不能为空'
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        return None, '体重格式错误'
+    if weight <= 0 or weight > 500:
+        return None, '体重数据异常'
+    return weight, None
+
+def serialize_weight_log(record):
+    """体重记录转换为API返回的字典（ORM对象或RETURNING行）"""
+    return {
+        'id': record.id,
+        'date': record.date.isoformat(),
+        'weight': record.weight,
+        'bmi': record.bmi,
+        'bmi_status': bmi_status_label(record.bmi),
+        'notes': record.notes
+    }
+
+# 体重统计：一条窗口函数查询，按用户缓存，按版本戳校验并在本进程的体重写入提交后失效
+WEIGHT_STATS_CACHE_TTL = int(os.getenv('WEIGHT_STATS_CACHE_TTL', '300'))
+WEIGHT_CHANGE_PERIODS = {7: 'week_change', 30: 'month_change', 90: 'quarter_change'}
+WEIGHT_HISTORY_MAX_DAYS = 365
+weight_stats_cache = {}
+weight_stats_cache_lock = threading.Lock()
+
+def query_weight_stats(user_id, today=None, history_days=0):
+    """一条查询取体重统计和最近history_days天的记录
+    
+    按 7/30/90 天前的截止日期把记录分段，ROW_NUMBER 取每段日期最新的一条：最靠近今天的一段是最新体重，
+    各周期的基准是截止日期当天或之前最新的一条；最近90天的最小/最大/平均值用整体窗口聚合"""
+    from sqlalchemy import case, func
+    
+    today = today or date.today()
+    periods = sorted(WEIGHT_CHANGE_PERIODS)
+    period_start = today - timedelta(days=periods[-1])
+    segment = case(*[(WeightLog.date <= today - timedelta(days=days), days) for days in reversed(periods)], else_=0)
+    period_weight = case((WeightLog.date > period_start, WeightLog.weight))
+    ranked = db.select(
+        WeightLog.id, WeightLog.date, WeightLog.weight, WeightLog.bmi, WeightLog.notes,
+        segment.label('segment'),
+        func.row_number().over(partition_by=segment, order_by=WeightLog.date.desc()).label('segment_rank'),
+        func.min(period_weight).over().label('min_weight'),
+        func.max(period_weight).over().label('max_weight'),
+        func.avg(period_weight).over().label('avg_weight'),
+        func.count(period_weight).over().label('period_count'),
+    ).where(WeightLog.user_id == user_id).subquery()
+    
+    wanted = ranked.c.segment_rank == 1
+    history_start = today - timedelta(days=history_days)
+    if history_days:
+        wanted = wanted | (ranked.c.date >= history_start)
+    rows = db.session.execute(db.select(ranked).where(wanted).order_by(ranked.c.date.desc())).all()
+    
+    heads = {row.segment: row for row in rows if row.segment_rank == 1}
+    latest = next((heads[key] for key in [0] + periods if key in heads), None)
+    stats = {
+        'latest_weight': latest.weight if latest else None,
+        'latest_bmi': latest.bmi if latest else None,
+        'latest_bmi_status': bmi_status_label(latest.bmi) if latest else None,
+        'latest_date': latest.date.isoformat() if latest else None,
+        'min_weight': rows[0].min_weight if rows else None,
+        'max_weight': rows[0].max_weight if rows else None,
+        'avg_weight': round(rows[0].avg_weight, 1) if rows and rows[0].avg_weight is not None else None,
+        'period_days': periods[-1],
+        'period_count': rows[0].period_count if rows else 0,
+    }
+    for days, name in WEIGHT_CHANGE_PERIODS.items():
+        # 截止日期之前没有记录的段继续往更早的段找
+        base = next((heads[key] for key in periods if key >= days and key in heads), None)
+        stats[name] = round(latest.weight - base.weight, 1) if latest and base else None
+    
+    history = [dict(serialize_weight_log(row), date_display=row.date.strftime('%m-%d'))
+               for row in rows if history_days and row.date >= history_start]
+    return {'stats': stats, 'history': history}
+
+def weight_stats_version(user_id):
+    """体重数据的版本戳：有体重的每日汇总行数和其中最近的更新时间
+    
+    体重的插入、修改（包括 ON CONFLICT 更新）和删除都会在同一事务内刷新或删除对应的汇总行，
+    所以任何一个实例写入后版本戳都会变化；按 (user_id, date) 唯一索引只读一个用户的行"""
+    from sqlalchemy import func
+    
+    return tuple(db.session.execute(
+        db.select(func.count(), func.max(UserDailySummary.updated_at))
+        .where(UserDailySummary.user_id == user_id, UserDailySummary.weight.isnot(None))
+    ).one())
+
+def get_weight_stats(user_id, history_days=0):
+    """读取体重统计缓存，未命中时查询并缓存WEIGHT_STATS_CACHE_TTL秒
+    
+    缓存按进程保存，其他实例的写入不会触发本进程的失效，所以命中前先比较版本戳，
+    不一致时重新查询；版本戳查询比统计查询便宜得多"""
+    today = date.today()
+    key = (today, history_days)
+    now_ts = time.time()
+    version = weight_stats_version(user_id)
+    with weight_stats_cache_lock:
+        entry = weight_stats_cache.get(user_id, {}).get(key)
+        if entry and entry[0] > now_ts and entry[1] == version:
+            return entry[2]
+    result = query_weight_stats(user_id, today, history_days)
+    if WEIGHT_STATS_CACHE_TTL > 0:
+        with weight_stats_cache_lock:
+            weight_stats_cache.setdefault(user_id, {})[key] = (now_ts + WEIGHT_STATS_CACHE_TTL, version, result)
+    return result
+
+def invalidate_weight_stats(user_id=None):
+    """清除体重统计缓存；不传参数时清空全部"""
+    with weight_stats_cache_lock:
+        if user_id is None:
+            weight_stats_cache.clear()
+        else:
+            weight_stats_cache.pop(user_id, None)
+
+def mark_weight_stats_users(user_ids, session=None):
+    """登记体重有变化的用户，提交后清除其统计缓存；用于绕过ORM单元的写入"""
+    session = session or db.session
+    session.info.setdefault('weight_stats_users', set()).update(user_ids)
+
+@event.listens_for(Session, 'before_flush')
+def _track_weight_changes(session, flush_context, instances):
+    mark_weight_stats_users((obj.user_id for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+                             if isinstance(obj, WeightLog)), session)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_weight_stats_after_commit(session):
+    for user_id in session.info.pop('weight_stats_users', ()):
+        invalidate_weight_stats(user_id)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_weight_changes(session):
+    session.info.pop('weight_stats_users', None)
+
 @app.route('/api/weight-log', methods=['GET', 'POST'])
 @login_required
 def weight_log_api():
@@ -3026,15 +5205,9 @@ def weight_log_api():
             date_str = data.get('date')
             notes = data.get('notes', '')
             
-            if not weight:
-                return jsonify({'success': False, 'error': '体重不能为空'}), 400
-            
-            try:
-                weight = float(weight)
-                if weight <= 0 or weight > 500:
-                    return jsonify({'success': False, 'error': '体重数据异常'}), 400
-            except ValueError:
-                return jsonify({'success': False, 'error': '体重格式错误'}), 400
+            weight, error = parse_weight_value(weight)
+            if error:
+                return jsonify({'success': False, 'error': error}), 400
             
             # 解析日期
             from datetime import date, datetime as dt
@@ -3046,61 +5219,16 @@ def weight_log_api():
             else:
                 record_date = date.today()
             
-            # 计算BMI
-            bmi = None
-            if hasattr(current_user, 'profile') and current_user.profile and current_user.profile.height:
-                height_m = current_user.profile.height / 100  # 转换为米
-                bmi = round(weight / (height_m ** 2), 1)
-            
-            # 检查是否已存在当天记录
-            existing_record = WeightLog.query.filter_by(
-                user_id=current_user.id,
-                date=record_date
-            ).first()
+            # 一条 INSERT ... ON CONFLICT 保存，多设备同时提交同一天也不会冲突
+            record = upsert_weight_log(current_user.id, record_date, weight,
+                                       bmi=calculate_bmi(current_user, weight), notes=notes)
+            db.session.commit()
             
-            if existing_record:
-                # 更新现有记录
-                existing_record.weight = weight
-                existing_record.bmi = bmi
-                existing_record.notes = notes
-                db.session.commit()
-                
-                return jsonify({
-                    'success': True,
-                    'message': '体重记录已更新',
-                    'data': {
-                        'id': existing_record.id,
-                        'date': existing_record.date.isoformat(),
-                        'weight': existing_record.weight,
-                        'bmi': existing_record.bmi,
-                        'bmi_status': existing_record.bmi_status,
-                        'notes': existing_record.notes
-                    }
-                })
-            else:
-                # 创建新记录
-                new_record = WeightLog(
-                    user_id=current_user.id,
-                    date=record_date,
-                    weight=weight,
-                    bmi=bmi,
-                    notes=notes
-                )
-                db.session.add(new_record)
-                db.session.commit()
-                
-                return jsonify({
-                    'success': True,
-                    'message': '体重记录已保存',
-                    'data': {
-                        'id': new_record.id,
-                        'date': new_record.date.isoformat(),
-                        'weight': new_record.weight,
-                        'bmi': new_record.bmi,
-                        'bmi_status': new_record.bmi_status,
-                        'notes': new_record.notes
-                    }
-                })
+            return jsonify({
+                'success': True,
+                'message': '体重记录已保存' if record.inserted else '体重记录已更新',
+                'data': serialize_weight_log(record)
+            })
             
         except Exception as e:
             db.session.rollback()
@@ -3120,17 +5248,8 @@ def weight_log_api():
                 WeightLog.date >= start_date
             ).order_by(WeightLog.date.desc()).all()
             
-            records = []
-            for record in weight_logs:
-                records.append({
-                    'id': record.id,
-                    'date': record.date.isoformat(),
-                    'weight': record.weight,
-                    'bmi': record.bmi,
-                    'bmi_status': record.bmi_status,
-                    'notes': record.notes,
-                    'date_display': record.date_display
-                })
+            records = [dict(serialize_weight_log(record), date_display=record.date_display)
+                       for record in weight_logs]
             
             return jsonify({
                 'success': True,
@@ -3142,69 +5261,103 @@ def weight_log_api():
             logger.error(f"获取体重记录失败: {e}")
             return jsonify({'success': False, 'error': '获取数据失败'}), 500
 
+@app.route('/api/weight-log/bulk', methods=['POST'])
+@login_required
+def weight_log_bulk_api():
+    """批量保存多天体重（设备同步等），一条 INSERT ... ON CONFLICT 写入"""
+    data = request.get_json() or {}
+    items = data.get('records')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': '缺少体重记录'}), 400
+    if len(items) > WEIGHT_BULK_MAX_RECORDS:
+        return jsonify({'success': False, 'error': f'一次最多同步{WEIGHT_BULK_MAX_RECORDS}条记录'}), 400
+    
+    rows = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify({'success': False, 'error': f'第{index + 1}条记录格式错误'}), 400
+        weight, error = parse_weight_value(item.get('weight'))
+        if error:
+            return jsonify({'success': False, 'error': f'第{index + 1}条记录{error}'}), 400
+        try:
+            record_date = datetime.strptime(str(item.get('date')), '%Y-%m-%d').date()
+        except ValueError:
+            return jsonify({'success': False, 'error': f'第{index + 1}条记录日期格式错误'}), 400
+        rows.append({'user_id': current_user.id, 'date': record_date, 'weight': weight,
+                     'bmi': calculate_bmi(current_user, weight), 'notes': item.get('notes', '')})
+    
+    try:
+        saved = upsert_weight_logs(rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"批量保存体重记录失败: {e}")
+        return jsonify({'success': False, 'error': '保存失败，请稍后重试'}), 500
+    
+    inserted = sum(1 for row in saved if row.inserted)
+    return jsonify({
+        'success': True,
+        'message': f'已同步{len(saved)}天的体重记录',
+        'inserted': inserted,
+        'updated': len(saved) - inserted,
+        'data': [serialize_weight_log(row) for row in saved]
+    })
+
 @app.route('/api/weight-stats')
 @login_required 
 def weight_stats_api():
-    """体重统计API"""
+    """体重统计API；传days时同时返回最近days天的记录，仪表盘不必再请求 /api/weight-log"""
+    history_days = max(0, min(request.args.get('days', 0, type=int) or 0, WEIGHT_HISTORY_MAX_DAYS))
     try:
-        from datetime import date, timedelta
-        
-        # 获取不同时间段的体重数据
-        today = date.today()
-        week_ago = today - timedelta(days=7)
-        month_ago = today - timedelta(days=30)
-        
-        # 最近的体重记录
-        latest_record = WeightLog.query.filter_by(user_id=current_user.id).order_by(WeightLog.date.desc()).first()
-        
-        # 一周前的体重记录
-        week_record = WeightLog.query.filter(
-            WeightLog.user_id == current_user.id,
-            WeightLog.date <= week_ago
-        ).order_by(WeightLog.date.desc()).first()
-        
-        # 一月前的体重记录  
-        month_record = WeightLog.query.filter(
-            WeightLog.user_id == current_user.id,
-            WeightLog.date <= month_ago
-        ).order_by(WeightLog.date.desc()).first()
-        
-        # 计算变化
-        week_change = None
-        month_change = None
-        
-        if latest_record:
-            if week_record:
-                week_change = round(latest_record.weight - week_record.weight, 1)
-            if month_record:
-                month_change = round(latest_record.weight - month_record.weight, 1)
-        
-        # 获取目标体重 (从用户的健身目标中)
-        target_weight = None
-        distance_to_goal = None
-        active_goal = FitnessGoal.query.filter_by(user_id=current_user.id, is_active=True).first()
-        if active_goal and active_goal.target_weight and latest_record:
-            target_weight = active_goal.target_weight
-            distance_to_goal = round(latest_record.weight - target_weight, 1)
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'latest_weight': latest_record.weight if latest_record else None,
-                'latest_bmi': latest_record.bmi if latest_record else None,
-                'latest_bmi_status': latest_record.bmi_status if latest_record else None,
-                'week_change': week_change,
-                'month_change': month_change,
-                'target_weight': target_weight,
-                'distance_to_goal': distance_to_goal,
-                'latest_date': latest_record.date.isoformat() if latest_record else None
-            }
-        })
+        result = get_weight_stats(current_user.id, history_days)
+        stats = dict(result['stats'])
+        
+        # 目标体重来自登录时已预加载的活跃目标，不需要额外查询
+        stats['target_weight'] = None
+        stats['distance_to_goal'] = None
+        active_goal = current_user.active_goal
+        if active_goal and active_goal.target_weight and stats['latest_weight'] is not None:
+            stats['target_weight'] = active_goal.target_weight
+            stats['distance_to_goal'] = round(stats['latest_weight'] - active_goal.target_weight, 1)
+        
+        response = {'success': True, 'data': stats}
+        if history_days:
+            response['history'] = result['history']
+        return jsonify(response)
         
     except Exception as e:
         logger.error(f"获取体重统计失败: {e}")
         return jsonify({'success': False, 'error': '获取统计数据失败'}), 500
 
+@app.route('/api/chart-data')
+@login_required
+def chart_data_api():
+    """列式图表数据API：dates[] 与各指标数组一一对应，点数超过points时服务端降采样"""
+    days = max(1, min(request.args.get('days', 30, type=int) or 30, CHART_MAX_DAYS))
+    points = max(3, min(request.args.get('points', CHART_DEFAULT_POINTS, type=int) or CHART_DEFAULT_POINTS,
+                        CHART_MAX_POINTS))
+    method = request.args.get('method', 'bucket')
+    if method not in ('bucket', 'lttb'):
+        return jsonify({'success': False, 'error': '不支持的降采样方式'}), 400
+
+    requested = request.args.get('series')
+    if requested:
+        series = tuple(name.strip() for name in requested.split(',') if name.strip())
+        unknown = [name for name in series if name not in CHART_SERIES]
+        if not series or unknown:
+            return jsonify({'success': False, 'error': f"不支持的数据列: {', '.join(unknown)}"}), 400
+    else:
+        series = ('calories_in', 'calories_out', 'weight')
+
+    try:
+        end_date = date.today()
+        start_date = end_date - timedelta(days=days - 1)
+        result = build_chart_data(current_user.id, start_date, end_date, points, series, method)
+        return jsonify(dict(result, success=True))
+    except Exception as e:
+        logger.error(f"获取图表数据失败: {e}")
+        return jsonify({'success': False, 'error': '获取图表数据失败'}), 500
+
 # 本地开发环境初始化
 if __name__ == '__main__':
     with app.app_context():
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+记录表索引基准测试
+对比 func.date(created_at) = 某天 与半开区间 created_at >= 当天 AND created_at < 次日
+两种写法在无索引/有 (user_id, created_at) 复合索引时的执行计划和耗时。
+
+用法:
+    python benchmark_log_indexes.py                       # 本地SQLite，默认1000万行
+    python benchmark_log_indexes.py --rows 200000         # 快速验证
+    BENCHMARK_DATABASE_URL=postgresql://... python benchmark_log_indexes.py
+
+测试使用独立的 meal_log_benchmark 表，不会改动应用数据。
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, date
+
+from sqlalchemy import create_engine, text
+
+TABLE = 'meal_log_benchmark'
+INDEX = 'ix_meal_log_benchmark_user_created_at'
+USERS = 10000
+DAYS = 365
+BATCH_SIZE = 50000
+
+NON_SARGABLE_SQL = f"""
+    SELECT id, calories FROM {TABLE}
+    WHERE user_id = :user_id AND date(created_at) = :day
+"""
+HALF_OPEN_SQL = f"""
+    SELECT id, calories FROM {TABLE}
+    WHERE user_id = :user_id AND created_at >= :day_start AND created_at < :day_end
+"""
+
+def create_table(conn, is_postgres):
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    id_type = 'BIGSERIAL PRIMARY KEY' if is_postgres else 'INTEGER PRIMARY KEY'
+    conn.execute(text(f"""
+        CREATE TABLE {TABLE} (
+            id {id_type},
+            user_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            meal_type VARCHAR(20) NOT NULL,
+            calories INTEGER,
+            created_at TIMESTAMP
+        )
+    """))
+
+def seed_rows(conn, is_postgres, rows):
+    """写入测试数据：USERS个用户、DAYS天内随机分布"""
+    start = datetime(2025, 1, 1)
+    if is_postgres:
+        # Postgres直接在服务端生成，避免传输1000万行参数
+        conn.execute(text(f"""
+            INSERT INTO {TABLE} (user_id, date, meal_type, calories, created_at)
+            SELECT (random() * {USERS - 1})::int + 1,
+                   ts::date,
+                   (ARRAY['breakfast','lunch','dinner','snack'])[(random() * 3)::int + 1],
+                   (random() * 800)::int,
+                   ts
+            FROM (
+                SELECT TIMESTAMP '2025-01-01' + random() * INTERVAL '{DAYS} days' AS ts
+                FROM generate_series(1, :rows)
+            ) seeded
+        """), {'rows': rows})
+        return
+
+    meal_types = ('breakfast', 'lunch', 'dinner', 'snack')
+    inserted = 0
+    while inserted < rows:
+        batch = []
+        for _ in range(min(BATCH_SIZE, rows - inserted)):
+            created_at = start + timedelta(seconds=random.randrange(DAYS * 86400))
+            batch.append({
+                'user_id': random.randint(1, USERS),
+                'date': created_at.date(),
+                'meal_type': random.choice(meal_types),
+                'calories': random.randint(0, 800),
+                'created_at': created_at
+            })
+        conn.execute(text(f"""
+            INSERT INTO {TABLE} (user_id, date, meal_type, calories, created_at)
+            VALUES (:user_id, :date, :meal_type, :calories, :created_at)
+        """), batch)
+        inserted += len(batch)
+        print(f"  已写入 {inserted}/{rows}", end='\r')
+    print()
+
+def explain(conn, is_postgres, sql, params):
+    """返回执行计划文本"""
+    if is_postgres:
+        rows = conn.execute(text('EXPLAIN (ANALYZE, BUFFERS) ' + sql), params).fetchall()
+        return '\n'.join(row[0] for row in rows)
+    rows = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+    return '\n'.join(str(row[-1]) for row in rows)
+
+def time_query(conn, sql, params, repeats):
+    """平均耗时（毫秒）"""
+    started = time.perf_counter()
+    for _ in range(repeats):
+        conn.execute(text(sql), params).fetchall()
+    return (time.perf_counter() - started) * 1000 / repeats
+
+def run_queries(conn, is_postgres, label, repeats):
+    day = date(2025, 6, 15)
+    params_date = {'user_id': 42, 'day': day if is_postgres else day.isoformat()}
+    params_range = {
+        'user_id': 42,
+        'day_start': datetime.combine(day, datetime.min.time()),
+        'day_end': datetime.combine(day + timedelta(days=1), datetime.min.time())
+    }
+    print(f"\n📋 {label}")
+    for name, sql, params in (('func.date(created_at) = 当天', NON_SARGABLE_SQL, params_date),
+                              ('半开区间 created_at >= ... < ...', HALF_OPEN_SQL, params_range)):
+        plan = explain(conn, is_postgres, sql, params)
+        elapsed = time_query(conn, sql, params, repeats)
+        print(f"\n  ▶ {name}: 平均 {elapsed:.2f} ms")
+        for line in plan.splitlines():
+            print(f"      {line}")
+
+def main():
+    parser = argparse.ArgumentParser(description='记录表索引基准测试')
+    parser.add_argument('--rows', type=int, default=10_000_000, help='测试数据行数（默认1000万）')
+    parser.add_argument('--repeats', type=int, default=5, help='每条查询重复次数')
+    parser.add_argument('--keep', action='store_true', help='结束后保留测试表')
+    args = parser.parse_args()
+
+    database_url = os.getenv('BENCHMARK_DATABASE_URL')
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'fitlife_index_benchmark.db')
+    if database_url.startswith('postgres://'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+    engine = create_engine(database_url)
+    is_postgres = engine.dialect.name == 'postgresql'
+
+    print(f"🚀 索引基准测试: {engine.dialect.name}, {args.rows} 行")
+    with engine.begin() as conn:
+        create_table(conn, is_postgres)
+        started = time.perf_counter()
+        seed_rows(conn, is_postgres, args.rows)
+        print(f"✅ 数据写入完成，用时 {time.perf_counter() - started:.1f}s")
+        conn.execute(text(f"ANALYZE {TABLE}"))
+
+    with engine.connect() as conn:
+        run_queries(conn, is_postgres, '无索引（全表扫描）', args.repeats)
+
+    with engine.begin() as conn:
+        started = time.perf_counter()
+        conn.execute(text(f"CREATE INDEX {INDEX} ON {TABLE} (user_id, created_at)"))
+        conn.execute(text(f"ANALYZE {TABLE}"))
+        print(f"\n✅ 创建 (user_id, created_at) 索引，用时 {time.perf_counter() - started:.1f}s")
+
+    with engine.connect() as conn:
+        run_queries(conn, is_postgres, '有 (user_id, created_at) 复合索引', args.repeats)
+
+    if not args.keep:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    print("\n🎉 基准测试完成：func.date() 包裹列后只能利用 user_id 前缀再逐行过滤，半开区间可直接做索引范围扫描")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,432 @@
+"""
+本地食物成分表
+常见食物每100g可食部的营养成分（参考《中国食物成分表》，数值取整近似），
+以及支持别名/模糊中文名称的查询索引。
+"""
+
+from functools import lru_cache
+
+# 营养字段顺序与 basic_nutrition 一致
+NUTRIENT_FIELDS = ('total_calories', 'protein', 'carbohydrates', 'fat', 'fiber',
+                   'sugar', 'sodium', 'calcium', 'vitamin_c')
+
+# 名称: (分类, 每100g营养[热量kcal, 蛋白质g, 碳水g, 脂肪g, 纤维g, 糖g, 钠mg, 钙mg, 维C mg], 一份的克数, 别名)
+_FOOD_ROWS = {
+    # 主食
+    '米饭': ('staple', (116, 2.6, 25.9, 0.3, 0.3, 0.1, 2.5, 7, 0), 150, ('白米饭', '大米饭', '白饭', '饭')),
+    '馒头': ('staple', (223, 7.0, 47.0, 1.1, 1.3, 1.0, 165, 38, 0), 100, ('白馒头', '花卷')),
+    '面条': ('staple', (110, 3.6, 24.0, 0.4, 0.8, 0.5, 20, 10, 0), 200, ('挂面', '汤面', '拉面', '面')),
+    '白粥': ('staple', (46, 1.1, 9.9, 0.3, 0.1, 0, 2, 7, 0), 250, ('粥', '稀饭', '大米粥', '小米粥')),
+    '面包': ('staple', (266, 8.9, 49.0, 3.3, 2.7, 5.0, 490, 49, 0), 60, ('吐司', '全麦面包', '白面包')),
+    '燕麦': ('staple', (367, 15.0, 61.6, 6.7, 5.3, 1.0, 4, 54, 0), 40, ('燕麦片', '麦片')),
+    '玉米': ('staple', (112, 4.0, 22.8, 1.2, 2.9, 3.2, 1, 2, 16), 200, ('甜玉米', '玉米棒')),
+    '红薯': ('staple', (86, 1.6, 20.1, 0.1, 3.0, 4.2, 55, 30, 2), 200, ('地瓜', '番薯', '烤红薯')),
+    '土豆': ('staple', (77, 2.0, 17.5, 0.1, 2.2, 0.8, 6, 12, 20), 150, ('马铃薯', '洋芋')),
+    '饺子': ('staple', (242, 9.0, 28.0, 10.4, 1.2, 1.5, 430, 30, 2), 25, ('水饺', '猪肉饺子', '蒸饺')),
+    '包子': ('staple', (227, 8.0, 32.0, 7.5, 1.3, 2.0, 420, 30, 0), 80, ('肉包', '肉包子', '菜包', '菜包子')),
+    '油条': ('staple', (388, 6.9, 51.0, 17.6, 0.9, 0.5, 585, 6, 0), 60, ()),
+    '方便面': ('staple', (473, 9.5, 61.6, 21.1, 0.7, 2.0, 1144, 25, 0), 100, ('泡面', '速食面')),
+    # 蛋奶豆
+    '鸡蛋': ('egg_dairy', (144, 13.3, 2.8, 8.8, 0, 0.4, 131, 56, 0), 50,
+           ('蛋', '荷包蛋', '煮鸡蛋', '水煮蛋', '煎蛋', '煎鸡蛋', '炒鸡蛋', '鸡蛋羹', '茶叶蛋')),
+    '牛奶': ('egg_dairy', (54, 3.0, 3.4, 3.2, 0, 4.8, 37, 104, 1), 250, ('纯牛奶', '鲜奶', '鲜牛奶', '全脂牛奶')),
+    '酸奶': ('egg_dairy', (72, 2.5, 9.3, 2.7, 0, 9.0, 39, 118, 1), 200, ('酸牛奶', '原味酸奶')),
+    '豆浆': ('egg_dairy', (31, 3.0, 1.2, 1.6, 1.1, 0.5, 3, 10, 0), 250, ('豆奶',)),
+    '豆腐': ('egg_dairy', (81, 8.1, 4.2, 3.7, 0.4, 0.6, 7, 164, 0), 100, ('嫩豆腐', '老豆腐', '北豆腐')),
+    # 肉禽鱼虾
+    '鸡胸肉': ('meat', (133, 24.6, 0.6, 1.9, 0, 0, 63, 3, 0), 120, ('鸡胸', '鸡脯肉')),
+    '鸡腿': ('meat', (181, 16.0, 0, 13.0, 0, 0, 64, 6, 0), 100, ('鸡腿肉', '大鸡腿')),
+    '猪肉': ('meat', (143, 20.3, 1.5, 6.2, 0, 0, 57, 6, 0), 100, ('瘦肉', '猪瘦肉', '里脊', '猪里脊')),
+    '牛肉': ('meat', (106, 20.2, 1.2, 2.3, 0, 0, 53, 9, 0), 100, ('瘦牛肉', '牛排', '牛腱')),
+    '鱼肉': ('meat', (113, 16.6, 0, 5.2, 0, 0, 46, 38, 0), 150, ('鱼', '草鱼', '鲈鱼', '鲫鱼')),
+    '三文鱼': ('meat', (139, 17.2, 0, 7.8, 0, 0, 63, 13, 0), 100, ('鲑鱼',)),
+    '虾': ('meat', (93, 18.6, 2.8, 0.8, 0, 0, 165, 62, 0), 100, ('虾仁', '大虾', '基围虾', '白灼虾')),
+    # 水果
+    '苹果': ('fruit', (53, 0.4, 13.7, 0.2, 1.7, 10.4, 1, 4, 3), 200, ('红富士',)),
+    '香蕉': ('fruit', (93, 1.4, 22.0, 0.2, 1.2, 12.0, 1, 7, 8), 120, ()),
+    '橙子': ('fruit', (48, 0.8, 11.1, 0.2, 0.6, 9.0, 1, 20, 33), 200, ('橙', '甜橙', '橘子', '桔子')),
+    '西瓜': ('fruit', (31, 0.5, 6.8, 0.3, 0.2, 6.2, 3, 7, 6), 300, ()),
+    '葡萄': ('fruit', (44, 0.5, 10.3, 0.2, 0.4, 9.0, 1, 5, 4), 150, ('提子',)),
+    # 蔬菜
+    '西红柿': ('vegetable', (20, 0.9, 4.0, 0.2, 0.5, 2.6, 5, 10, 19), 150, ('番茄',)),
+    '黄瓜': ('vegetable', (16, 0.8, 2.9, 0.2, 0.5, 1.6, 5, 24, 9), 150, ('青瓜',)),
+    '西兰花': ('vegetable', (36, 4.1, 4.3, 0.6, 1.6, 1.5, 19, 67, 51), 150, ('西蓝花', '花椰菜', '绿花菜')),
+    '菠菜': ('vegetable', (28, 2.6, 4.5, 0.3, 1.7, 0.4, 85, 66, 32), 150, ()),
+    '青菜': ('vegetable', (17, 1.5, 2.7, 0.3, 1.1, 1.5, 73, 90, 28), 150, ('小白菜', '白菜', '上海青', '油菜', '青菜叶')),
+    '胡萝卜': ('vegetable', (39, 1.0, 8.8, 0.2, 1.1, 4.7, 71, 32, 13), 100, ('红萝卜',)),
+    '生菜': ('vegetable', (15, 1.3, 2.0, 0.3, 0.7, 0.8, 33, 34, 13), 100, ('球生菜',)),
+    # 坚果零食饮料
+    '花生': ('snack', (581, 21.7, 23.8, 48.0, 6.3, 4.0, 34, 47, 0), 30, ('花生米',)),
+    '核桃': ('snack', (646, 14.9, 19.1, 58.8, 9.5, 2.6, 6, 56, 1), 30, ('核桃仁',)),
+    '巧克力': ('snack', (586, 4.3, 53.4, 40.1, 1.5, 51.5, 111, 111, 0), 30, ('黑巧克力', '牛奶巧克力')),
+    '薯条': ('snack', (298, 3.4, 38.0, 15.0, 3.5, 0.3, 210, 12, 5), 120, ('炸薯条',)),
+    '炸鸡': ('meat', (279, 20.3, 10.5, 17.3, 0.4, 0.2, 755, 20, 0), 150, ('炸鸡块', '鸡块', '炸鸡腿')),
+    '可乐': ('drink', (43, 0, 10.8, 0, 0, 10.6, 4, 2, 0), 330, ('可口可乐', '百事可乐')),
+    '咖啡': ('drink', (2, 0.1, 0.3, 0, 0, 0, 2, 2, 0), 250, ('黑咖啡', '美式咖啡', '美式')),
+    '啤酒': ('drink', (32, 0.4, 3.0, 0, 0, 0, 11, 13, 0), 330, ()),
+}
+
+FOOD_COMPOSITION = {
+    name: {
+        'name': name,
+        'category': category,
+        'per_100g': dict(zip(NUTRIENT_FIELDS, values)),
+        'portion_g': portion_g,
+        'aliases': aliases
+    }
+    for name, (category, values, portion_g, aliases) in _FOOD_ROWS.items()
+}
+
+# 名称/别名 -> 标准名称
+_ALIAS_INDEX = {}
+for _name, _food in FOOD_COMPOSITION.items():
+    _ALIAS_INDEX[_name] = _name
+    for _alias in _food['aliases']:
+        _ALIAS_INDEX.setdefault(_alias, _name)
+
+# 按长度降序的别名列表，用于后缀匹配（"清炒西兰花" -> "西兰花"）
+_ALIASES_BY_LENGTH = sorted(_ALIAS_INDEX, key=len, reverse=True)
+
+FUZZY_MATCH_THRESHOLD = 0.65
+
+def _grams(text):
+    """字符unigram+bigram集合，中文名称通常很短，trigram区分度不够"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+# n-gram倒排索引: gram -> {别名}
+_GRAM_INDEX = {}
+_ALIAS_GRAMS = {}
+for _alias in _ALIAS_INDEX:
+    _ALIAS_GRAMS[_alias] = _grams(_alias)
+    for _gram in _ALIAS_GRAMS[_alias]:
+        _GRAM_INDEX.setdefault(_gram, set()).add(_alias)
+
+def normalize_food_name(name):
+    """去除空白和常见修饰词"""
+    name = ''.join(str(name or '').split()).lower()
+    for prefix in ('一份', '一些', '少量', '适量'):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    return name
+
+@lru_cache(maxsize=2048)
+def _contains_known_food(text):
+    return any(alias in text for alias in _ALIASES_BY_LENGTH if len(alias) >= 2 and len(alias) <= len(text))
+
+def lookup_food(name, allow_compound=False):
+    """查找食物，返回 (食物记录, 匹配方式) 或 None
+
+    匹配顺序：精确名称/别名 -> 以别名结尾（烹饪方式+食物） -> n-gram模糊匹配。
+    中文复合词的中心语在末尾，后缀和模糊匹配都要求末字一致，
+    避免"牛肉面"被识别成"牛肉"、"鸡蛋炒饭"被识别成"鸡蛋"。
+    后缀前面剩下的部分本身含有已知食物时（"西红柿炒鸡蛋"、"米饭鸡腿"）名称里有多种食物，
+    只按最后一种计算会漏算，默认视为未识别；allow_compound=True 时返回 'compound' 匹配供打分。
+    """
+    name = normalize_food_name(name)
+    if not name:
+        return None
+
+    canonical = _ALIAS_INDEX.get(name)
+    if canonical:
+        return FOOD_COMPOSITION[canonical], 'exact'
+
+    for alias in _ALIASES_BY_LENGTH:
+        if len(alias) >= 2 and len(alias) < len(name) and name.endswith(alias):
+            if not _contains_known_food(name[:-len(alias)]):
+                return FOOD_COMPOSITION[_ALIAS_INDEX[alias]], 'suffix'
+            if allow_compound:
+                return FOOD_COMPOSITION[_ALIAS_INDEX[alias]], 'compound'
+            return None
+
+    name_grams = _grams(name)
+    candidates = set()
+    for gram in name_grams:
+        candidates |= _GRAM_INDEX.get(gram, set())
+
+    best_alias, best_score = None, 0.0
+    for alias in candidates:
+        if alias[-1] != name[-1]:
+            continue
+        alias_grams = _ALIAS_GRAMS[alias]
+        score = 2 * len(name_grams & alias_grams) / (len(name_grams) + len(alias_grams))
+        if score > best_score:
+            best_alias, best_score = alias, score
+
+    if best_alias and best_score >= FUZZY_MATCH_THRESHOLD:
+        return FOOD_COMPOSITION[_ALIAS_INDEX[best_alias]], 'fuzzy'
+    return None
+
+def nutrition_for_grams(food, grams):
+    """按克数计算营养素"""
+    ratio = grams / 100.0
+    return {field: round(value * ratio, 1) for field, value in food['per_100g'].items()}
+
+# ---------------------------------------------------------------------------
+# 份量换算：(食物, 单位) -> 克数
+# ---------------------------------------------------------------------------
+
+# 单位 -> 规范单位
+UNIT_ALIASES = {
+    '碗': '碗', '个': '个', '只': '个', '颗': '个', '枚': '个', '片': '片', '块': '块',
+    '杯': '杯', '盒': '盒', '瓶': '瓶', '罐': '罐', '听': '罐', '袋': '袋', '包': '包',
+    '桶': '桶', '根': '根', '条': '根', '盘': '盘', '份': '份', '勺': '勺', '把': '把',
+    '串': '串', '张': '张',
+    'g': 'g', '克': 'g', 'kg': 'kg', '千克': 'kg', '公斤': 'kg', '斤': '斤', '两': '两',
+    'ml': 'ml', '毫升': 'ml', 'l': 'l', '升': 'l',
+}
+
+# 质量/体积单位的克数（液体按1g/ml近似）
+UNIT_GRAMS = {'g': 1, 'kg': 1000, '斤': 500, '两': 50, 'ml': 1, 'l': 1000}
+
+# 各分类常用单位的默认克数；mixed 用于成分表之外的菜肴
+CATEGORY_PORTIONS = {
+    'staple': {'碗': 150, '盘': 250, '个': 100, '片': 35, '块': 100, '根': 200, '包': 100, '盒': 200, '勺': 15},
+    'egg_dairy': {'个': 50, '杯': 250, '盒': 250, '瓶': 250, '袋': 200, '碗': 250, '块': 100, '片': 20, '勺': 15},
+    'meat': {'块': 50, '片': 30, '盘': 200, '碗': 150, '个': 100, '根': 80, '串': 40},
+    'fruit': {'个': 200, '根': 120, '片': 30, '块': 80, '盒': 250, '碗': 200, '杯': 250, '串': 300},
+    'vegetable': {'盘': 200, '碗': 150, '根': 150, '个': 150, '把': 100, '片': 10},
+    'snack': {'包': 50, '袋': 50, '盒': 100, '把': 30, '块': 15, '个': 20, '片': 5},
+    'drink': {'杯': 250, '瓶': 500, '罐': 330, '碗': 250},
+    'mixed': {'份': 300, '碗': 300, '盘': 300, '盒': 300, '个': 100, '块': 50, '片': 30, '杯': 250,
+              '串': 40, '勺': 15},
+}
+
+# 单品与分类默认值差异较大的份量
+_PORTION_OVERRIDES = {
+    '米饭': {'碗': 150, '勺': 30}, '面条': {'碗': 250}, '白粥': {'碗': 250}, '馒头': {'个': 100},
+    '面包': {'个': 80}, '燕麦': {'碗': 40, '勺': 10}, '玉米': {'根': 200, '个': 200},
+    '红薯': {'个': 200}, '土豆': {'个': 150}, '饺子': {'个': 25, '盘': 300, '碗': 300},
+    '包子': {'个': 80}, '油条': {'根': 60}, '方便面': {'包': 100, '桶': 120},
+    '鸡蛋': {'碗': 120}, '酸奶': {'盒': 100}, '豆浆': {'碗': 300}, '豆腐': {'盘': 200},
+    '鸡胸肉': {'块': 120}, '鸡腿': {'个': 150, '根': 150}, '虾': {'个': 15},
+    '香蕉': {'个': 120}, '葡萄': {'个': 5}, '西瓜': {'块': 250, '片': 250},
+    '花生': {'个': 1}, '核桃': {'个': 10}, '巧克力': {'块': 10, '片': 10},
+    '薯条': {'包': 120, '盒': 120}, '炸鸡': {'块': 50, '个': 50},
+    '牛奶': {'袋': 250}, '可乐': {'杯': 300}, '啤酒': {'瓶': 500},
+}
+
+# 预计算的份量表: (标准名称, 规范单位) -> 克数，"份"取成分表中的一份克数
+PORTION_TABLE = {}
+for _name, _food in FOOD_COMPOSITION.items():
+    PORTION_TABLE[(_name, '份')] = _food['portion_g']
+    for _unit, _grams_per_unit in CATEGORY_PORTIONS[_food['category']].items():
+        PORTION_TABLE[(_name, _unit)] = _grams_per_unit
+    for _unit, _grams_per_unit in _PORTION_OVERRIDES.get(_name, {}).items():
+        PORTION_TABLE[(_name, _unit)] = _grams_per_unit
+
+# 成分表之外食物的能量密度（家常菜平均值，kcal/100g）
+DEFAULT_KCAL_PER_100G = 150
+
+def normalize_unit(unit):
+    """单位规范化（"只"/"颗" -> "个"，"克" -> "g"）"""
+    unit = (unit or '').strip().lower()
+    return UNIT_ALIASES.get(unit, unit)
+
+def resolve_portion_grams(food, unit):
+    """一个单位的克数；food 为 None 时按成分表之外的菜肴估算"""
+    unit = normalize_unit(unit)
+    if unit in UNIT_GRAMS:
+        return UNIT_GRAMS[unit]
+    if food is None:
+        return CATEGORY_PORTIONS['mixed'].get(unit, CATEGORY_PORTIONS['mixed']['份'])
+    return PORTION_TABLE.get((food['name'], unit), food['portion_g'])
+
+def estimate_grams(food, amount, unit):
+    """按数量和单位估算食物克数"""
+    try:
+        amount = float(amount or 1)
+    except (TypeError, ValueError):
+        amount = 1.0
+    return amount * resolve_portion_grams(food, unit)
+
+def estimate_food_calories(name, amount, unit):
+    """估算一项食物的热量：成分表中的食物按实际营养计算，其余按份量和平均能量密度估算"""
+    match = lookup_food(name)
+    food = match[0] if match else None
+    grams = estimate_grams(food, amount, unit)
+    if food:
+        return grams * food['per_100g']['total_calories'] / 100
+    return grams * DEFAULT_KCAL_PER_100G / 100
+
+# ---------------------------------------------------------------------------
+# 自然语言食物描述的本地规则解析
+# ---------------------------------------------------------------------------
+
+# 食物之间的分隔符/连接词
+_SEPARATORS = ('，', ',', '、', '。', '.', ';', '；', '！', '!', ' ', '\n', '+', '&',
+               '和', '加', '配', '跟', '与', '及', '以及', '还有', '外加', '另外', '再')
+
+# 不影响解析的修饰词
+_FILLERS = ('早餐', '午餐', '晚餐', '夜宵', '宵夜', '加餐', '早饭', '午饭', '晚饭', '早上',
+            '中午', '晚上', '下午', '下午茶', '时间', '今天', '我', '吃了', '喝了', '吃', '喝',
+            '有', '了', '的', '一点', '一共', '大概', '左右', '约')
+
+_LEXICON = {}
+for _word in _FILLERS:
+    _LEXICON[_word] = 'skip'
+for _word in _SEPARATORS:
+    _LEXICON[_word] = 'sep'
+for _word in UNIT_ALIASES:
+    _LEXICON[_word] = 'unit'
+for _word in _ALIAS_INDEX:
+    _LEXICON[_word] = 'food'
+_MAX_WORD_LENGTH = max(len(word) for word in _LEXICON)
+
+_CN_DIGITS = {'零': 0, '〇': 0, '一': 1, '二': 2, '两': 2, '三': 3, '四': 4,
+              '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+_CN_MULTIPLIERS = {'十': 10, '百': 100, '千': 1000}
+_CN_NUMERAL_CHARS = set(_CN_DIGITS) | set(_CN_MULTIPLIERS) | {'半'}
+
+# 匹配方式对应的置信度
+_MATCH_CONFIDENCE = {'exact': 1.0, 'suffix': 0.9, 'fuzzy': 0.75, 'compound': 0.5}
+
+def parse_chinese_number(text):
+    """中文数字转数值（"两"->2，"十二"->12，"半"->0.5），无法确定时返回None（如"两三"）"""
+    if text == '半':
+        return 0.5
+    total, current, has_digit = 0, 0, False
+    for char in text:
+        if char in _CN_DIGITS:
+            if has_digit:
+                return None
+            current, has_digit = _CN_DIGITS[char], True
+        elif char in _CN_MULTIPLIERS:
+            total += (current or 1) * _CN_MULTIPLIERS[char]
+            current, has_digit = 0, False
+        else:
+            return None
+    return total + current
+
+def _scan_number(text, start):
+    """从start开始扫描阿拉伯数字或中文数字，返回 (原文, 数值)"""
+    end = start
+    if text[start].isdigit():
+        while end < len(text) and (text[end].isdigit() or text[end] == '.'):
+            end += 1
+        raw = text[start:end].rstrip('.')
+        return raw, float(raw)
+    # "两"只在开头作数字，其余位置按单位处理（"一两米饭"）
+    while end < len(text) and text[end] in _CN_NUMERAL_CHARS and (end == start or text[end] != '两'):
+        end += 1
+    raw = text[start:end]
+    return raw, parse_chinese_number(raw)
+
+def tokenize_food_description(text):
+    """基于词典的正向最大匹配分词，返回 [(类型, 原文, 数值)]
+
+    类型: num/unit/food/sep/skip/other。数字与词典词冲突时取更长者
+    （"三文鱼"是食物），"两"紧跟在数字后时视为单位（"一两米饭"）。
+    """
+    text = str(text or '').lower()
+    tokens = []
+    i = 0
+    while i < len(text):
+        word, kind = '', 'other'
+        for length in range(min(_MAX_WORD_LENGTH, len(text) - i), 0, -1):
+            candidate = text[i:i + length]
+            if candidate in _LEXICON:
+                word, kind = candidate, _LEXICON[candidate]
+                break
+
+        number_text = ''
+        if text[i].isdigit() or text[i] in _CN_NUMERAL_CHARS:
+            number_text, number = _scan_number(text, i)
+        after_number = bool(tokens) and tokens[-1][0] == 'num'
+        if number_text and (len(number_text) > len(word) or
+                            (len(number_text) == len(word) and not after_number)):
+            tokens.append(('num', number_text, number))
+            i += len(number_text)
+        elif word:
+            value = UNIT_ALIASES[word] if kind == 'unit' else None
+            tokens.append((kind, word, value))
+            i += len(word)
+        else:
+            tokens.append(('other', text[i], None))
+            i += 1
+    return tokens
+
+def _new_parse_item():
+    return {'name': '', 'amount': None, 'unit': None, 'quantity_valid': True, 'postfix': False}
+
+def parse_food_description(text):
+    """本地规则解析"两碗米饭加一个荷包蛋"这类描述
+
+    返回 {'food_items': [...], 'confidence': 0~1, 'unknown_foods': [...]}。
+    置信度取各食物项中的最小值：名称匹配方式决定基础分，缺少数量或数量
+    含糊时扣分，有未识别食物或悬空数量时整体不可信，由调用方交给LLM。
+    """
+    tokens = tokenize_food_description(text)
+    items, dangling = [], False
+    current = _new_parse_item()
+
+    def close():
+        nonlocal current, dangling
+        if current['name']:
+            items.append(current)
+        elif current['amount'] is not None:
+            dangling = True
+        current = _new_parse_item()
+
+    for index, (kind, raw, value) in enumerate(tokens):
+        next_kind = tokens[index + 1][0] if index + 1 < len(tokens) else 'sep'
+        if kind in ('sep', 'skip'):
+            if current['name']:
+                close()
+        elif kind == 'num':
+            if value == 0.5 and current['unit'] and not current['name'] and current['amount']:
+                current['amount'] += 0.5  # "一个半"
+                continue
+            if current['name'] and current['amount'] is None and next_kind == 'unit':
+                current['postfix'] = True  # "米饭两碗"
+            elif current['name'] or current['amount'] is not None:
+                close()
+            current['amount'] = value
+            current['quantity_valid'] = value is not None
+        elif kind == 'unit':
+            if current['unit'] and current['name']:
+                current['name'] += raw  # 名称中的单位字（"小笼包"）
+                continue
+            current['unit'] = value
+            if current['amount'] is None:
+                current['amount'] = 1
+        else:
+            # 已是完整食物名时，紧跟的另一个食物词是新的一项（"两个鸡蛋牛奶"、"米饭鸡腿"）；
+            # 单字中心语仍并入名称（"牛肉面"）
+            if current['postfix'] or (kind == 'food' and len(raw) >= 2 and current['name'] in _ALIAS_INDEX):
+                close()
+            current['name'] += raw
+
+    close()
+
+    food_items, unknown_foods, scores = [], [], []
+    for item in items:
+        match = lookup_food(item['name'], allow_compound=True)
+        amount = item['amount'] if item['amount'] is not None else 1
+        if amount and float(amount).is_integer():
+            amount = int(amount)
+        unit = item['unit'] or '份'
+        score = _MATCH_CONFIDENCE[match[1]] if match else 0.0
+        if item['amount'] is None:
+            score -= 0.1
+        if not item['quantity_valid']:
+            amount = 1
+            score -= 0.3
+        if not match:
+            unknown_foods.append(item['name'])
+        grams = estimate_grams(match[0] if match else None, amount, unit)
+        food_items.append({
+            'name': item['name'],
+            'amount': amount,
+            'unit': unit,
+            'estimated_weight': str(int(round(grams)))
+        })
+        scores.append(max(score, 0.0))
+
+    confidence = min(scores) if scores else 0.0
+    if dangling:
+        confidence *= 0.5
+    return {
+        'food_items': food_items,
+        'confidence': round(confidence, 2),
+        'unknown_foods': unknown_foods
+    }
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+测试后台统计
+验证计数器随写入增量维护、回滚不计数，以及从每日汇总表计算DAU/WAU和记录量序列
+"""
+
+import sys
+from datetime import date, timedelta
+sys.path.append('.')
+
+from app import (app, db, User, MealLog, ExerciseLog, WeightLog, AppCounter, UserDailySummary,
+                 ensure_database_schema, get_app_counters, rebuild_app_counters,
+                 get_activity_series, get_admin_stats, invalidate_admin_stats)
+
+PREFIX = 'admin_stats_tester'
+
+def _setup():
+    db.create_all()
+    ensure_database_schema()
+    for user in User.query.filter(User.username.like(f'{PREFIX}_%')).all():
+        db.session.delete(user)
+    db.session.commit()
+    rebuild_app_counters()
+
+def test_counters_follow_orm_writes():
+    """新增/删除记录时计数器在同一事务内变化，回滚时不变"""
+    print("🧪 测试计数器增量维护")
+    with app.app_context():
+        _setup()
+        before = get_app_counters()
+
+        user = User(username=f'{PREFIX}_0', email=f'{PREFIX}_0@test.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        meals = [MealLog(user_id=user.id, date=date(2025, 6, 1), meal_type='lunch', food_name='米饭', calories=200)
+                 for _ in range(3)]
+        db.session.add_all(meals + [WeightLog(user_id=user.id, date=date(2025, 6, 1), weight=60)])
+        db.session.commit()
+
+        after = get_app_counters()
+        assert after['users'] == before['users'] + 1
+        assert after['meal_logs'] == before['meal_logs'] + 3
+        assert after['weight_logs'] == before['weight_logs'] + 1
+        assert after['exercise_logs'] == before['exercise_logs']
+
+        db.session.delete(meals[0])
+        db.session.commit()
+        assert get_app_counters()['meal_logs'] == before['meal_logs'] + 2
+
+        db.session.add(ExerciseLog(user_id=user.id, date=date(2025, 6, 1), exercise_type='cardio',
+                                   exercise_name='跑步', duration=20))
+        db.session.flush()
+        db.session.rollback()
+        assert get_app_counters()['exercise_logs'] == before['exercise_logs']
+
+        # 计数器与精确COUNT一致
+        assert get_app_counters() == rebuild_app_counters()
+
+        db.session.delete(User.query.filter_by(username=f'{PREFIX}_0').first())
+        db.session.commit()
+        assert get_app_counters() == before
+    print("✅ 计数器增量维护正确")
+
+def test_missing_counter_is_rebuilt():
+    """计数器行缺失时读取会用精确COUNT补建"""
+    print("🧪 测试计数器补建")
+    with app.app_context():
+        _setup()
+        expected = get_app_counters()
+        AppCounter.query.filter_by(name='meal_logs').delete()
+        db.session.commit()
+        assert get_app_counters() == expected
+
+        # 计数器行已存在时重建是原地更新，不会主键冲突
+        AppCounter.query.filter_by(name='users').update({'value': -1})
+        db.session.commit()
+        assert rebuild_app_counters() == expected
+        assert get_app_counters() == expected
+    print("✅ 计数器补建正确")
+
+def test_activity_series_from_daily_summary():
+    """DAU/WAU和记录量序列来自每日汇总表"""
+    print("🧪 测试活跃度序列")
+    today = date(2030, 1, 10)
+    with app.app_context():
+        _setup()
+        users = []
+        for i in range(3):
+            user = User(username=f'{PREFIX}_{i}', email=f'{PREFIX}_{i}@test.com', password_hash='x')
+            db.session.add(user)
+            users.append(user)
+        db.session.flush()
+        db.session.add_all([
+            UserDailySummary(user_id=users[0].id, date=today, meal_count=3, exercise_count=1, weight=70),
+            UserDailySummary(user_id=users[1].id, date=today, meal_count=2),
+            UserDailySummary(user_id=users[1].id, date=today - timedelta(days=3), exercise_count=2),
+            UserDailySummary(user_id=users[2].id, date=today - timedelta(days=10), meal_count=1),
+        ])
+        db.session.commit()
+
+        activity = get_activity_series(days=14, today=today)
+        assert activity['dau'] == 2
+        assert activity['wau'] == 2
+        series = activity['series']
+        assert len(series['dates']) == 14 and series['dates'][-1] == today.isoformat()
+        assert (series['meal_logs'][-1], series['exercise_logs'][-1], series['weight_logs'][-1]) == (5, 1, 1)
+        assert series['exercise_logs'][-4] == 2
+        assert series['active_users'][-11] == 1 and series['active_users'][-2] == 0
+
+        invalidate_admin_stats()
+        stats = get_admin_stats()
+        assert stats['user_count'] == get_app_counters()['users']
+        assert 'series' in stats
+
+        for user in users:
+            UserDailySummary.query.filter_by(user_id=user.id).delete()
+            db.session.delete(user)
+        db.session.commit()
+        invalidate_admin_stats()
+
+    response = app.test_client().get('/admin')
+    assert response.status_code == 200
+    assert 'activityChart' in response.get_data(as_text=True)
+    print("✅ 活跃度序列正确")
+
+if __name__ == '__main__':
+    test_counters_follow_orm_writes()
+    test_missing_counter_is_rebuilt()
+    test_activity_series_from_daily_summary()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+测试用户管理页的查询次数
+验证 /admin/users 的SQL条数不随用户数和记录数增长（无N+1）
+"""
+
+import sys
+from datetime import date
+sys.path.append('.')
+
+from sqlalchemy import event
+
+from app import (app, db, User, UserProfile, ExerciseLog, MealLog, WeightLog,
+                 get_user_activity_stats)
+
+PREFIX = 'admin_nplus1_tester'
+
+def _seed_users(count):
+    users = []
+    for i in range(count):
+        user = User(username=f'{PREFIX}_{i}', email=f'{PREFIX}_{i}@test.com', password_hash='x')
+        db.session.add(user)
+        users.append(user)
+    db.session.flush()
+    for i, user in enumerate(users):
+        db.session.add(UserProfile(user_id=user.id, height=170, weight=65, age=30, gender='male'))
+        for _ in range(i + 1):
+            db.session.add(ExerciseLog(user_id=user.id, date=date(2025, 2, 1), exercise_type='cardio',
+                                       exercise_name='跑步', duration=20))
+            db.session.add(MealLog(user_id=user.id, date=date(2025, 2, 1), meal_type='lunch',
+                                   food_name='米饭', calories=200))
+    db.session.commit()
+    return users
+
+def _cleanup():
+    users = User.query.filter(User.username.like(f'{PREFIX}_%')).all()
+    for user in users:
+        db.session.delete(user)
+    db.session.commit()
+
+def _count_queries(client, url):
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+    assert response.status_code == 200
+    return len(statements), response
+
+def test_admin_users_query_count_is_constant():
+    """用户和记录越多查询次数也不变，并正确显示记录数"""
+    print("🧪 测试用户管理页查询次数")
+    with app.app_context():
+        db.create_all()
+        _cleanup()
+        users = _seed_users(3)
+        user_ids = [user.id for user in users]
+
+    client = app.test_client()
+    client.get('/admin/users')
+    small_count, _ = _count_queries(client, '/admin/users')
+
+    with app.app_context():
+        more = User.query.filter(User.username.like(f'{PREFIX}_%')).count()
+        for i in range(more, more + 6):
+            user = User(username=f'{PREFIX}_{i}', email=f'{PREFIX}_{i}@test.com', password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(UserProfile(user_id=user.id, height=160, weight=55, age=25, gender='female'))
+            db.session.add(MealLog(user_id=user.id, date=date(2025, 2, 2), meal_type='dinner',
+                                   food_name='面条', calories=300))
+        db.session.commit()
+
+    large_count, response = _count_queries(client, '/admin/users')
+    assert large_count == small_count, (small_count, large_count)
+    assert small_count <= 4
+    assert '3次运动 | 3次饮食' in response.get_data(as_text=True)
+
+    with app.app_context():
+        stats = get_user_activity_stats(user_ids)
+        assert stats[user_ids[1]]['exercise_count'] == 2 and stats[user_ids[1]]['meal_count'] == 2
+        assert stats[user_ids[0]]['last_activity'] is not None
+        assert get_user_activity_stats([]) == {}
+        _cleanup()
+    print("✅ 用户管理页查询次数恒定")
+
+if __name__ == '__main__':
+    test_admin_users_query_count_is_constant()
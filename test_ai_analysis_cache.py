@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+测试AI分析缓存
+验证缓存key规范化、LRU淘汰以及数据库持久层
+"""
+
+import sys
+sys.path.append('.')
+
+import app as app_module
+from app import (app, db, build_meal_analysis_cache_key, get_cached_analysis,
+                 set_cached_analysis, clear_analysis_cache, call_gemini_meal_analysis)
+
+USER_INFO = {'age': 31, 'gender': 'male', 'weight': 71.5, 'height': 175, 'fitness_goal': 'maintain_weight'}
+
+def test_cache_key_normalization():
+    """相同内容不同写法应生成同一个key"""
+    print("🧪 测试缓存key规范化")
+    items_a = [{'name': '鸡蛋', 'amount': 2, 'unit': '个'}, {'name': '牛奶', 'amount': 1, 'unit': '杯'}]
+    items_b = [{'name': ' 牛奶 ', 'amount': '1', 'unit': '杯'}, {'name': '鸡蛋', 'amount': 2.0, 'unit': '个'}]
+    similar_user = dict(USER_INFO, weight=73, age=38)
+    key_a = build_meal_analysis_cache_key('breakfast', items_a, USER_INFO)
+    assert key_a == build_meal_analysis_cache_key('breakfast', items_b, similar_user)
+    assert key_a != build_meal_analysis_cache_key('lunch', items_a, USER_INFO)
+    assert key_a != build_meal_analysis_cache_key('breakfast', items_a, dict(USER_INFO, weight=90))
+    print("✅ 缓存key规范化正确")
+
+def test_lru_eviction_and_db_persistence():
+    """超出容量时淘汰最旧项，内存失效后仍可从数据库命中"""
+    print("🧪 测试LRU淘汰和数据库持久层")
+    with app.app_context():
+        db.create_all()
+        clear_analysis_cache()
+        original_max = app_module.AI_CACHE_MAX_SIZE
+        app_module.AI_CACHE_MAX_SIZE = 2
+        try:
+            evictions = app_module.ai_cache_stats['evictions']
+            for i in range(3):
+                set_cached_analysis(f'test-key-{i}', {'basic_nutrition': {'total_calories': 100 + i}})
+            assert len(app_module.ai_analysis_cache) == 2
+            assert 'test-key-0' not in app_module.ai_analysis_cache
+            assert app_module.ai_cache_stats['evictions'] == evictions + 1
+
+            db_hits = app_module.ai_cache_stats['db_hits']
+            result = get_cached_analysis('test-key-0')
+            assert result['basic_nutrition']['total_calories'] == 100
+            assert app_module.ai_cache_stats['db_hits'] == db_hits + 1
+            assert get_cached_analysis('missing-key') is None
+        finally:
+            app_module.AI_CACHE_MAX_SIZE = original_max
+            clear_analysis_cache()
+    print("✅ LRU淘汰和持久层正常")
+
+def test_meal_analysis_uses_cache():
+    """命中缓存时不调用Gemini"""
+    print("🧪 测试饮食分析读取缓存")
+    items = [{'name': '麻辣香锅', 'amount': 1, 'unit': '份'}]
+    with app.app_context():
+        db.create_all()
+        clear_analysis_cache()
+        key = build_meal_analysis_cache_key('lunch', items, USER_INFO)
+        set_cached_analysis(key, {'basic_nutrition': {'total_calories': 232}, 'motivation_message': ''})
+        result = call_gemini_meal_analysis('lunch', items, USER_INFO)
+        assert result['basic_nutrition']['total_calories'] == 232
+        assert result['motivation_message']
+        clear_analysis_cache()
+    print("✅ 饮食分析缓存命中")
+
+if __name__ == '__main__':
+    test_cache_key_normalization()
+    test_lru_eviction_and_db_persistence()
+    test_meal_analysis_uses_cache()
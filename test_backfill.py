@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+测试分批回填
+验证试运行计数、按主键分批并从检查点继续、重新扫描，以及后台回填页面和接口
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append('.')
+
+from sqlalchemy import create_engine, text
+
+from app import (app, db, BACKFILLS, run_migrations, run_backfill, count_backfill_rows,
+                 get_backfill_progress)
+
+GOOD_ANALYSIS = '{"meal_analysis": {"meal_score": 8, "summary": "均衡"}}'
+
+def _seed(engine):
+    """7条饮食记录中4条分析结果损坏，5条运动记录中3条缺少分析状态"""
+    analysis_values = ['"{"', GOOD_ANALYSIS, '{}', None, 'null', GOOD_ANALYSIS, '"}"']
+    with engine.begin() as conn:
+        for value in analysis_values:
+            conn.execute(text("""
+                INSERT INTO meal_log (user_id, date, meal_type, food_name, calories, analysis_result)
+                VALUES (1, '2025-03-01', 'lunch', '米饭', 200, :value)
+            """), {'value': value})
+        for status in (None, 'pending', None, 'completed', None):
+            conn.execute(text("""
+                INSERT INTO exercise_log (user_id, date, exercise_type, exercise_name, duration, analysis_status)
+                VALUES (1, '2025-03-01', 'cardio', '跑步', 30, :status)
+            """), {'status': status})
+
+def _progress(engine, name):
+    return next(progress for progress in get_backfill_progress(engine) if progress['name'] == name)
+
+def test_backfill_runs_in_resumable_batches():
+    """分批执行，中途停止后从检查点继续，结果与整表UPDATE一致"""
+    print("🧪 测试分批回填")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'backfill.db')}")
+        with app.app_context():
+            run_migrations(engine)
+            _seed(engine)
+            assert _progress(engine, 'meal_log_damaged_analysis')['status'] == 'pending'
+
+            name = 'meal_log_damaged_analysis'
+            assert count_backfill_rows(name, engine) == 4
+
+            progress = run_backfill(name, engine, batch_size=3, sleep_ms=0, max_batches=1)
+            assert progress['status'] == 'running'
+            assert (progress['last_id'], progress['max_id'], progress['scanned']) == (3, 7, 3)
+            assert progress['updated'] == 2 and 0 < progress['percent'] < 100
+            assert count_backfill_rows(name, engine) == 2
+
+            # 检查点持久化，下次从第4行继续
+            assert _progress(engine, name)['last_id'] == 3
+            progress = run_backfill(name, engine, batch_size=3, sleep_ms=0)
+            assert progress['status'] == 'completed' and progress['percent'] == 100.0
+            assert (progress['scanned'], progress['updated'], progress['batches']) == (7, 4, 3)
+            assert count_backfill_rows(name, engine) == 0
+
+            with engine.connect() as conn:
+                remaining = conn.execute(text(
+                    "SELECT id FROM meal_log WHERE analysis_result IS NOT NULL ORDER BY id")).scalars().all()
+            assert remaining == [2, 6]
+
+            # 已完成的回填不会重复扫描，restart 时从头开始
+            assert run_backfill(name, engine)['scanned'] == 7
+            progress = run_backfill(name, engine, sleep_ms=0, restart=True)
+            assert progress['status'] == 'completed' and (progress['scanned'], progress['updated']) == (7, 0)
+
+            status_name = 'exercise_log_analysis_status'
+            assert count_backfill_rows(status_name, engine) == 3
+            assert run_backfill(status_name, engine, batch_size=2, sleep_ms=0)['updated'] == 3
+            with engine.connect() as conn:
+                statuses = conn.execute(text("SELECT analysis_status FROM exercise_log ORDER BY id")).scalars().all()
+            assert statuses == ['completed', 'pending', 'completed', 'completed', 'completed']
+        engine.dispose()
+    print("✅ 分批回填正确")
+
+def test_backfill_admin_routes():
+    """后台可以查看进度、试运行和运行回填"""
+    print("🧪 测试回填后台")
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+
+    response = client.get('/admin/backfills')
+    data = response.get_json()
+    assert data['success'] and {job['name'] for job in data['backfills']} == set(BACKFILLS)
+
+    response = client.post('/admin/backfills/meal_log_damaged_analysis/dry-run')
+    assert response.status_code == 302
+    response = client.post('/admin/backfills/no_such_job/run')
+    assert response.status_code == 302
+    with client.session_transaction() as sess:
+        messages = [message for _, message in sess.get('_flashes', [])]
+    assert any('试运行' in message for message in messages)
+    assert any('未知的回填任务' in message for message in messages)
+
+    page = client.get('/admin/settings').get_data(as_text=True)
+    assert '数据回填' in page and 'meal_log_damaged_analysis' in page
+    print("✅ 回填后台正确")
+
+if __name__ == '__main__':
+    test_backfill_runs_in_resumable_batches()
+    test_backfill_admin_routes()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试列式图表数据接口
+验证LTTB/分桶降采样以及 /api/chart-data 的列式输出
+"""
+
+import sys
+from datetime import date, timedelta
+sys.path.append('.')
+
+from app import (app, db, User, UserDailySummary, ensure_database_schema,
+                 lttb_indices, bucket_average_columns)
+
+def test_lttb_keeps_endpoints_and_peaks():
+    """LTTB保留首尾点和明显的峰值"""
+    print("🧪 测试LTTB降采样")
+    xs = list(range(100))
+    ys = [0.0] * 100
+    ys[37] = 50.0
+    indices = lttb_indices(xs, ys, 10)
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 99
+    assert 37 in indices
+    assert indices == sorted(indices)
+    assert lttb_indices(xs[:5], ys[:5], 10) == [0, 1, 2, 3, 4]
+    print("✅ LTTB降采样正确")
+
+def test_bucket_average_skips_missing_values():
+    """分桶平均时空值不参与计算，整桶为空时返回None"""
+    print("🧪 测试分桶平均")
+    start = date(2025, 1, 1)
+    dates = [start, start + timedelta(days=1), start + timedelta(days=3)]
+    columns = {'calories_in': [1000, 2000, 1500], 'weight': [70.0, None, None]}
+    bucket_dates, averaged = bucket_average_columns(start, dates, columns, 2)
+    assert bucket_dates == [start, start + timedelta(days=2)]
+    assert averaged == {'calories_in': [1500.0, 1500.0], 'weight': [70.0, None]}
+    print("✅ 分桶平均正确")
+
+def test_chart_data_api_is_columnar_and_bounded():
+    """接口返回列式数组，长时间范围按points降采样"""
+    print("🧪 测试图表数据接口")
+    with app.app_context():
+        db.create_all()
+        ensure_database_schema()
+        user = User.query.filter_by(username='chart_data_tester').first()
+        if not user:
+            user = User(username='chart_data_tester', email='chart_data@test.com', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+        UserDailySummary.query.filter_by(user_id=user.id).delete()
+        today = date.today()
+        db.session.add_all([
+            UserDailySummary(user_id=user.id, date=today - timedelta(days=offset),
+                             calories_in=1800 + offset, calories_out=300,
+                             weight=70.0 + offset / 100 if offset % 3 == 0 else None)
+            for offset in range(400)
+        ])
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+
+    full = client.get('/api/chart-data?days=30').get_json()
+    assert full['success'] and not full['downsampled']
+    assert full['source_points'] == full['points'] == 30
+    assert set(full['data']) == {'dates', 'calories_in', 'calories_out', 'weight'}
+    assert full['data']['dates'][-1] == today.isoformat()
+    assert full['data']['calories_in'][-1] == 1800
+
+    bucketed = client.get('/api/chart-data?days=365&points=50').get_json()
+    assert bucketed['downsampled'] and bucketed['method'] == 'bucket'
+    assert bucketed['source_points'] == 365 and bucketed['points'] <= 50
+    assert all(len(values) == bucketed['points'] for values in bucketed['data'].values())
+
+    lttb = client.get('/api/chart-data?days=365&points=40&series=weight&method=lttb').get_json()
+    assert lttb['method'] == 'lttb' and lttb['points'] == 40
+    assert set(lttb['data']) == {'dates', 'weight'}
+    assert None not in lttb['data']['weight']
+
+    # 每列在自己有值的日期上选点：只有体重的日子不会因为第一列为空被丢掉
+    with app.app_context():
+        table = UserDailySummary.__table__
+        db.session.execute(table.update().where(table.c.user_id == user_id, table.c.weight.isnot(None))
+                           .values(calories_in=None))
+        db.session.commit()
+    mixed = client.get('/api/chart-data?days=365&points=40&series=calories_in,weight&method=lttb').get_json()
+    assert mixed['points'] <= 40
+    assert sum(value is not None for value in mixed['data']['weight']) == 20
+    assert sum(value is not None for value in mixed['data']['calories_in']) == 20
+    assert mixed['data']['dates'][0] == (today - timedelta(days=364)).isoformat()
+
+    assert client.get('/api/chart-data?series=password').status_code == 400
+    assert client.get('/api/chart-data?method=random').status_code == 400
+
+    with app.app_context():
+        UserDailySummary.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+    print("✅ 图表数据接口正确")
+
+if __name__ == '__main__':
+    test_lttb_keeps_endpoints_and_peaks()
+    test_bucket_average_skips_missing_values()
+    test_chart_data_api_is_columnar_and_bounded()
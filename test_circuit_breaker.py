@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+测试Gemini熔断器
+验证连续失败后熔断、熔断期间直接fallback、冷却后半开探测
+"""
+
+import sys
+import time
+sys.path.append('.')
+
+import app as app_module
+from app import app, CircuitBreaker, GeminiUnavailableError, generate_gemini_content, call_gemini_exercise_analysis
+
+class FailingModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        raise TimeoutError('deadline exceeded')
+
+def test_breaker_state_transitions():
+    """closed -> open -> half_open -> closed"""
+    print("🧪 测试熔断器状态切换")
+    breaker = CircuitBreaker(failure_threshold=2, slow_call_seconds=5, reset_timeout=0.1)
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == 'closed'
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    assert not breaker.allow_request()
+
+    time.sleep(0.15)
+    assert breaker.allow_request()          # 半开探测
+    assert breaker.state == 'half_open'
+    assert not breaker.allow_request()      # 探测期间拒绝其他请求
+    breaker.record_success(0.1)
+    assert breaker.state == 'closed'
+
+    breaker.record_success(10)              # 慢调用计为失败
+    assert breaker.snapshot()['slow_calls'] == 1
+    print("✅ 熔断器状态切换正确")
+
+def test_open_breaker_routes_to_fallback(monkeypatch):
+    """熔断打开后不再调用模型，运动分析直接返回fallback"""
+    print("🧪 测试熔断后直接fallback")
+    breaker = CircuitBreaker(failure_threshold=1, slow_call_seconds=5, reset_timeout=60)
+    model = FailingModel()
+    monkeypatch.setattr(app_module, 'gemini_breaker', breaker)
+    monkeypatch.setattr(app_module, 'get_gemini_model', lambda *args, **kwargs: model)
+
+    user_info = {'age': 30, 'gender': 'male', 'weight': 70, 'height': 175, 'activity_level': 'sedentary'}
+    with app.app_context():
+        first = call_gemini_exercise_analysis('running', '跑步', 30, user_info)
+        second = call_gemini_exercise_analysis(None, None, None, user_info, '晚上在操场慢跑了三十分钟')
+    assert model.calls == 1
+    assert breaker.state == 'open'
+    assert first['basic_metrics']['calories_burned'] > 0
+    assert second['basic_metrics']['calories_burned'] > 0
+    print("✅ 熔断期间直接使用fallback")
+
+def test_insufficient_budget_skips_call():
+    """请求剩余预算不足时不调用模型"""
+    model = FailingModel()
+    with app.test_request_context('/'):
+        app_module.g.request_started_at = time.monotonic() - app_module.REQUEST_BUDGET_SECONDS
+        try:
+            generate_gemini_content(model, 'prompt')
+            assert False, '应当抛出GeminiUnavailableError'
+        except GeminiUnavailableError:
+            pass
+    assert model.calls == 0
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+测试自然语言饮食的合并分析和异步分析任务
+验证只有描述时，解析与营养分析只调用一次模型，且保存请求不等待AI分析
+"""
+
+import sys
+import json
+import time
+from datetime import date
+sys.path.append('.')
+
+import app as app_module
+from app import app, db, User, MealLog, clear_analysis_cache, ensure_database_schema
+
+COMBINED_RESPONSE = {
+    "parsed_foods": [
+        {"name": "鸡蛋", "amount": 2, "unit": "个", "estimated_weight": "100"},
+        {"name": "牛奶", "amount": 1, "unit": "杯", "estimated_weight": "250"}
+    ],
+    "basic_nutrition": {"total_calories": 300, "protein": 20, "carbohydrates": 12, "fat": 18},
+    "meal_analysis": {"meal_score": 8}
+}
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        return FakeResponse('```json\n' + json.dumps(COMBINED_RESPONSE, ensure_ascii=False) + '\n```')
+
+def wait_for_job(client, status_url, timeout=10):
+    """轮询分析任务直到完成"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(status_url).get_json()
+        if status['status'] in ('completed', 'failed'):
+            return status
+        time.sleep(0.05)
+    raise AssertionError('分析任务超时未完成')
+
+def test_meal_log_single_model_call(monkeypatch):
+    """POST /meal-log 立即返回，后台只调用一次模型，并按解析结果拆分为多条记录"""
+    print("🧪 测试合并解析+分析")
+    fake_model = FakeModel()
+    monkeypatch.setattr(app_module, 'get_gemini_model', lambda *args, **kwargs: fake_model)
+
+    with app.app_context():
+        db.create_all()
+        ensure_database_schema()
+        clear_analysis_cache()
+        user = User.query.filter_by(username='combined_analysis_tester').first()
+        if not user:
+            user = User(username='combined_analysis_tester', email='combined_analysis@test.com', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+        MealLog.query.filter_by(user_id=user.id).delete()
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+
+    response = client.post('/meal-log', data={
+        'meal_date': date.today().isoformat(),
+        'meal_type': 'breakfast',
+        'food_description': '一份麦当劳早餐套餐',
+        'analysis_status': 'pending'
+    })
+    saved = response.get_json()
+    assert saved['success'] and len(saved['meal_ids']) == 1
+
+    status = wait_for_job(client, saved['status_url'])
+    assert status['status'] == 'completed'
+    assert status['total_calories'] == 300
+    assert len(status['meal_ids']) == 2
+    assert fake_model.calls == 1
+
+    with app.app_context():
+        meals = MealLog.query.filter_by(user_id=user_id).order_by(MealLog.id).all()
+        assert [m.food_name for m in meals] == ['鸡蛋', '牛奶']
+        assert sum(m.calories for m in meals) == 300
+        assert all(m.analysis_status == 'completed' for m in meals)
+        assert meals[0].analysis_result['parsed_food_info']['parsing_method'] == 'ai_combined'
+        MealLog.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+        clear_analysis_cache()
+    print("✅ 保存立即返回，一次模型调用完成解析和分析")
+
+if __name__ == '__main__':
+    print("请使用 pytest 运行此测试")
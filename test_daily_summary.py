@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+测试每日汇总表
+验证饮食/运动/体重写入时在同一事务内维护汇总，以及从原始记录重建
+"""
+
+import sys
+from datetime import date, timedelta
+sys.path.append('.')
+
+from app import (app, db, User, MealLog, ExerciseLog, WeightLog, UserDailySummary,
+                 ensure_database_schema, rebuild_daily_summaries, refresh_daily_summaries,
+                 bulk_update_meal_nutrition, get_exercise_breakdown, calculate_progress_stats)
+
+DAY = date(2025, 5, 20)
+
+def _setup_user():
+    db.create_all()
+    ensure_database_schema()
+    user = User.query.filter_by(username='daily_summary_tester').first()
+    if not user:
+        user = User(username='daily_summary_tester', email='daily_summary@test.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+    for model in (MealLog, ExerciseLog, WeightLog, UserDailySummary):
+        model.query.filter_by(user_id=user.id).delete()
+    db.session.commit()
+    return user
+
+def _summary(user_id, day=DAY):
+    db.session.expire_all()
+    return UserDailySummary.query.filter_by(user_id=user_id, date=day).first()
+
+def test_summary_follows_writes():
+    """插入、修改、改日期、删除都同步更新汇总"""
+    print("🧪 测试每日汇总增量维护")
+    with app.app_context():
+        user = _setup_user()
+        rice = MealLog(user_id=user.id, date=DAY, meal_type='lunch', food_name='米饭',
+                       calories=174, protein=3.9, carbs=38.9, fat=0.5)
+        run = ExerciseLog(user_id=user.id, date=DAY, exercise_type='cardio', exercise_name='跑步',
+                          duration=30, calories_burned=300)
+        db.session.add_all([rice, run, WeightLog(user_id=user.id, date=DAY, weight=70.5)])
+        db.session.commit()
+
+        summary = _summary(user.id)
+        assert (summary.calories_in, summary.calories_out, summary.exercise_minutes) == (174, 300, 30)
+        assert (summary.meal_count, summary.exercise_count, summary.weight) == (1, 1, 70.5)
+
+        rice.calories = 200
+        db.session.commit()
+        assert _summary(user.id).calories_in == 200
+
+        # 修改日期：旧日期和新日期都要重算
+        run.date = DAY + timedelta(days=1)
+        db.session.commit()
+        assert _summary(user.id).calories_out == 0
+        assert _summary(user.id, DAY + timedelta(days=1)).calories_out == 300
+
+        db.session.delete(run)
+        db.session.commit()
+        assert _summary(user.id, DAY + timedelta(days=1)) is None
+
+        # 批量UPDATE绕过ORM单元，也会登记重算
+        bulk_update_meal_nutrition([rice], {'food_items_nutrition': [
+            {'name': '米饭', 'calories': 250, 'protein': 5, 'carbohydrates': 50, 'fat': 1}]})
+        db.session.commit()
+        assert _summary(user.id).calories_in == 250
+
+        # 回滚的修改不影响汇总
+        rice.calories = 999
+        db.session.flush()
+        db.session.rollback()
+        assert _summary(user.id).calories_in == 250
+    print("✅ 每日汇总随写入同步更新")
+
+def test_rebuild_repairs_drift():
+    """重建任务从原始记录修复汇总"""
+    with app.app_context():
+        user = _setup_user()
+        db.session.add(MealLog(user_id=user.id, date=DAY, meal_type='dinner', food_name='鸡腿', calories=272))
+        db.session.commit()
+        table = UserDailySummary.__table__
+        db.session.execute(table.update().where(table.c.user_id == user.id).values(calories_in=1))
+        db.session.execute(table.insert().values(user_id=user.id, date=DAY - timedelta(days=3), calories_in=50))
+        db.session.commit()
+
+        assert rebuild_daily_summaries(user.id) == 1
+        assert _summary(user.id).calories_in == 272
+        assert _summary(user.id, DAY - timedelta(days=3)) is None
+
+def test_refresh_upserts_existing_rows():
+    """有数据的天原地更新（ON CONFLICT），不先删除，已被其他事务写入的汇总行不会冲突"""
+    from sqlalchemy import event
+    with app.app_context():
+        user = _setup_user()
+        table = UserDailySummary.__table__
+        # 模拟并发事务已经写入了同一天的汇总
+        db.session.execute(table.insert().values(user_id=user.id, date=DAY, calories_in=1))
+        db.session.execute(table.insert().values(user_id=user.id, date=DAY - timedelta(days=1), calories_in=1))
+        db.session.commit()
+        existing_id = _summary(user.id).id
+        db.session.execute(MealLog.__table__.insert().values(
+            user_id=user.id, date=DAY, meal_type='lunch', food_name='米饭', calories=174))
+
+        statements = []
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.lstrip())
+        event.listen(db.engine, 'before_cursor_execute', _record)
+        try:
+            assert refresh_daily_summaries({(user.id, DAY), (user.id, DAY - timedelta(days=1))}) == 1
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _record)
+
+        summary = _summary(user.id)
+        assert (summary.id, summary.calories_in, summary.meal_count) == (existing_id, 174, 1)
+        assert _summary(user.id, DAY - timedelta(days=1)) is None
+        upserts = [statement for statement in statements if statement.startswith('INSERT INTO user_daily_summary')]
+        assert len(upserts) == 1 and 'ON CONFLICT' in upserts[0]
+
+def test_progress_reads_summaries():
+    """进度页的统计来自每日汇总"""
+    with app.app_context():
+        user = _setup_user()
+        today = date.today()
+        db.session.add_all([
+            MealLog(user_id=user.id, date=today, meal_type='lunch', food_name='米饭', calories=400),
+            ExerciseLog(user_id=user.id, date=today, exercise_type='cardio', exercise_name='跑步',
+                        duration=45, calories_burned=350)
+        ])
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+    html = client.get('/progress?days=7').get_data(as_text=True)
+    assert 'const dailySummaries' in html
+    assert '"calories_in": 400' in html and '"exercise_minutes": 45' in html
+    # 原始记录不再整体输出到页面
+    assert 'const exercises' not in html and 'const meals' not in html
+    assert '"type_duration": {"cardio": 45}' in html
+    assert client.get('/dashboard').status_code == 200
+
+def test_exercise_breakdown_group_by():
+    """运动类型/强度在数据库中聚合"""
+    with app.app_context():
+        user = _setup_user()
+        for name, ex_type, intensity, duration in (('跑步', 'cardio', 'high', 30), ('骑行', 'cardio', 'high', 60),
+                                                   ('深蹲', 'strength', None, 20)):
+            db.session.add(ExerciseLog(user_id=user.id, date=DAY, exercise_type=ex_type, exercise_name=name,
+                                       intensity=intensity, duration=duration, calories_burned=100))
+        db.session.commit()
+
+        breakdown = get_exercise_breakdown(user.id, DAY, DAY)
+        assert sorted((row['exercise_type'], row['intensity'], row['count'], row['duration']) for row in breakdown) == [
+            ('cardio', 'high', 2, 90), ('strength', 'medium', 1, 20)]
+        summaries = [summary.to_dict() for summary in UserDailySummary.query.filter_by(user_id=user.id)]
+        stats = calculate_progress_stats(summaries, breakdown)
+        assert stats['intensity_distribution'] == {'low': 0, 'medium': 1, 'high': 2}
+        assert stats['type_duration'] == {'cardio': 90, 'strength': 20}
+        assert stats['total_burned'] == 300 and stats['exercise_days'] == 1
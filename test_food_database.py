@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+测试本地食物成分表
+验证别名/模糊名称查询，以及已知食物的本地营养分析
+"""
+
+import sys
+sys.path.append('.')
+
+import app as app_module
+from app import app, call_gemini_meal_analysis
+from food_database import (lookup_food, estimate_grams, nutrition_for_grams, parse_food_description,
+                           resolve_portion_grams, estimate_food_calories)
+
+USER_INFO = {'age': 30, 'gender': 'male', 'weight': 70, 'height': 175, 'fitness_goal': 'maintain_weight'}
+
+def test_lookup_aliases_and_fuzzy_names():
+    """别名、烹饪方式前缀和相近写法都能找到对应食物"""
+    print("🧪 测试食物名称查询")
+    assert lookup_food('米饭')[0]['name'] == '米饭'
+    assert lookup_food('番茄')[0]['name'] == '西红柿'
+    assert lookup_food(' 纯牛奶 ')[0]['name'] == '牛奶'
+    assert lookup_food('清炒西兰花') == (lookup_food('西兰花')[0], 'suffix')
+    assert lookup_food('鸡胸脯肉')[0]['name'] == '鸡胸肉'
+    # 中心语不同的复合菜不能误匹配
+    assert lookup_food('牛肉面') is None
+    assert lookup_food('鸡蛋炒饭') is None
+    assert lookup_food('麻辣香锅') is None
+    # 后缀前面还有已知食物时是多种食物拼在一起，不能只算最后一种
+    assert lookup_food('米饭鸡腿') is None
+    assert lookup_food('西红柿炒鸡蛋') is None
+    assert lookup_food('鸡蛋炒米饭', allow_compound=True)[1] == 'compound'
+    print("✅ 食物名称查询正确")
+
+def test_portion_grams():
+    """按单位换算克数"""
+    egg = lookup_food('鸡蛋')[0]
+    assert estimate_grams(egg, 2, '个') == 100
+    assert estimate_grams(egg, 150, 'g') == 150
+    assert nutrition_for_grams(egg, 100)['total_calories'] == 144
+
+def test_portion_resolver_overrides_and_defaults():
+    """单品覆盖优先，其次分类默认值，最后是一份的克数"""
+    bread, rice, shrimp = lookup_food('面包')[0], lookup_food('米饭')[0], lookup_food('虾')[0]
+    assert resolve_portion_grams(bread, '片') == 35      # 分类默认（主食）
+    assert resolve_portion_grams(bread, '个') == 80      # 单品覆盖
+    assert resolve_portion_grams(shrimp, '只') == 15     # 只 -> 个
+    assert resolve_portion_grams(rice, '克') == 1
+    assert resolve_portion_grams(rice, '顿') == rice['portion_g']
+    assert resolve_portion_grams(None, '碗') == 300      # 成分表之外的菜肴
+    assert estimate_food_calories('香蕉', 1, '根') == 120 * 93 / 100
+    assert estimate_food_calories('麻辣香锅', 1, '份') == 450
+
+def test_fallback_uses_portions():
+    """fallback热量随份量变化，而不是按食物数量估算"""
+    small = app_module.generate_fallback_nutrition_analysis([{'name': '苹果', 'amount': 1, 'unit': '个'}], 'snack')
+    large = app_module.generate_fallback_nutrition_analysis([{'name': '苹果', 'amount': 3, 'unit': '个'}], 'snack')
+    assert small['basic_nutrition']['total_calories'] == 106
+    assert large['basic_nutrition']['total_calories'] == 318
+
+def test_known_meal_skips_gemini(monkeypatch):
+    """全部为已知食物时不调用Gemini，结果保持basic_nutrition结构"""
+    print("🧪 测试本地营养分析")
+    def fail_if_called(*args, **kwargs):
+        raise AssertionError('不应调用Gemini')
+    monkeypatch.setattr(app_module, 'get_gemini_model', fail_if_called)
+
+    with app.app_context():
+        result = call_gemini_meal_analysis('breakfast', [
+            {'name': '鸡蛋', 'amount': 2, 'unit': '个'},
+            {'name': '牛奶', 'amount': 250, 'unit': 'ml'}
+        ], USER_INFO)
+    assert result['analysis_source'] == 'local_food_db'
+    assert result['basic_nutrition']['total_calories'] == 279  # 144 + 135
+    assert result['basic_nutrition']['protein'] == 20.8
+    assert sum(result['nutrition_breakdown'].values()) > 99
+    print("✅ 已知食物本地计算")
+
+def test_unknown_items_merge_with_local(monkeypatch):
+    """部分未知时只把未知食物交给Gemini，结果合并"""
+    prompts = []
+
+    class FakeModel:
+        def generate_content(self, prompt, **kwargs):
+            prompts.append(prompt)
+            class Response:
+                text = '{"basic_nutrition": {"total_calories": 500, "protein": 20, "carbohydrates": 50, "fat": 25}}'
+            return Response()
+
+    monkeypatch.setattr(app_module, 'get_gemini_model', lambda *args, **kwargs: FakeModel())
+    with app.app_context():
+        app_module.clear_analysis_cache()
+        result = call_gemini_meal_analysis('lunch', [
+            {'name': '米饭', 'amount': 1, 'unit': '碗'},
+            {'name': '麻辣香锅', 'amount': 1, 'unit': '份'}
+        ], USER_INFO)
+        app_module.clear_analysis_cache()
+    assert len(prompts) == 1
+    assert '麻辣香锅' in prompts[0] and '- 米饭' not in prompts[0]
+    assert result['basic_nutrition']['total_calories'] == 500 + 174
+    assert [item['matched_food'] for item in result['local_food_items']] == ['米饭']
+
+def test_parse_description_quantities_and_units():
+    """本地规则解析数量、中文数字和单位"""
+    print("🧪 测试本地描述解析")
+    result = parse_food_description('早餐吃了两碗米饭加一个荷包蛋，200g鸡胸肉和一个半香蕉')
+    assert [(f['name'], f['amount'], f['unit']) for f in result['food_items']] == [
+        ('米饭', 2, '碗'), ('荷包蛋', 1, '个'), ('鸡胸肉', 200, 'g'), ('香蕉', 1.5, '个')]
+    assert result['confidence'] == 1.0
+
+    assert parse_food_description('三文鱼100克')['food_items'][0]['amount'] == 100
+    assert parse_food_description('一两米饭')['food_items'][0]['estimated_weight'] == '50'
+    assert parse_food_description('十二个饺子')['food_items'][0]['amount'] == 12
+    # 含糊数量和未识别食物降低置信度
+    assert parse_food_description('两三个饺子')['confidence'] < 0.8
+    unknown = parse_food_description('三个小笼包和一碗米饭')
+    assert unknown['confidence'] == 0 and unknown['unknown_foods'] == ['小笼包']
+    # 相邻的食物拆成多项，不合并成一个名称
+    result = parse_food_description('两个鸡蛋牛奶')
+    assert [(f['name'], f['amount'], f['unit']) for f in result['food_items']] == [
+        ('鸡蛋', 2, '个'), ('牛奶', 1, '份')]
+    assert [f['name'] for f in parse_food_description('米饭鸡腿')['food_items']] == ['米饭', '鸡腿']
+    assert [f['name'] for f in parse_food_description('西红柿炒鸡蛋')['food_items']] == ['西红柿', '炒鸡蛋']
+    assert parse_food_description('牛肉面')['unknown_foods'] == ['牛肉面']
+    assert parse_food_description('鸡蛋炒米饭')['confidence'] < 0.8
+    print("✅ 本地描述解析正确")
+
+def test_confident_description_skips_gemini(monkeypatch):
+    """描述可被本地解析时，解析和营养分析都不调用Gemini"""
+    def fail_if_called(*args, **kwargs):
+        raise AssertionError('不应调用Gemini')
+    monkeypatch.setattr(app_module, 'get_gemini_model', fail_if_called)
+
+    parsed = app_module.parse_natural_language_food('两个鸡蛋一杯牛奶', 'breakfast')
+    assert parsed['success'] and parsed['parsing_method'] == 'local_rules'
+    with app.app_context():
+        result = call_gemini_meal_analysis('breakfast', [], USER_INFO, '两个鸡蛋一杯牛奶')
+    assert result['parsed_food_info']['parsing_method'] == 'local_rules'
+    assert [f['name'] for f in result['parsed_food_info']['parsed_foods']] == ['鸡蛋', '牛奶']
+    assert result['basic_nutrition']['total_calories'] == 279
+
+def test_item_nutrition_attribution():
+    """逐项拆分营养：已知食物取实际数值，未知食物分摊剩余总量，合计等于总量"""
+    items = [
+        {'name': '米饭', 'amount': 1, 'unit': '碗'},
+        {'name': '鸡腿', 'amount': 1, 'unit': '个'},
+        {'name': '麻辣香锅', 'amount': 1, 'unit': '份'}
+    ]
+    basic = {'total_calories': 900, 'protein': 50, 'carbohydrates': 80, 'fat': 40}
+    per_item = app_module.attribute_item_nutrition(items, basic)
+    assert [item['calories'] for item in per_item] == [174, 272, 454]
+    assert round(sum(item['protein'] for item in per_item), 1) == 50
+
+    # 模型逐项给出的数值优先于份量估算
+    model_items = [{'name': '麻辣香锅', 'calories': 600, 'protein': 20, 'carbohydrates': 30, 'fat': 40}]
+    per_item = app_module.attribute_item_nutrition(
+        items[2:], {'total_calories': 600, 'protein': 20, 'carbohydrates': 30, 'fat': 40}, model_items)
+    assert per_item[0]['calories'] == 600 and per_item[0]['fat'] == 40
+
+    # 已知食物的数值之和超过总量时按比例缩放，合计仍等于总量
+    per_item = app_module.attribute_item_nutrition(items, {'total_calories': 223, 'protein': 10,
+                                                           'carbohydrates': 20, 'fat': 5})
+    assert [item['calories'] for item in per_item] == [87, 136, 0]
+    assert round(sum(item['fat'] for item in per_item), 1) == 5
+
+def test_bulk_update_writes_per_item_rows():
+    """批量UPDATE按每项食物写回，而不是平均分配"""
+    from datetime import date
+    from app import db, User, MealLog, ensure_database_schema
+    with app.app_context():
+        db.create_all()
+        ensure_database_schema()
+        user = User.query.filter_by(username='item_nutrition_tester').first()
+        if not user:
+            user = User(username='item_nutrition_tester', email='item_nutrition@test.com', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+        meals = [MealLog(user_id=user.id, date=date.today(), meal_type='lunch', food_name=name,
+                         amount=1, unit=unit, calories=0) for name, unit in (('米饭', '碗'), ('鸡腿', '个'))]
+        db.session.add_all(meals)
+        db.session.commit()
+        meal_ids = [meal.id for meal in meals]
+
+        analysis = {'basic_nutrition': {'total_calories': 446, 'protein': 27.9, 'carbohydrates': 38.9, 'fat': 20}}
+        assert app_module.bulk_update_meal_nutrition(meals, analysis) == 2
+        db.session.commit()
+        saved = MealLog.query.filter(MealLog.id.in_(meal_ids)).order_by(MealLog.id).all()
+        assert [meal.calories for meal in saved] == [174, 272]
+        assert [meal.protein for meal in saved] == [3.9, 24.0]
+        MealLog.query.filter(MealLog.id.in_(meal_ids)).delete()
+        db.session.commit()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+测试Gemini客户端注册表
+验证每个进程只配置一次，并按模型名复用实例
+"""
+
+import sys
+import threading
+sys.path.append('.')
+
+import app as app_module
+
+def test_gemini_model_singleton(monkeypatch):
+    """多线程并发获取模型时只configure一次、每个模型只构建一次"""
+    print("🧪 测试Gemini客户端单例")
+    calls = {'configure': 0, 'construct': []}
+
+    class FakeGenerativeModel:
+        def __init__(self, model_name):
+            calls['construct'].append(model_name)
+            self.model_name = model_name
+
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    monkeypatch.setattr(app_module.genai, 'configure', lambda **kwargs: calls.__setitem__('configure', calls['configure'] + 1))
+    monkeypatch.setattr(app_module.genai, 'GenerativeModel', FakeGenerativeModel)
+    monkeypatch.setitem(app_module.GEMINI_MODEL_NAMES, 'parse', 'fake-parse-model')
+    monkeypatch.setitem(app_module.GEMINI_MODEL_NAMES, 'analysis', 'fake-analysis-model')
+    app_module.reset_gemini_clients()
+
+    try:
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(app_module.get_gemini_model('analysis')))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        parse_model = app_module.get_gemini_model('parse')
+        assert len({id(model) for model in results}) == 1
+        assert results[0].model_name == 'fake-analysis-model'
+        assert parse_model.model_name == 'fake-parse-model'
+        assert calls['configure'] == 1
+        assert sorted(calls['construct']) == ['fake-analysis-model', 'fake-parse-model']
+        assert 'fake-analysis-model' in app_module.gemini_client_metrics['construct_ms']
+    finally:
+        app_module.reset_gemini_clients()
+    print("✅ Gemini客户端只初始化一次")
+
+def test_gemini_model_requires_api_key(monkeypatch):
+    """未配置API Key时抛出异常，调用方走fallback"""
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    app_module.reset_gemini_clients()
+    try:
+        app_module.get_gemini_model('analysis')
+        assert False, '应当抛出异常'
+    except Exception as e:
+        assert 'API Key' in str(e)
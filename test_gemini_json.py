@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+测试Gemini响应JSON提取
+验证代码块、多余文字、截断输出都能解析，并统计解析失败率
+"""
+
+import sys
+sys.path.append('.')
+
+import app as app_module
+from app import extract_json_object, parse_gemini_json, get_json_parse_stats
+
+def test_extract_json_variants():
+    """各种不规范输出都能提取出JSON对象"""
+    print("🧪 测试JSON提取")
+    assert extract_json_object('```json\n{"a": 1}\n```') == {'a': 1}
+    assert extract_json_object('好的，分析结果如下：{"a": {"b": [1, 2]}} 希望对你有帮助') == {'a': {'b': [1, 2]}}
+    assert extract_json_object('{"text": "含有}括号{的字符串", "n": 2}') == {'text': '含有}括号{的字符串', 'n': 2}
+    # 流式输出被截断
+    assert extract_json_object('{"basic_nutrition": {"total_calories": 320, "tags": ["高蛋白", "低') == {
+        'basic_nutrition': {'total_calories': 320, 'tags': ['高蛋白', '低']}
+    }
+    assert extract_json_object('{"a": 1, "b": [2,') == {'a': 1, 'b': [2]}
+    print("✅ JSON提取正确")
+
+def test_parse_stats_are_recorded():
+    """解析成功/修复/失败分别计数"""
+    print("🧪 测试解析统计")
+    app_module.json_parse_stats.pop('test_case', None)
+    parse_gemini_json('{"a": 1}', 'test_case')
+    parse_gemini_json('```json\n{"a": 1}\n```', 'test_case')
+    try:
+        parse_gemini_json('模型拒绝回答', 'test_case')
+        assert False, '应当抛出ValueError'
+    except ValueError:
+        pass
+    stats = get_json_parse_stats()['test_case']
+    assert (stats['parsed'], stats['repaired'], stats['failed']) == (1, 1, 1)
+    assert stats['failure_rate'] == 33.3
+    app_module.json_parse_stats.pop('test_case', None)
+    print("✅ 解析统计正确")
+
+def test_schemas_match_templates():
+    """响应schema覆盖json_template中的字段"""
+    assert 'parsed_foods' in app_module.MEAL_PARSE_ANALYSIS_SCHEMA['properties']
+    assert 'parsed_foods' not in app_module.MEAL_ANALYSIS_SCHEMA['properties']
+    # 逐项营养与其它字段一样是必填，合并模式也包含
+    for schema in (app_module.MEAL_ANALYSIS_SCHEMA, app_module.MEAL_PARSE_ANALYSIS_SCHEMA):
+        assert 'food_items_nutrition' in schema['required']
+    basic = app_module.MEAL_ANALYSIS_SCHEMA['properties']['basic_nutrition']['properties']
+    assert {'total_calories', 'protein', 'carbohydrates', 'fat', 'vitamin_c'} <= set(basic)
+    metrics = app_module.EXERCISE_ANALYSIS_SCHEMA['properties']['basic_metrics']['properties']
+    assert metrics['intensity_level']['type'] == 'string'
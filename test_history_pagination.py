@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+测试历史记录键集分页
+验证游标按 (date, created_at, id) 翻页不重不漏、同一天不会被拆到两页，以及分页API
+"""
+
+import sys
+from datetime import date, datetime, timedelta
+sys.path.append('.')
+
+from app import (app, db, User, MealLog, ExerciseLog, fetch_history_page,
+                 encode_history_cursor, decode_history_cursor)
+
+START = date(2025, 3, 1)
+
+def _setup_user():
+    db.create_all()
+    user = User.query.filter_by(username='history_page_tester').first()
+    if not user:
+        user = User(username='history_page_tester', email='history_page@test.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+    MealLog.query.filter_by(user_id=user.id).delete()
+    ExerciseLog.query.filter_by(user_id=user.id).delete()
+    db.session.commit()
+    return user
+
+def _seed_meals(user_id, days=10):
+    """每天早餐两样、午餐一样，created_at相同的记录靠id区分先后"""
+    for offset in range(days):
+        day = START + timedelta(days=offset)
+        created_at = datetime.combine(day, datetime.min.time()) + timedelta(hours=8)
+        for meal_type, food_name in (('breakfast', '鸡蛋'), ('breakfast', '牛奶'), ('lunch', '米饭')):
+            db.session.add(MealLog(user_id=user_id, date=day, meal_type=meal_type, food_name=food_name,
+                                   calories=100, created_at=created_at))
+    db.session.commit()
+
+def test_cursor_round_trip():
+    """游标编码后可以还原，格式错误时报ValueError"""
+    print("🧪 测试分页游标编解码")
+    record = MealLog(id=42, date=START, created_at=datetime(2025, 3, 1, 8, 30, 15, 123))
+    assert decode_history_cursor(encode_history_cursor(record)) == (START, datetime(2025, 3, 1, 8, 30, 15, 123), 42)
+    try:
+        decode_history_cursor('not-a-cursor')
+        assert False, '应当抛出ValueError'
+    except ValueError:
+        pass
+    print("✅ 游标编解码正确")
+
+def test_keyset_pages_cover_history_without_splitting_days():
+    """逐页翻完所有记录，不重复不遗漏，每一天只出现在一页"""
+    print("🧪 测试键集分页")
+    with app.app_context():
+        user = _setup_user()
+        _seed_meals(user.id)
+
+        seen_ids, page_days, cursor, pages = [], [], None, 0
+        while True:
+            records, cursor = fetch_history_page(MealLog, user.id, cursor, limit=4)
+            pages += 1
+            seen_ids.extend(record.id for record in records)
+            page_days.append({record.date for record in records})
+            keys = [(record.date, record.created_at, record.id) for record in records]
+            assert keys == sorted(keys, reverse=True)
+            if not cursor:
+                break
+
+        all_ids = {meal.id for meal in MealLog.query.filter_by(user_id=user.id)}
+        assert len(seen_ids) == len(set(seen_ids)) == len(all_ids) == 30
+        assert set(seen_ids) == all_ids
+        for i, days in enumerate(page_days):
+            for other in page_days[i + 1:]:
+                assert not days & other
+        assert pages <= 10
+    print("✅ 键集分页正确")
+
+def test_history_apis_return_grouped_pages():
+    """饮食/运动历史API返回按天分组的数据和下一页游标"""
+    print("🧪 测试历史记录分页API")
+    with app.app_context():
+        user = _setup_user()
+        _seed_meals(user.id, days=3)
+        for offset in range(3):
+            db.session.add(ExerciseLog(user_id=user.id, date=START + timedelta(days=offset),
+                                       exercise_type='cardio', exercise_name='跑步', duration=30,
+                                       calories_burned=300, analysis_status='completed'))
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+
+    first = client.get('/api/meal-history?limit=3').get_json()
+    assert first['success'] and first['next_cursor']
+    assert [day['date'] for day in first['days']] == [(START + timedelta(days=2)).isoformat()]
+    meals = first['days'][0]['meals']
+    assert [meal['meal_type'] for meal in meals] == ['lunch', 'breakfast']
+    assert meals[1]['food_items_summary'] == '牛奶、鸡蛋'
+    assert first['days'][0]['total_calories'] == 300
+
+    rest = client.get(f"/api/meal-history?cursor={first['next_cursor']}").get_json()
+    assert [day['date'] for day in rest['days']] == [(START + timedelta(days=1)).isoformat(), START.isoformat()]
+    assert rest['next_cursor'] is None
+
+    exercises = client.get('/api/exercise-history?limit=2').get_json()
+    assert len(exercises['days']) == 2 and exercises['next_cursor']
+    assert exercises['days'][0]['total_calories'] == 300
+    assert exercises['days'][0]['exercises'][0]['exercise_name'] == '跑步'
+
+    assert client.get('/api/meal-history?cursor=broken').status_code == 400
+    page = client.get('/meal-log')
+    assert page.status_code == 200
+    # 删除确认框显示食物摘要；无限滚动追加的行转义用户输入
+    html = page.get_data(as_text=True)
+    assert 'data-food-name="牛奶、鸡蛋"' in html
+    assert '${escapeHtml(meal.food_items_summary)}' in html
+    assert client.get('/exercise-log').status_code == 200
+
+    with app.app_context():
+        MealLog.query.filter_by(user_id=user_id).delete()
+        ExerciseLog.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+    print("✅ 历史记录分页API正确")
+
+if __name__ == '__main__':
+    test_cursor_round_trip()
+    test_keyset_pages_cover_history_without_splitting_days()
+    test_history_apis_return_grouped_pages()
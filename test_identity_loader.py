@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+测试登录身份加载
+验证带类型前缀的会话ID、一次查询加载资料和目标、TTL缓存以及资料/目标/角色变更后的失效
+"""
+
+import sys
+from datetime import datetime, timedelta
+sys.path.append('.')
+
+from sqlalchemy import event
+
+from app import (app, db, User, UserProfile, FitnessGoal, AdminUser, load_user,
+                 parse_session_identity, invalidate_identity)
+
+USERNAME = 'identity_loader_tester'
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self)
+
+def _setup_user():
+    db.create_all()
+    user = User.query.filter_by(username=USERNAME).first()
+    if user:
+        db.session.delete(user)
+        db.session.commit()
+    user = User(username=USERNAME, email=f'{USERNAME}@test.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    now = datetime(2025, 1, 1)
+    db.session.add_all([
+        UserProfile(user_id=user.id, height=170, weight=68, age=30, gender='male'),
+        FitnessGoal(user_id=user.id, goal_type='lose_weight', target_weight=60, is_active=False, created_at=now),
+        FitnessGoal(user_id=user.id, goal_type='build_muscle', target_weight=65, is_active=True,
+                    created_at=now + timedelta(days=1)),
+    ])
+    db.session.commit()
+    invalidate_identity()
+    return user.id
+
+def test_parse_session_identity():
+    """解析带类型前缀和旧格式的会话ID"""
+    print("🧪 测试会话身份解析")
+    assert parse_session_identity('user:12') == ('user', 12)
+    assert parse_session_identity('admin:3') == ('admin', 3)
+    assert parse_session_identity('7') == (None, 7)
+    for bad in ('guest:1', 'user:abc'):
+        try:
+            parse_session_identity(bad)
+            assert False, bad
+        except ValueError:
+            pass
+    print("✅ 会话身份解析正确")
+
+def test_loader_uses_one_query_and_cache():
+    """首次加载一条查询，之后命中缓存不查询；资料和目标已预加载"""
+    print("🧪 测试身份加载与缓存")
+    with app.test_request_context():
+        user_id = _setup_user()
+
+    with app.test_request_context():
+        with QueryCounter() as counter:
+            user = load_user(f'user:{user_id}')
+            assert user.get_id() == f'user:{user_id}'
+            assert user.profile.weight == 68
+            assert user.active_goal.goal_type == 'build_muscle'
+        assert counter.count == 1
+
+    with app.test_request_context():
+        with QueryCounter() as counter:
+            user = load_user(f'user:{user_id}')
+            assert user.profile.height == 170 and user.active_goal.target_weight == 65
+        assert counter.count == 0
+
+        # 合并进当前session后可以正常修改并提交，提交后缓存失效
+        user.profile.weight = 66
+        db.session.commit()
+
+    with app.test_request_context():
+        with QueryCounter() as counter:
+            assert load_user(f'user:{user_id}').profile.weight == 66
+        assert counter.count == 1
+
+        goal = FitnessGoal.query.filter_by(user_id=user_id, goal_type='build_muscle').first()
+        goal.is_active = False
+        db.session.commit()
+
+    with app.test_request_context():
+        assert load_user(f'user:{user_id}').active_goal is None
+        # 旧格式的会话ID仍然按普通用户加载
+        assert load_user(str(user_id)).id == user_id
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+        assert load_user(f'user:{user_id}') is None
+    print("✅ 身份加载与缓存正确")
+
+def test_admin_identity_is_separate():
+    """管理员与普通用户ID相同时按类型区分，角色变更后缓存失效"""
+    print("🧪 测试管理员身份")
+    with app.test_request_context():
+        user_id = _setup_user()
+        admin = db.session.get(AdminUser, user_id)
+        created = admin is None
+        if created:
+            admin = AdminUser(id=user_id, username=f'{USERNAME}_admin', email=f'{USERNAME}_admin@test.com',
+                              password_hash='x', role='admin')
+            db.session.add(admin)
+            db.session.commit()
+        original_role = admin.role
+
+    with app.test_request_context():
+        assert isinstance(load_user(f'user:{user_id}'), User)
+        loaded = load_user(f'admin:{user_id}')
+        assert isinstance(loaded, AdminUser) and loaded.get_id() == f'admin:{user_id}'
+        loaded.role = 'super_admin'
+        db.session.commit()
+
+    with app.test_request_context():
+        assert load_user(f'admin:{user_id}').role == 'super_admin'
+        admin = db.session.get(AdminUser, user_id)
+        if created:
+            db.session.delete(admin)
+        else:
+            admin.role = original_role
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+    print("✅ 管理员身份正确")
+
+if __name__ == '__main__':
+    test_parse_session_identity()
+    test_loader_uses_one_query_and_cache()
+    test_admin_identity_is_separate()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+测试记录表复合索引和历史记录分页
+"""
+
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+sys.path.append('.')
+
+from sqlalchemy import create_engine, inspect, text
+from app import (app, db, User, MealLog, MIGRATIONS, fetch_history_page, run_migrations,
+                 LOG_TABLE_INDEXES)
+
+def test_log_indexes_exist(tmp_path):
+    """迁移4为已存在的旧记录表补建复合索引"""
+    print("🧪 测试记录表索引")
+    engine = create_engine(f"sqlite:///{tmp_path / 'indexes.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE meal_log (id INTEGER PRIMARY KEY, user_id INTEGER, date DATE, created_at DATETIME)"))
+    with app.app_context():
+        run_migrations(engine)
+    inspector = inspect(engine)
+    for table_name, index_name, columns in LOG_TABLE_INDEXES:
+        indexes = {index['name']: index['column_names'] for index in inspector.get_indexes(table_name)}
+        assert indexes.get(index_name) == list(columns)
+    # 重复执行不报错也不重复创建
+    index_migration = next(func for version, _, func in MIGRATIONS if version == 4)
+    with engine.begin() as conn:
+        index_migration(conn)
+    engine.dispose()
+    print("✅ 记录表索引已创建")
+
+class _PostgresConnection:
+    """只记录语句的PostgreSQL连接替身，ix_meal_log_user_date 是上次中断留下的无效索引"""
+    class dialect:
+        name = 'postgresql'
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement, parameters=None):
+        self.statements.append(' '.join(str(statement).split()))
+        invalid = ['ix_meal_log_user_date'] if 'indisvalid' in self.statements[-1] else []
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: invalid))
+
+def test_postgres_indexes_built_concurrently():
+    """PostgreSQL上在自动提交连接中 CREATE INDEX CONCURRENTLY，先删除中断留下的无效索引"""
+    index_migration = next(func for version, _, func in MIGRATIONS if version == 4)
+    assert not index_migration.transactional
+    conn = _PostgresConnection()
+    index_migration(conn)
+    assert conn.statements[1] == 'DROP INDEX CONCURRENTLY IF EXISTS ix_meal_log_user_date'
+    creates = conn.statements[2:]
+    assert len(creates) == len(LOG_TABLE_INDEXES)
+    assert all(statement.startswith('CREATE INDEX CONCURRENTLY IF NOT EXISTS') for statement in creates)
+
+def test_history_page_keeps_days_whole():
+    """按 (date, created_at, id) 倒序分页，页尾那一天不会被拆到两页"""
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(username='range_query_tester').first()
+        if not user:
+            user = User(username='range_query_tester', email='range_query@test.com', password_hash='x')
+            db.session.add(user)
+            db.session.commit()
+        MealLog.query.filter_by(user_id=user.id).delete()
+        for name, created_at in (('早', datetime(2025, 6, 15, 0, 0)),
+                                 ('晚', datetime(2025, 6, 15, 23, 59, 59)),
+                                 ('次日', datetime(2025, 6, 16, 0, 0)),
+                                 ('前一天', datetime(2025, 6, 14, 12, 0))):
+            db.session.add(MealLog(user_id=user.id, date=created_at.date(), meal_type='snack',
+                                   food_name=name, calories=100, created_at=created_at))
+        db.session.commit()
+
+        meals, cursor = fetch_history_page(MealLog, user.id, limit=2)
+        assert [meal.food_name for meal in meals] == ['次日', '晚', '早']
+        meals, cursor = fetch_history_page(MealLog, user.id, cursor=cursor, limit=2)
+        assert [meal.food_name for meal in meals] == ['前一天'] and cursor is None
+        MealLog.query.filter_by(user_id=user.id).delete()
+        db.session.commit()
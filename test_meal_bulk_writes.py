@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+测试饮食记录批量写入
+验证保存饮食是一次批量INSERT、分析任务拆分食物是一次批量INSERT和一条UPDATE，
+且计数器和每日汇总保持一致（PostgreSQL上批量INSERT合并为一条语句，SQLite逐行执行）
+"""
+
+import sys
+from datetime import date
+sys.path.append('.')
+
+from sqlalchemy import event
+
+import app as app_module
+from app import (app, db, User, MealLog, MealAnalysisJob, UserDailySummary, ensure_database_schema,
+                 get_app_counters, process_meal_analysis_job)
+
+USERNAME = 'meal_bulk_tester'
+DAY = date(2025, 7, 1)
+
+class StatementRecorder:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self)
+
+    def count(self, prefix):
+        return sum(1 for statement in self.statements if statement.lstrip().startswith(prefix))
+
+    def expected_inserts(self, rows):
+        """SQLite不能保证多行RETURNING的顺序，按输入顺序返回ID时逐行INSERT"""
+        return rows if self.engine.dialect.name == 'sqlite' else 1
+
+def _setup_user():
+    with app.app_context():
+        db.create_all()
+        ensure_database_schema()
+        user = User.query.filter_by(username=USERNAME).first()
+        if user:
+            db.session.delete(user)
+            db.session.commit()
+        user = User(username=USERNAME, email=f'{USERNAME}@test.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+def _cleanup(user_id):
+    with app.app_context():
+        MealAnalysisJob.query.filter_by(user_id=user_id).delete()
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+
+def _login(user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = f'user:{user_id}'
+        sess['_fresh'] = True
+    return client
+
+def _post_meal(client, names):
+    return client.post('/meal-log', data={
+        'meal_date': DAY.isoformat(),
+        'meal_type': 'lunch',
+        'food_name[]': names,
+        'food_amount[]': ['1'] * len(names),
+        'food_unit[]': ['份'] * len(names),
+        'analysis_status': 'pending'
+    })
+
+def test_meal_save_is_one_insert(monkeypatch):
+    """保存饮食时所有食物一次批量INSERT，其余语句数不随食物数量增长"""
+    print("🧪 测试饮食保存的语句数")
+    monkeypatch.setattr(app_module, 'enqueue_meal_analysis_job', lambda job_id: True)
+    user_id = _setup_user()
+    client = _login(user_id)
+    assert _post_meal(client, ['预热']).get_json()['success']
+
+    counts = []
+    for names in (['米饭'], ['米饭', '鸡腿', '青菜', '豆腐', '鸡蛋', '苹果']):
+        with StatementRecorder() as recorder:
+            data = _post_meal(client, names).get_json()
+        assert data['success'] and len(data['meal_ids']) == len(names)
+        inserts = recorder.count('INSERT INTO meal_log')
+        assert inserts == recorder.expected_inserts(len(names))
+        counts.append(len(recorder.statements) - inserts)
+    assert counts[0] == counts[1], counts
+
+    with app.app_context():
+        meals = MealLog.query.filter(MealLog.id.in_(data['meal_ids'])).order_by(MealLog.id).all()
+        assert [meal.food_name for meal in meals] == ['米饭', '鸡腿', '青菜', '豆腐', '鸡蛋', '苹果']
+        assert all(meal.analysis_status == 'pending' and meal.created_at for meal in meals)
+        assert meals[0].analysis_result == {'notes': ''}
+        summary = UserDailySummary.query.filter_by(user_id=user_id, date=DAY).first()
+        assert summary.meal_count == 8
+    _cleanup(user_id)
+    print("✅ 饮食保存是一次批量INSERT")
+
+def test_analysis_job_splits_in_two_statements(monkeypatch):
+    """自然语言记录拆分为多种食物时只有一次批量INSERT和一条UPDATE"""
+    print("🧪 测试分析任务的批量写回")
+    monkeypatch.setattr(app_module, 'enqueue_meal_analysis_job', lambda job_id: True)
+    foods = [('米饭', 174), ('鸡腿', 272), ('青菜', 25)]
+    analysis = {
+        'basic_nutrition': {'total_calories': 471, 'protein': 30, 'carbohydrates': 45, 'fat': 12},
+        'meal_analysis': {'meal_score': 8},
+        'parsed_food_info': {'parsed_foods': [{'name': name, 'amount': 1, 'unit': '份'} for name, _ in foods]},
+        'food_items_nutrition': [{'name': name, 'calories': calories, 'protein': 1, 'carbohydrates': 2, 'fat': 3}
+                                 for name, calories in foods],
+    }
+    monkeypatch.setattr(app_module, 'call_gemini_meal_analysis', lambda *args, **kwargs: analysis)
+
+    user_id = _setup_user()
+    client = _login(user_id)
+    response = client.post('/meal-log', data={
+        'meal_date': DAY.isoformat(),
+        'meal_type': 'dinner',
+        'food_description': '一碗米饭一个鸡腿和青菜',
+        'analysis_status': 'pending'
+    })
+    job_id = response.get_json()['job_id']
+    with app.app_context():
+        before = get_app_counters()['meal_logs']
+
+    with StatementRecorder() as recorder:
+        with app.app_context():
+            process_meal_analysis_job(job_id)
+    assert recorder.count('INSERT INTO meal_log') == recorder.expected_inserts(2)
+    assert recorder.count('UPDATE meal_log') == 1
+
+    with app.app_context():
+        job = db.session.get(MealAnalysisJob, job_id)
+        assert job.status == 'completed' and len(job.meal_ids) == 3
+        meals = MealLog.query.filter(MealLog.id.in_(job.meal_ids)).order_by(MealLog.id).all()
+        assert [(meal.food_name, meal.calories) for meal in meals] == foods
+        assert all(meal.analysis_status == 'completed' and meal.meal_score == 8 for meal in meals)
+        assert meals[1].date == DAY and meals[1].meal_type == 'dinner'
+        assert meals[2].analysis_result['original_description'] == '一碗米饭一个鸡腿和青菜'
+        assert get_app_counters()['meal_logs'] == before + 2
+        summary = UserDailySummary.query.filter_by(user_id=user_id, date=DAY).first()
+        assert (summary.meal_count, summary.calories_in) == (3, 471)
+    _cleanup(user_id)
+    print("✅ 分析任务批量写回正确")
+
+def test_split_when_description_equals_first_food(monkeypatch):
+    """描述恰好等于第一种食物的名称时仍然拆分出其余食物，重试不会重复拆分"""
+    print("🧪 测试描述与第一种食物同名时的拆分")
+    monkeypatch.setattr(app_module, 'enqueue_meal_analysis_job', lambda job_id: True)
+    foods = [('米饭', 174), ('鸡腿', 272)]
+    analysis = {
+        'basic_nutrition': {'total_calories': 446, 'protein': 25, 'carbohydrates': 40, 'fat': 15},
+        'meal_analysis': {'meal_score': 7},
+        'parsed_food_info': {'parsed_foods': [{'name': name, 'amount': 1, 'unit': '份'} for name, _ in foods]},
+        'food_items_nutrition': [{'name': name, 'calories': calories, 'protein': 1, 'carbohydrates': 2, 'fat': 3}
+                                 for name, calories in foods],
+    }
+    monkeypatch.setattr(app_module, 'call_gemini_meal_analysis', lambda *args, **kwargs: analysis)
+
+    user_id = _setup_user()
+    client = _login(user_id)
+    job_id = client.post('/meal-log', data={
+        'meal_date': DAY.isoformat(),
+        'meal_type': 'lunch',
+        'food_description': '米饭',
+        'analysis_status': 'pending'
+    }).get_json()['job_id']
+    with app.app_context():
+        process_meal_analysis_job(job_id)
+        job = db.session.get(MealAnalysisJob, job_id)
+        assert job.status == 'completed' and len(job.meal_ids) == 2
+        meals = MealLog.query.filter(MealLog.id.in_(job.meal_ids)).order_by(MealLog.id).all()
+        assert [(meal.food_name, meal.calories) for meal in meals] == foods
+
+        # 任务被重新执行时按任务行记录的ID更新，不再插入新记录
+        job.status = 'pending'
+        db.session.commit()
+        process_meal_analysis_job(job_id)
+        assert MealLog.query.filter_by(user_id=user_id).count() == 2
+    _cleanup(user_id)
+    print("✅ 描述与第一种食物同名时正确拆分")
+
+if __name__ == '__main__':
+    class _Patch:
+        def setattr(self, target, name, value):
+            setattr(target, name, value)
+    test_meal_save_is_one_insert(_Patch())
+    test_analysis_job_splits_in_two_statements(_Patch())
+    test_split_when_description_equals_first_food(_Patch())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+测试饮食分组引擎
+验证一次遍历按 天 -> 餐次 -> 食物 分组，以及仪表盘兼容性查询结果的分组
+"""
+
+import sys
+from datetime import date, datetime
+from types import SimpleNamespace
+sys.path.append('.')
+
+from app import group_meals, flatten_meal_history
+
+DAY1 = date(2025, 4, 2)
+DAY2 = date(2025, 4, 1)
+
+def _meal(meal_id, day, meal_type, food_name, calories, analysis_result=None):
+    return SimpleNamespace(id=meal_id, date=day, meal_type=meal_type, food_name=food_name, quantity=1,
+                           calories=calories, analysis_result=analysis_result,
+                           created_at=datetime(day.year, day.month, day.day, 8) if day else datetime(2025, 4, 2, 8))
+
+def test_group_meals_by_day_and_type():
+    """按天和餐次分组，累计热量、摘要和评分"""
+    print("🧪 测试饮食分组")
+    meals = [
+        _meal(6, DAY1, 'lunch', '米饭', 200),
+        _meal(5, DAY1, 'breakfast', '鸡蛋', 70),
+        _meal(4, DAY1, 'breakfast', '牛奶', 100, {'meal_analysis': {'meal_score': 8}}),
+        _meal(3, DAY1, 'breakfast', '面包', 150),
+        _meal(2, DAY1, 'breakfast', '香蕉', 90),
+        _meal(1, DAY2, 'dinner', None, 50),
+    ]
+    days = group_meals(meals)
+    assert [day['date'] for day in days] == [DAY1, DAY2]
+    assert days[0]['total_daily_calories'] == 610
+    lunch, breakfast = days[0]['meals']
+    assert (lunch['meal_type'], lunch['id'], lunch['total_calories']) == ('lunch', 6, 200)
+    assert breakfast['meal_type_display'] == '早餐' and breakfast['total_calories'] == 410
+    assert breakfast['food_items_summary'] == '鸡蛋、牛奶、面包等4种食物'
+    assert breakfast['meal_score'] == 8
+    assert len(breakfast['foods']) == 4
+
+    dinner = days[1]['meals'][0]
+    assert dinner['food_items_summary'] == '无食物记录' and dinner['total_calories'] == 50
+
+    flat = flatten_meal_history(days)
+    assert [meal['meal_type'] for meal in flat] == ['lunch', 'breakfast', 'dinner']
+    assert flat[1]['date_display'] == '04-02' and flat[1]['daily_total_calories'] == 610
+    print("✅ 饮食分组正确")
+
+def test_group_meals_accepts_partial_rows():
+    """仪表盘兼容性查询只有部分字段时也能分组，空餐次归入默认类型"""
+    print("🧪 测试部分字段的分组")
+    Row = lambda meal_id, meal_type, calories: SimpleNamespace(
+        id=meal_id, food_name='食物', calories=calories, meal_type=meal_type, created_at=datetime(2025, 4, 2, 8))
+    days = group_meals([Row(1, 'lunch', 100), Row(2, None, 30), Row(3, 'lunch', None)], default_type='other')
+    assert len(days) == 1
+    groups = {group['type']: group for group in days[0]['meals']}
+    assert groups['lunch']['total_calories'] == 100 and len(groups['lunch']['foods']) == 2
+    assert groups['other']['meal_type_display'] == 'other'
+    print("✅ 部分字段的分组正确")
+
+if __name__ == '__main__':
+    test_group_meals_by_day_and_type()
+    test_group_meals_accepts_partial_rows()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+测试版本化数据库迁移
+验证旧库补齐字段和表、重复执行幂等，以及schema最新时只需一条查询
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append('.')
+
+from sqlalchemy import create_engine, event, inspect, text
+
+from app import (app, db, MIGRATIONS, LOG_TABLE_INDEXES, MIGRATION_LOCK_KEY, run_migrations,
+                 get_schema_version, ensure_schema_current, _migration_lock)
+
+def _legacy_engine(path):
+    """模拟早期版本的数据库：exercise_log/meal_log 缺少后来新增的字段"""
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE user (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+                               email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(255) NOT NULL,
+                               created_at DATETIME)
+        """))
+        conn.execute(text("""
+            CREATE TABLE exercise_log (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, date DATE NOT NULL,
+                                       exercise_type VARCHAR(50) NOT NULL, exercise_name VARCHAR(100) NOT NULL,
+                                       duration INTEGER NOT NULL, calories_burned INTEGER, intensity VARCHAR(20),
+                                       notes TEXT, created_at DATETIME)
+        """))
+        conn.execute(text("""
+            CREATE TABLE meal_log (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, date DATE NOT NULL,
+                                   meal_type VARCHAR(20) NOT NULL, food_name VARCHAR(100), quantity FLOAT,
+                                   calories INTEGER, protein FLOAT, carbs FLOAT, fat FLOAT,
+                                   analysis_result JSON, created_at DATETIME)
+        """))
+        conn.execute(text("""
+            INSERT INTO exercise_log (user_id, date, exercise_type, exercise_name, duration)
+            VALUES (1, '2025-01-01', 'cardio', '跑步', 30)
+        """))
+        # 早期的体重表没有 (user_id, date) 唯一约束，可能有同一天的重复记录
+        conn.execute(text("""
+            CREATE TABLE weight_log (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, date DATE NOT NULL,
+                                     weight FLOAT NOT NULL, bmi FLOAT, notes TEXT, created_at DATETIME)
+        """))
+        conn.execute(text("""
+            INSERT INTO weight_log (user_id, date, weight) VALUES
+            (1, '2025-01-01', 70), (1, '2025-01-01', 69.5), (1, '2025-01-02', 69)
+        """))
+    return engine
+
+def test_migrations_upgrade_legacy_database():
+    """旧库执行迁移后字段、表、索引齐全，版本为最新，重复执行不做任何事"""
+    print("🧪 测试旧库迁移")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _legacy_engine(os.path.join(tmp, 'legacy.db'))
+        with app.app_context():
+            assert get_schema_version(engine) == 0
+            applied = run_migrations(engine)
+            assert applied == [name for _, name, _ in MIGRATIONS]
+            assert get_schema_version(engine) == MIGRATIONS[-1][0]
+
+            inspector = inspect(engine)
+            exercise_columns = {column['name'] for column in inspector.get_columns('exercise_log')}
+            assert {'exercise_description', 'analysis_status', 'ai_analysis_result'} <= exercise_columns
+            meal_columns = {column['name'] for column in inspector.get_columns('meal_log')}
+            assert {'food_description', 'amount', 'unit', 'meal_score', 'analysis_status'} <= meal_columns
+            assert {'weight_log', 'user_daily_summary', 'app_counter'} <= set(inspector.get_table_names())
+            for table_name, index_name, _ in LOG_TABLE_INDEXES:
+                assert index_name in {index['name'] for index in inspector.get_indexes(table_name)}
+
+            with engine.connect() as conn:
+                status = conn.execute(text("SELECT analysis_status FROM exercise_log")).scalar()
+                weights = conn.execute(text("SELECT weight FROM weight_log ORDER BY date")).scalars().all()
+            assert status == 'completed'
+            assert weights == [69.5, 69]
+            # 已有记录的每日汇总在迁移时建立
+            with engine.connect() as conn:
+                summaries = conn.execute(text(
+                    "SELECT date, exercise_count, weight FROM user_daily_summary ORDER BY date")).all()
+            assert [tuple(row) for row in summaries] == [('2025-01-01', 1, 69.5), ('2025-01-02', 0, 69)]
+            # 后台计数器在迁移时用精确COUNT建立
+            with engine.connect() as conn:
+                counters = dict(conn.execute(text("SELECT name, value FROM app_counter")).all())
+            assert counters == {'users': 0, 'exercise_logs': 1, 'meal_logs': 0, 'weight_logs': 2}
+            assert any(index['unique'] and sorted(index['column_names']) == ['date', 'user_id']
+                       for index in inspector.get_indexes('weight_log'))
+
+            assert run_migrations(engine) == []
+            assert ensure_schema_current(engine) == []
+        engine.dispose()
+    print("✅ 旧库迁移正确")
+
+def test_weight_dedup_refreshes_summaries_and_counter():
+    """体重去重迁移记录删除的行，并同步修正每日汇总和体重计数器"""
+    print("🧪 测试体重去重迁移")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = _legacy_engine(os.path.join(tmp, 'legacy.db'))
+        with app.app_context():
+            for version, _, func in MIGRATIONS:
+                if version < 6:
+                    with engine.begin() as conn:
+                        func(conn)
+            with engine.begin() as conn:
+                # 去重前的汇总和计数器按重复记录计算
+                conn.execute(text("""
+                    INSERT INTO user_daily_summary (user_id, date, weight, calories_in) VALUES (1, '2025-01-01', 70, 0)
+                """))
+                conn.execute(text("INSERT INTO app_counter (name, value) VALUES ('weight_logs', 3)"))
+            dedup = next(func for version, _, func in MIGRATIONS if version == 6)
+            with engine.begin() as conn:
+                dedup(conn)
+            with engine.connect() as conn:
+                ids = conn.execute(text("SELECT id FROM weight_log ORDER BY id")).scalars().all()
+                summary_weight = conn.execute(text(
+                    "SELECT weight FROM user_daily_summary WHERE date = '2025-01-01'")).scalar()
+                counter = conn.execute(text("SELECT value FROM app_counter WHERE name = 'weight_logs'")).scalar()
+            assert ids == [2, 3]
+            assert summary_weight == 69.5 and counter == 2
+        engine.dispose()
+    print("✅ 体重去重迁移正确")
+
+class _RecordingConnection:
+    def __init__(self, statements):
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def execute(self, statement, parameters=None):
+        self.statements.append((str(statement), parameters))
+
+    def commit(self):
+        self.statements.append(('COMMIT', None))
+
+class _PostgresEngine:
+    """只记录语句的PostgreSQL引擎替身"""
+    class dialect:
+        name = 'postgresql'
+
+    def __init__(self):
+        self.statements = []
+
+    def connect(self):
+        return _RecordingConnection(self.statements)
+
+def test_migration_lock_serializes_postgres_only():
+    """PostgreSQL上迁移期间持有 advisory lock，出错也会释放；SQLite不加锁"""
+    print("🧪 测试迁移锁")
+    engine = _PostgresEngine()
+    try:
+        with _migration_lock(engine):
+            assert engine.statements == [('SELECT pg_advisory_lock(:key)', {'key': MIGRATION_LOCK_KEY}),
+                                         ('COMMIT', None)]
+            raise RuntimeError('迁移失败')
+    except RuntimeError:
+        pass
+    assert engine.statements[-2] == ('SELECT pg_advisory_unlock(:key)', {'key': MIGRATION_LOCK_KEY})
+
+    sqlite_engine = create_engine('sqlite://')
+    with _migration_lock(sqlite_engine):
+        pass
+    print("✅ 迁移锁正确")
+
+def test_current_schema_check_is_one_query():
+    """schema已是最新时检查只发一条查询"""
+    print("🧪 测试schema版本检查")
+    with app.app_context():
+        db.create_all()
+        ensure_schema_current()
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', _record)
+        try:
+            assert ensure_schema_current() == []
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', _record)
+        assert len(statements) == 1 and 'schema_migration' in statements[0]
+    print("✅ schema版本检查只需一条查询")
+
+if __name__ == '__main__':
+    test_migrations_upgrade_legacy_database()
+    test_weight_dedup_refreshes_summaries_and_counter()
+    test_migration_lock_serializes_postgres_only()
+    test_current_schema_check_is_one_query()
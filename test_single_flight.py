@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+测试AI分析请求合并（single-flight）
+验证进程内并发请求只执行一次，跨进程通过租约行共享结果
+"""
+
+import sys
+import time
+import threading
+sys.path.append('.')
+
+import app as app_module
+from app import app, db, AnalysisLease, run_single_flight
+
+def test_concurrent_calls_are_coalesced():
+    """同一key的并发调用只执行一次计算"""
+    print("🧪 测试进程内请求合并")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.3)
+        return {'basic_nutrition': {'total_calories': 420}}
+
+    with app.app_context():
+        db.create_all()
+
+    results = []
+
+    def worker():
+        with app.app_context():
+            results.append(run_single_flight('test:coalesce', compute, lambda: {'source': 'fallback'}))
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert all(r['basic_nutrition']['total_calories'] == 420 for r in results)
+    with app.app_context():
+        AnalysisLease.query.filter_by(lease_key='test:coalesce').delete()
+        db.session.commit()
+    print("✅ 5个并发请求只调用一次AI")
+
+def test_waits_for_lease_held_by_other_worker():
+    """租约被其他进程持有时，等待并复用其结果"""
+    print("🧪 测试跨进程租约")
+    lease_key = 'test:lease'
+    with app.app_context():
+        db.create_all()
+        AnalysisLease.query.filter_by(lease_key=lease_key).delete()
+        now = app_module._lease_now()
+        db.session.add(AnalysisLease(lease_key=lease_key, owner='other-worker', status='running',
+                                     expires_at=now + app_module.timedelta(seconds=10)))
+        db.session.commit()
+
+    def other_worker_finishes():
+        time.sleep(0.3)
+        with app.app_context():
+            app_module._finish_analysis_lease(lease_key, 'other-worker', {'source': 'other-worker'})
+
+    threading.Thread(target=other_worker_finishes).start()
+    with app.app_context():
+        result = run_single_flight(lease_key, lambda: {'source': 'local'}, lambda: {'source': 'fallback'})
+        assert result == {'source': 'other-worker'}
+        AnalysisLease.query.filter_by(lease_key=lease_key).delete()
+        db.session.commit()
+    print("✅ 复用了其他进程的分析结果")
+
+def test_coalesced_timeout_returns_fallback():
+    """等待方超时时返回规则估算结果，不再重复调用AI"""
+    print("🧪 测试合并等待超时")
+    lease_key = 'test:timeout'
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.5)
+        return {'source': 'ai'}
+
+    with app.app_context():
+        db.create_all()
+        AnalysisLease.query.filter_by(lease_key=lease_key).delete()
+        db.session.commit()
+
+    original_timeout = app_module.ANALYSIS_LEASE_SECONDS
+    fallbacks_before = app_module.single_flight_stats['fallbacks']
+    results = {}
+
+    def worker(name):
+        with app.app_context():
+            results[name] = run_single_flight(lease_key, compute, lambda: {'source': 'fallback'})
+
+    app_module.ANALYSIS_LEASE_SECONDS = 0.1
+    try:
+        leader = threading.Thread(target=worker, args=('leader',))
+        leader.start()
+        time.sleep(0.1)
+        worker('waiter')
+        leader.join()
+    finally:
+        app_module.ANALYSIS_LEASE_SECONDS = original_timeout
+
+    assert len(calls) == 1
+    assert results['leader'] == {'source': 'ai'}
+    assert results['waiter'] == {'source': 'fallback'}
+    assert app_module.single_flight_stats['fallbacks'] == fallbacks_before + 1
+    with app.app_context():
+        AnalysisLease.query.filter_by(lease_key=lease_key).delete()
+        db.session.commit()
+    print("✅ 超时的等待方使用了规则估算结果")
+
+def test_meal_fallback_analysis_uses_local_table():
+    """饮食分析的fallback不调用AI，已知食物按成分表计算"""
+    print("🧪 测试饮食fallback分析")
+    result = app_module.build_meal_fallback_analysis('lunch', [], '一碗牛肉面')
+    assert result['basic_nutrition']['total_calories'] > 0
+    assert len(result['food_items_nutrition']) == 1
+    print("✅ 饮食fallback分析可用")
+
+if __name__ == '__main__':
+    test_concurrent_calls_are_coalesced()
+    test_waits_for_lease_held_by_other_worker()
+    test_coalesced_timeout_returns_fallback()
+    test_meal_fallback_analysis_uses_local_table()
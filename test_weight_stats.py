@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+测试体重统计
+验证一条窗口函数查询得到最新体重、7/30/90天变化和90天最小/最大/平均值，
+以及按用户缓存、按版本戳校验并在体重写入后失效
+"""
+
+import sys
+from datetime import date, datetime, timedelta, timezone
+sys.path.append('.')
+
+from sqlalchemy import event
+
+from app import (app, db, User, FitnessGoal, WeightLog, UserDailySummary, ensure_database_schema,
+                 query_weight_stats, get_weight_stats, invalidate_weight_stats)
+
+USERNAME = 'weight_stats_tester'
+TODAY = date(2025, 9, 30)
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.engine, 'before_cursor_execute', self)
+
+def _setup_user(weights):
+    db.create_all()
+    ensure_database_schema()
+    user = User.query.filter_by(username=USERNAME).first()
+    if user:
+        WeightLog.query.filter_by(user_id=user.id).delete()
+        db.session.delete(user)
+        db.session.commit()
+    user = User(username=USERNAME, email=f'{USERNAME}@test.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    for days_ago, weight in weights:
+        db.session.add(WeightLog(user_id=user.id, date=TODAY - timedelta(days=days_ago), weight=weight))
+    db.session.commit()
+    invalidate_weight_stats()
+    return user.id
+
+def _cleanup(user_id):
+    WeightLog.query.filter_by(user_id=user_id).delete()
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+
+def test_stats_from_one_query():
+    """最新体重、各周期变化和区间统计来自一条查询"""
+    print("🧪 测试体重统计查询")
+    with app.app_context():
+        user_id = _setup_user([(0, 70.0), (3, 70.6), (8, 71.0), (29, 71.5), (45, 72.4), (120, 75.0)])
+        with QueryCounter() as counter:
+            result = query_weight_stats(user_id, TODAY, history_days=10)
+        assert counter.count == 1
+        stats = result['stats']
+        assert (stats['latest_weight'], stats['latest_date']) == (70.0, TODAY.isoformat())
+        # 基准是截止日期当天或之前最新的一条：7天前->第8天，30天前->第45天，90天前->第120天
+        assert (stats['week_change'], stats['month_change'], stats['quarter_change']) == (-1.0, -2.4, -5.0)
+        assert (stats['min_weight'], stats['max_weight'], stats['avg_weight']) == (70.0, 72.4, 71.1)
+        assert stats['period_count'] == 5
+        assert [row['weight'] for row in result['history']] == [70.0, 70.6, 71.0]
+
+        # 记录都在7天内时没有基准；没有记录时全部为空
+        _cleanup(user_id)
+        user_id = _setup_user([(1, 68.0), (2, 68.4)])
+        stats = query_weight_stats(user_id, TODAY)['stats']
+        assert stats['latest_weight'] == 68.0 and stats['week_change'] is None and stats['quarter_change'] is None
+        _cleanup(user_id)
+        user_id = _setup_user([])
+        result = query_weight_stats(user_id, TODAY, history_days=7)
+        assert result['stats']['latest_weight'] is None and result['history'] == []
+        _cleanup(user_id)
+    print("✅ 体重统计查询正确")
+
+def test_stats_cache_invalidated_by_weight_writes():
+    """统计按用户缓存，ORM修改和原子写入提交后都会失效"""
+    print("🧪 测试体重统计缓存")
+    with app.app_context():
+        today = date.today()
+        user_id = _setup_user([])
+        db.session.add(WeightLog(user_id=user_id, date=today - timedelta(days=10), weight=80.0))
+        db.session.add(FitnessGoal(user_id=user_id, goal_type='lose_weight', target_weight=75, is_active=True))
+        db.session.commit()
+
+        assert get_weight_stats(user_id)['stats']['latest_weight'] == 80.0
+        # 命中缓存时只查询版本戳
+        with QueryCounter() as counter:
+            assert get_weight_stats(user_id)['stats']['latest_weight'] == 80.0
+        assert counter.count == 1
+
+        # 其他实例的写入不会清除本进程的缓存，版本戳变化后重新查询
+        table = WeightLog.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.user_id == user_id).values(weight=79.5))
+            conn.execute(UserDailySummary.__table__.update()
+                         .where(UserDailySummary.__table__.c.user_id == user_id)
+                         .values(weight=79.5, updated_at=datetime.now(timezone.utc) + timedelta(seconds=1)))
+        assert get_weight_stats(user_id)['stats']['latest_weight'] == 79.5
+
+        record = WeightLog.query.filter_by(user_id=user_id).first()
+        record.weight = 79.0
+        db.session.commit()
+        assert get_weight_stats(user_id)['stats']['latest_weight'] == 79.0
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = f'user:{user_id}'
+    client.post('/api/weight-log', json={'weight': 78.2, 'date': today.isoformat()})
+    response = client.get('/api/weight-stats?days=30').get_json()
+    assert response['success']
+    data = response['data']
+    assert data['latest_weight'] == 78.2 and data['week_change'] == -0.8
+    assert (data['target_weight'], data['distance_to_goal']) == (75, 3.2)
+    assert [row['weight'] for row in response['history']] == [78.2, 79.0]
+    assert 'history' not in client.get('/api/weight-stats').get_json()
+
+    with app.app_context():
+        _cleanup(user_id)
+    print("✅ 体重统计缓存正确")
+
+if __name__ == '__main__':
+    test_stats_from_one_query()
+    test_stats_cache_invalidated_by_weight_writes()
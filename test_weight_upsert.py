@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试体重记录的原子写入
+验证单条保存只有一条 INSERT ... ON CONFLICT、同一天重复提交更新而不重复插入、
+批量同步，以及计数器和每日汇总保持一致
+"""
+
+import sys
+from datetime import date
+sys.path.append('.')
+
+from sqlalchemy import event
+
+from app import (app, db, User, UserProfile, WeightLog, UserDailySummary, ensure_database_schema,
+                 get_app_counters, upsert_weight_logs)
+
+USERNAME = 'weight_upsert_tester'
+DAY = date(2025, 8, 1)
+
+def _setup_user():
+    with app.app_context():
+        db.create_all()
+        ensure_database_schema()
+        user = User.query.filter_by(username=USERNAME).first()
+        if user:
+            WeightLog.query.filter_by(user_id=user.id).delete()
+            db.session.delete(user)
+            db.session.commit()
+        user = User(username=USERNAME, email=f'{USERNAME}@test.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(UserProfile(user_id=user.id, height=170, weight=70, age=30, gender='male'))
+        db.session.commit()
+        return user.id
+
+def _cleanup(user_id):
+    with app.app_context():
+        db.session.delete(db.session.get(User, user_id))
+        db.session.commit()
+
+def _login(user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = f'user:{user_id}'
+        sess['_fresh'] = True
+    return client
+
+def test_weight_post_is_single_upsert():
+    """同一天提交两次：第一次插入、第二次更新，每次只有一条写语句"""
+    print("🧪 测试体重原子写入")
+    user_id = _setup_user()
+    client = _login(user_id)
+    with app.app_context():
+        before = get_app_counters()['weight_logs']
+        engine = db.engine
+
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.lstrip())
+
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        first = client.post('/api/weight-log', json={'weight': 72.3, 'date': DAY.isoformat(), 'notes': '早上'})
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+    data = first.get_json()
+    assert data['success'] and data['message'] == '体重记录已保存'
+    assert data['data']['bmi'] == 25.0 and data['data']['bmi_status'] == '偏胖'
+    weight_writes = [statement for statement in statements
+                     if statement.startswith(('INSERT INTO weight_log', 'UPDATE weight_log'))]
+    assert len(weight_writes) == 1 and 'ON CONFLICT' in weight_writes[0]
+
+    second = client.post('/api/weight-log', json={'weight': 71.8, 'date': DAY.isoformat(), 'notes': '晚上'}).get_json()
+    assert second['message'] == '体重记录已更新' and second['data']['id'] == data['data']['id']
+
+    with app.app_context():
+        records = WeightLog.query.filter_by(user_id=user_id).all()
+        assert [(record.weight, record.notes) for record in records] == [(71.8, '晚上')]
+        assert get_app_counters()['weight_logs'] == before + 1
+        assert UserDailySummary.query.filter_by(user_id=user_id, date=DAY).first().weight == 71.8
+
+    assert client.post('/api/weight-log', json={'weight': 0}).status_code == 400
+    assert client.post('/api/weight-log', json={'weight': 70, 'date': '2025/08/01'}).status_code == 400
+    _cleanup(user_id)
+    print("✅ 体重原子写入正确")
+
+def test_bulk_weight_sync():
+    """批量同步多天：已有的天更新，新的天插入，同一天重复时以最后一次为准"""
+    print("🧪 测试体重批量同步")
+    user_id = _setup_user()
+    client = _login(user_id)
+    client.post('/api/weight-log', json={'weight': 70, 'date': '2025-08-02'})
+    with app.app_context():
+        before = get_app_counters()['weight_logs']
+
+    response = client.post('/api/weight-log/bulk', json={'records': [
+        {'date': '2025-08-01', 'weight': 70.5},
+        {'date': '2025-08-02', 'weight': 69.9, 'notes': '手环同步'},
+        {'date': '2025-08-03', 'weight': 69.0},
+        {'date': '2025-08-03', 'weight': 69.2},
+    ]}).get_json()
+    assert response['success'] and (response['inserted'], response['updated']) == (2, 1)
+    assert [(row['date'], row['weight']) for row in response['data']] == [
+        ('2025-08-01', 70.5), ('2025-08-02', 69.9), ('2025-08-03', 69.2)]
+
+    with app.app_context():
+        assert WeightLog.query.filter_by(user_id=user_id).count() == 3
+        assert get_app_counters()['weight_logs'] == before + 2
+        summary = UserDailySummary.query.filter_by(user_id=user_id, date=date(2025, 8, 3)).first()
+        assert summary.weight == 69.2
+        assert upsert_weight_logs([]) == []
+
+    bad = client.post('/api/weight-log/bulk', json={'records': [{'date': '2025-08-04', 'weight': 900}]})
+    assert bad.status_code == 400 and '第1条' in bad.get_json()['error']
+    assert client.post('/api/weight-log/bulk', json={'records': []}).status_code == 400
+    _cleanup(user_id)
+    print("✅ 体重批量同步正确")
+
+if __name__ == '__main__':
+    test_weight_post_is_single_upsert()
+    test_bulk_weight_sync()